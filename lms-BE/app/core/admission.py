@@ -0,0 +1,86 @@
+"""
+Per-key admission control.
+
+Bounds how many requests for the same key (e.g. one assignment) run at once and
+how many may wait behind them. Excess requests are rejected fast with
+``503 Retry-After`` instead of piling up on the DB connection pool.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+from fastapi import HTTPException, status
+
+
+class _Gate:
+    __slots__ = ("semaphore", "waiting", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.users = 0
+
+
+class AdmissionQueue:
+    """
+    Bounded concurrency + bounded FIFO queue per key.
+
+    Attributes:
+        max_concurrency: Requests allowed to run concurrently per key
+        max_queue: Requests allowed to wait per key before new ones are shed
+        timeout: Seconds a request may wait for a slot before it is shed
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._gates: Dict[Hashable, _Gate] = {}
+        self.rejected = 0
+
+    def _reject(self):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many submissions in progress, please retry shortly.",
+            headers={"Retry-After": "2"},
+        )
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable):
+        gate = self._gates.get(key)
+        if gate is None:
+            gate = self._gates[key] = _Gate(self.max_concurrency)
+
+        if gate.semaphore.locked() and gate.waiting >= self.max_queue:
+            self._reject()
+
+        gate.users += 1
+        gate.waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(gate.semaphore.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self._reject()
+            finally:
+                gate.waiting -= 1
+
+            try:
+                yield
+            finally:
+                gate.semaphore.release()
+        finally:
+            gate.users -= 1
+            if gate.users == 0:
+                # Idle gates are dropped so the map only holds hot keys
+                self._gates.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "active_keys": len(self._gates),
+            "waiting": sum(g.waiting for g in self._gates.values()),
+            "rejected": self.rejected,
+        }
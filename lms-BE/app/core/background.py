@@ -0,0 +1,41 @@
+"""
+Fire-and-forget background work.
+
+Side effects that the client does not need to wait for (activity logs,
+notifications) are moved off the request path with ``run_with_session``. Each
+job gets its own DB session, because the request session is closed as soon as
+the response is sent.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Strong references so running tasks are not garbage-collected mid-flight
+_tasks: set[asyncio.Task] = set()
+
+
+def run_with_session(fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Task:
+    """Schedule ``fn(db, *args, **kwargs)`` on a fresh session without awaiting it."""
+
+    async def runner():
+        async with AsyncSessionLocal() as db:
+            try:
+                await fn(db, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background job {getattr(fn, '__name__', fn)} failed: {e}")
+
+    task = asyncio.create_task(runner())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float = 10.0) -> None:
+    """Wait (bounded) for in-flight background jobs, e.g. during shutdown."""
+    if _tasks:
+        await asyncio.wait(list(_tasks), timeout=timeout)
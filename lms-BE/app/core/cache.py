@@ -0,0 +1,298 @@
+"""
+Two-level cache with tag-based invalidation.
+
+Values live in Redis under ``cache:<namespace>:<id>`` and are mirrored in a
+small in-process LRU. Every entry records the versions of the tags it depends
+on: its own tag (``<namespace>#<id>``) plus any shared tags such as
+``course:12`` or ``school:3``. Invalidating a tag bumps ``cache:tag:<tag>``, so
+every entry stamped with an older version is treated as a miss by every
+worker; stale payloads simply expire. A read costs one Redis round trip (data
+and tag versions in a single MGET). Local copies are trusted for ``local_ttl``
+seconds before the versions are rechecked.
+
+Misses are single-flight: concurrent callers in one process share one load
+(``app.core.singleflight``), and a short Redis lock makes other workers wait
+for the value instead of all hitting the database at once.
+
+If Redis is unavailable the cache degrades to local-only and keeps serving.
+
+Service functions can be wrapped with ``@cached``; keys of tenant data should
+be built with ``tenant_key`` so a value is never shared across schools or
+roles. Write paths call ``invalidate_tags`` (or a cache's ``invalidate``).
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from redis.exceptions import RedisError
+
+from app.core.redis_client import get_redis
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Tag versions must outlive any cached payload
+VERSION_TTL = 30 * 24 * 3600
+# How long one worker may hold the load lock for a key, and how long others wait on it
+LOCK_TTL_MS = 5000
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+_caches: Dict[str, "VersionedCache"] = {}
+
+
+def course_tag(course_id: int) -> str:
+    return f"course:{course_id}"
+
+
+def school_tag(school_id: Optional[int]) -> str:
+    return f"school:{school_id}"
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def tenant_key(school_id: Optional[int], *parts: Any, role: Optional[str] = None) -> str:
+    """Cache key that always carries the tenant (and the role when the view depends on it)."""
+    prefix = f"s{school_id if school_id is not None else '*'}"
+    if role:
+        prefix += f":r{role}"
+    return ":".join([prefix, *(str(p) for p in parts)])
+
+
+def _tag_key(tag: str) -> str:
+    return f"cache:tag:{tag}"
+
+
+class VersionedCache:
+    """
+    Attributes:
+        namespace: Prefix for all Redis keys of this cache
+        ttl: Seconds a payload is kept in Redis
+        local_ttl: Seconds a local copy is served without checking tag versions
+        max_local: Maximum number of local entries (LRU)
+        decode: Turns the JSON payload into the object handed to callers
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int = 3600,
+        local_ttl: float = 5.0,
+        max_local: int = 1024,
+        decode: Callable[[Any], Any] = lambda payload: payload,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_local = max_local
+        self.decode = decode
+        # ident -> (tags, tag versions, checked_until, decoded value)
+        self._local: "OrderedDict[Hashable, Tuple[Tuple[str, ...], Optional[list], float, Any]]" = OrderedDict()
+        self._flight = SingleFlight(f"cache:{namespace}")
+        self.stats: Dict[str, int] = defaultdict(int)
+        _caches[namespace] = self
+
+    def _own_tag(self, ident: Hashable) -> str:
+        return f"{self.namespace}#{ident}"
+
+    def _data_key(self, ident: Hashable) -> str:
+        return f"cache:{self.namespace}:{ident}"
+
+    def _lock_key(self, ident: Hashable) -> str:
+        return f"cache:lock:{self.namespace}:{ident}"
+
+    def _remember(self, ident: Hashable, tags: Tuple[str, ...], versions: Optional[list], value: Any) -> None:
+        self._local[ident] = (tags, versions, time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end(ident)
+        while len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+    def _forget_tags(self, tags: set) -> None:
+        for ident in [i for i, entry in self._local.items() if tags.intersection(entry[0])]:
+            self._local.pop(ident, None)
+
+    async def _read(self, redis, ident: Hashable, tags: Tuple[str, ...]) -> Tuple[list, Optional[Any]]:
+        """Current tag versions and the stored payload if it was written under those versions."""
+        raw, *versions = await redis.mget(self._data_key(ident), *[_tag_key(t) for t in tags])
+        versions = [int(v or 0) for v in versions]
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry["v"] == versions:
+                return versions, entry["d"]
+        return versions, None
+
+    async def get_or_load(
+        self, ident: Hashable, loader: Callable[[], Awaitable[Any]], tags: Sequence[str] = ()
+    ) -> Optional[Any]:
+        """
+        Return the decoded value for ``ident``, calling ``loader`` on a miss.
+
+        ``loader`` must return a JSON-serialisable payload, or ``None`` for
+        "does not exist" (which is not cached). ``tags`` must be the same on
+        every call for a given ``ident``.
+        """
+        local = self._local.get(ident)
+        if local and local[2] > time.monotonic():
+            self._local.move_to_end(ident)
+            self.stats["local_hits"] += 1
+            return local[3]
+
+        # Concurrent misses in this process share one load
+        return await self._flight.do(
+            ident, lambda: self._fetch(ident, loader, (self._own_tag(ident), *tags), local)
+        )
+
+    async def _fetch(self, ident: Hashable, loader, tags: Tuple[str, ...], local) -> Optional[Any]:
+        try:
+            redis = await get_redis()
+            versions, payload = await self._read(redis, ident, tags)
+        except (RedisError, ValueError, KeyError) as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Cache {self.namespace}: Redis unavailable, serving local only: {e}")
+            if local:
+                return local[3]
+            self.stats["misses"] += 1
+            payload = await loader()
+            if payload is None:
+                return None
+            value = self.decode(payload)
+            self._remember(ident, tags, None, value)
+            return value
+
+        if local and local[1] == versions:
+            self.stats["local_hits"] += 1
+            self._remember(ident, tags, versions, local[3])
+            return local[3]
+
+        if payload is not None:
+            self.stats["redis_hits"] += 1
+            value = self.decode(payload)
+            self._remember(ident, tags, versions, value)
+            return value
+
+        self.stats["misses"] += 1
+        payload = await self._load_once(redis, ident, loader, tags, versions)
+        if payload is None:
+            return None
+        value = self.decode(payload)
+        self._remember(ident, tags, versions, value)
+        return value
+
+    async def _load_once(self, redis, ident: Hashable, loader, tags: Tuple[str, ...], versions: list) -> Optional[Any]:
+        """Load under a cross-worker lock; losers wait briefly for the winner's value."""
+        lock_key = self._lock_key(ident)
+        try:
+            acquired = await redis.set(lock_key, "1", nx=True, px=LOCK_TTL_MS)
+        except RedisError:
+            acquired = True
+
+        if not acquired:
+            self.stats["lock_waits"] += 1
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                try:
+                    current, payload = await self._read(redis, ident, tags)
+                except (RedisError, ValueError, KeyError):
+                    break
+                if payload is not None:
+                    versions[:] = current
+                    return payload
+
+        try:
+            payload = await loader()
+            if payload is not None:
+                # Stamped with the versions read *before* loading: a concurrent
+                # invalidation makes this entry stale instead of hiding the write
+                entry = json.dumps({"v": versions, "d": payload}, separators=(",", ":"))
+                try:
+                    await redis.set(self._data_key(ident), entry, ex=self.ttl)
+                except RedisError as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Cache {self.namespace}: write failed for {ident}: {e}")
+            return payload
+        finally:
+            if acquired:
+                try:
+                    await redis.delete(lock_key)
+                except RedisError:
+                    pass
+
+    async def invalidate(self, ident: Hashable) -> None:
+        await invalidate_tags(self._own_tag(ident))
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Invalidate every cached entry (in any cache, on any worker) that depends on one of ``tags``."""
+    if not tags:
+        return
+    tag_set = set(tags)
+    for cache in _caches.values():
+        cache._forget_tags(tag_set)
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            for tag in tag_set:
+                pipe.incr(_tag_key(tag))
+                pipe.expire(_tag_key(tag), VERSION_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cache: invalidation failed for {sorted(tag_set)}: {e}")
+
+
+def cached(
+    namespace: str,
+    *,
+    key: Callable[..., Hashable],
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    ttl: int = 3600,
+    local_ttl: float = 5.0,
+    max_local: int = 1024,
+    encode: Callable[[Any], Any] = lambda value: value,
+    decode: Callable[[Any], Any] = lambda payload: payload,
+):
+    """
+    Cache an async service function.
+
+    ``key`` and ``tags`` receive the same arguments as the function. ``encode``
+    turns its result into a JSON payload; ``decode`` turns the payload back
+    into what callers receive (shared between requests: treat as read-only).
+    The wrapped function exposes its cache as ``.cache``.
+    """
+    cache = VersionedCache(namespace, ttl=ttl, local_ttl=local_ttl, max_local=max_local, decode=decode)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async def load():
+                result = await fn(*args, **kwargs)
+                return None if result is None else encode(result)
+
+            entry_tags = tuple(tags(*args, **kwargs)) if tags else ()
+            return await cache.get_or_load(key(*args, **kwargs), load, tags=entry_tags)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Hit / miss counters per cache namespace since process start."""
+    report = {}
+    for namespace, cache in sorted(_caches.items()):
+        stats = dict(cache.stats)
+        stats["coalesced"] = cache._flight.stats["coalesced"]
+        hits = stats.get("local_hits", 0) + stats.get("redis_hits", 0) + stats.get("coalesced", 0)
+        lookups = hits + stats.get("misses", 0)
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else None
+        stats["local_entries"] = len(cache._local)
+        report[namespace] = stats
+    return report
@@ -1,13 +1,15 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import delete, select
+from sqlalchemy import delete
 from datetime import datetime, timezone, timedelta
 import logging
 
 from app.core.database import AsyncSessionLocal
 from app.features.auth.models import RefreshToken
 from app.features.notifications.models import Notification
-from app.features.submissions.models import Submission
-from app.core.storage import get_minio_client
+from app.features.files.service_blobs import collect_unreferenced_blobs
+from app.features.files.service_previews import enqueue_missing_previews
+from app.features.files.service_quota import flush_storage_usage, recount_storage_usage
+from app.features.files.service_reconcile import run_storage_reconciliation
 
 logger = logging.getLogger(__name__)
 
@@ -41,35 +43,6 @@ async def cleanup_old_notifications():
         except Exception as e:
             logger.error(f"Error cleaning up old notifications: {e}")
 
-async def cleanup_orphan_submissions():
-    """Delete submission records where file is missing in MinIO"""
-    async with AsyncSessionLocal() as db:
-        try:
-            stmt = select(Submission).where(Submission.object_name.isnot(None))
-            result = await db.execute(stmt)
-            submissions = result.scalars().all()
-            
-            try:
-                minio_client = get_minio_client()
-            except Exception:
-                logger.error("Cleanup job skipped: Failed to initialize MinIO client")
-                return
-                
-            removed_count = 0
-            
-            for sub in submissions:
-                if sub.object_name and not minio_client.file_exists(sub.object_name):
-                    await db.delete(sub)
-                    removed_count += 1
-                    
-            if removed_count > 0:
-                await db.commit()
-                logger.info(f"Cleanup job: removed {removed_count} orphan submissions")
-            else:
-                logger.info("Cleanup job: removed 0 orphan submissions")
-        except Exception as e:
-            logger.error(f"Error cleaning up orphan submissions: {e}")
-
 from app.core.redis_client import get_redis
 from app.features.courses.models_discussion import CoursePost, PostReply
 import json
@@ -132,11 +105,20 @@ async def sync_redis_discussions_to_db():
             except Exception as e:
                 logger.error(f"Error syncing pending replies to DB: {e}")
 
+from app.features.courses.service_exam import flush_expired_exam_sessions
+from app.features.courses.service_similarity import backfill_text_signatures
+
 scheduler = AsyncIOScheduler()
 scheduler.add_job(cleanup_refresh_tokens, 'interval', hours=12)
 scheduler.add_job(cleanup_old_notifications, 'interval', hours=12)
-scheduler.add_job(cleanup_orphan_submissions, 'interval', hours=12)
+scheduler.add_job(run_storage_reconciliation, 'interval', hours=12)
 scheduler.add_job(sync_redis_discussions_to_db, 'interval', seconds=30)
+scheduler.add_job(flush_expired_exam_sessions, 'interval', seconds=30)
+scheduler.add_job(collect_unreferenced_blobs, 'interval', hours=1)
+scheduler.add_job(flush_storage_usage, 'interval', minutes=5)
+scheduler.add_job(recount_storage_usage, 'interval', hours=24)
+scheduler.add_job(enqueue_missing_previews, 'interval', hours=1)
+scheduler.add_job(backfill_text_signatures, 'interval', hours=1)
 
 def start_scheduler():
     scheduler.start()
@@ -0,0 +1,89 @@
+"""
+Conditional GET helpers (ETag / If-None-Match).
+
+Endpoints pick the cheapest validator they have:
+
+- a version stamp that is already known (a cached payload's ``etag``, or a
+  one-row aggregate such as ``count / max(id) / max(updated_at)`` from
+  ``query_stamp``), checked with ``is_not_modified`` *before* the main query
+  runs, or
+- a hash of the serialized body (``json_response`` with no ``etag``), which
+  still saves the transfer when nothing cheaper is available.
+
+All validators are weak: equal ETags mean semantically equal JSON, not
+byte-identical bodies.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+# Responses are per user, so shared caches must not store them; clients always revalidate
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag over ``parts`` (stringified); ``bytes`` parts are hashed as-is."""
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\x1f")
+    return f'W/"{digest.hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": DEFAULT_CACHE_CONTROL})
+
+
+def json_response(request: Request, content: Any, etag: Optional[str] = None, status_code: int = 200) -> Response:
+    """
+    Serialize ``content`` with an ETag, or answer 304 if the client already has it.
+
+    Without ``etag`` the validator is a hash of the body, so the body is
+    always built; pass a precomputed stamp where one exists.
+    """
+    if etag is not None and is_not_modified(request, etag):
+        return not_modified(etag)
+
+    body = json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+    if etag is None:
+        etag = make_etag(body)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": DEFAULT_CACHE_CONTROL},
+    )
+
+
+async def query_stamp(db: AsyncSession, stmt: Select, *scope: Any) -> str:
+    """
+    ETag from a single-row aggregate, e.g.
+    ``select(func.count(), func.max(Model.id), func.max(Model.updated_at))``.
+
+    ``scope`` (user id, filters, page...) is mixed in so different views of
+    the same rows never share a tag.
+    """
+    row = (await db.execute(stmt)).one()
+    return make_etag(*scope, *row)
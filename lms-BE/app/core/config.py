@@ -17,17 +17,85 @@ class Settings(BaseSettings):
             return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://")
         return url
 
+    # Storage engine: "s3" (MinIO / R2, settings below) or "local" (files under LOCAL_STORAGE_ROOT)
+    STORAGE_BACKEND: str = "s3"
+    LOCAL_STORAGE_ROOT: str = "storage"
+    # Public base of the signed-URL endpoints that serve the local engine
+    LOCAL_STORAGE_BASE_URL: str = "http://localhost:8000/v1/files/local"
+    # Key for signing local URLs (defaults to SECRET_KEY)
+    LOCAL_STORAGE_SIGNING_KEY: Optional[str] = None
+
     # MinIO
     MINIO_ENDPOINT: str = "localhost:9000"
-    MINIO_ACCESS_KEY: str
-    MINIO_SECRET_KEY: str
+    MINIO_ACCESS_KEY: str = ""
+    MINIO_SECRET_KEY: str = ""
     MINIO_BUCKET_NAME: str = "lms-files"
     MINIO_SECURE: bool = False
     MINIO_URL_EXPIRY: int = 3600
 
+    # Storage I/O: thread pool for blocking SDK calls and the shared HTTP pool behind it
+    STORAGE_MAX_WORKERS: int = 16
+    STORAGE_POOL_SIZE: int = 32
+    STORAGE_CONNECT_TIMEOUT: float = 5.0
+    STORAGE_READ_TIMEOUT: float = 60.0
+    STORAGE_MAX_RETRIES: int = 3
+
+    # Uploads (streamed to storage in multipart chunks; parts must be >= 5 MiB)
+    UPLOAD_MAX_BYTES: int = 500 * 1024 * 1024
+    UPLOAD_PART_SIZE: int = 10 * 1024 * 1024
+    # Batch uploads (/v1/files/upload/batch): files per request, and how many are streamed to storage at once
+    UPLOAD_BATCH_MAX_FILES: int = 20
+    UPLOAD_BATCH_CONCURRENCY: int = 4
+    # Lifetime of presigned URLs for direct-to-storage uploads
+    UPLOAD_PRESIGN_EXPIRY: int = 3600
+    # Content-addressed storage: identical uploads share one blob (reference counted)
+    STORAGE_DEDUP: bool = False
+    # Unreferenced blobs are kept this long before the GC job deletes them
+    BLOB_GC_GRACE_SECONDS: int = 3600
+
+    # Download proxy (/v1/files/download/{id}): local disk LRU cache for hot objects (0 disables)
+    DOWNLOAD_CACHE_DIR: str = "download-cache"
+    DOWNLOAD_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    # Larger objects are streamed straight from storage instead of being cached
+    DOWNLOAD_CACHE_MAX_OBJECT_BYTES: int = 256 * 1024 * 1024
+
+    # Per-school upload quota when the school has none set (0 = unlimited)
+    STORAGE_QUOTA_DEFAULT_BYTES: int = 0
+
+    # Thumbnails / low-resolution previews of uploaded images and PDFs, rendered by a background worker.
+    # Needs Pillow (and poppler-utils for PDFs), which the default image does not install
+    PREVIEWS_ENABLED: bool = False
+    PREVIEW_PROCESSES: int = 2
+    PREVIEW_THUMBNAIL_PX: int = 320
+    PREVIEW_PX: int = 1280
+    # Larger sources are not downloaded for rendering (marked unsupported)
+    PREVIEW_MAX_SOURCE_BYTES: int = 100 * 1024 * 1024
+    PREVIEW_MAX_ATTEMPTS: int = 4
+    # Backoff before the first retry, doubled for every further one
+    PREVIEW_RETRY_DELAY_SECONDS: int = 30
+    PREVIEW_TIMEOUT_SECONDS: float = 120.0
+
+    # Storage reconciliation (DB references vs bucket contents, every 12 hours)
+    RECONCILE_DRY_RUN: bool = False
+    RECONCILE_BATCH_SIZE: int = 500
+    # Unreferenced objects younger than this are kept (uploads whose record is not committed yet)
+    RECONCILE_GRACE_SECONDS: int = 86400
+
+    # Submission archives (streamed ZIP downloads)
+    ARCHIVE_FETCH_CONCURRENCY: int = 4
+    ARCHIVE_PREFETCH_CHUNKS: int = 4
+    ARCHIVE_CHUNK_SIZE: int = 1024 * 1024
+
     # Redis
     REDIS_URL: str = "redis://redis:6379/1"
 
+    # Submission admission control (deadline rush)
+    SUBMISSION_MAX_CONCURRENCY_PER_ASSIGNMENT: int = 20
+    SUBMISSION_MAX_QUEUE_PER_ASSIGNMENT: int = 500
+    SUBMISSION_QUEUE_TIMEOUT_SECONDS: float = 15.0
+    ASSIGNMENT_META_CACHE_TTL: int = 300
+    COURSE_MATERIALS_CACHE_TTL: int = 3600
+
     # Auth
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -15,7 +15,8 @@ from app.features.courses import (
     models_question,
     models_answer,
     models_student_assignment,
-    models_discussion
+    models_discussion,
+    models_similarity
 )
 from app.features.auth import models as auth_models
 from app.features.enrollments import models_student as enrollment_student, models_teacher as enrollment_teacher, models_consent
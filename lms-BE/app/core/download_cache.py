@@ -0,0 +1,185 @@
+"""
+Bounded local disk cache for objects served by the download proxy.
+
+Hot objects (lecture slides, videos everyone watches the night before an
+exam) are copied from storage to ``DOWNLOAD_CACHE_DIR`` on first request and
+served from disk afterwards, so storage sees one GET per object instead of one
+per student. Files are written atomically and named by a hash of the storage
+key; concurrent misses for the same key share one fill.
+
+The index lives in memory, per process, in least-recently-used order and is
+rebuilt from the directory (oldest mtime first) when the cache is first used.
+Entries being filled or served are pinned and never evicted. Objects are
+assumed immutable under their key, which holds for upload names (UUID
+prefixed) and content-addressed blobs; deleting a file calls ``discard``.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import Counter, OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.core.storage import AsyncStorage, get_storage
+from app.core.storage_local import TEMP_PREFIX, AtomicFile
+
+logger = logging.getLogger(__name__)
+
+FILL_CHUNK = 1024 * 1024
+
+_fills = SingleFlight("download_cache")
+
+
+class DownloadCache:
+    """
+    Attributes:
+        directory: Where cached copies are kept
+        max_bytes: Total size the cache is trimmed to after every fill
+        max_object_bytes: Larger objects are never cached (streamed from storage instead)
+        size: Bytes currently indexed
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_bytes: int, storage: AsyncStorage):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_object_bytes = min(max_object_bytes, max_bytes)
+        self.storage = storage
+        self.size = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Counter = Counter()
+        self._loaded: Optional[asyncio.Task] = None
+
+    def enabled_for(self, size: int) -> bool:
+        return self.max_bytes > 0 and size <= self.max_object_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def _scan(self) -> list:
+        """Existing cache files, oldest first; leftovers of interrupted fills are removed."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(TEMP_PREFIX):
+                os.unlink(entry.path)
+            elif entry.is_file():
+                st = entry.stat()
+                found.append((st.st_mtime, entry.path, st.st_size))
+        found.sort()
+        return [(path, size) for _, path, size in found]
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._loaded)
+
+    async def _load(self) -> None:
+        for path, size in await self.storage.run(self._scan):
+            self._entries[path] = size
+            self.size += size
+        logger.info(f"Download cache: {len(self._entries)} files ({self.size} bytes) in {self.directory}")
+        self._evict()
+
+    async def acquire(self, key: str) -> Tuple[str, os.stat_result]:
+        """
+        Local path and stat of the cached copy of ``key``, filling it from storage on a miss.
+
+        The entry is pinned until ``release`` is called. Raises whatever the
+        storage read raises (e.g. the object does not exist).
+        """
+        await self._ensure_loaded()
+        path = self._path(key)
+        while True:
+            # Pinned before the fill, so the eviction that follows it cannot remove this entry
+            self._pins[path] += 1
+            if path not in self._entries:
+                try:
+                    await _fills.do(path, lambda: self._fill(key, path))
+                except BaseException:
+                    self.release(path)
+                    raise
+            try:
+                st = await self.storage.run(os.stat, path)
+            except FileNotFoundError:
+                # Removed behind our back (another process, an operator): fetch again
+                self.release(path)
+                self._forget(path)
+                continue
+            self._entries.move_to_end(path)
+            return path, st
+
+    def release(self, path: str) -> None:
+        self._pins[path] -= 1
+        if self._pins[path] <= 0:
+            del self._pins[path]
+
+    def discard(self, key: str) -> None:
+        path = self._path(key)
+        if self._forget(path):
+            _unlink(path)
+
+    def _forget(self, path: str) -> bool:
+        size = self._entries.pop(path, None)
+        if size is None:
+            return False
+        self.size -= size
+        return True
+
+    async def _fill(self, key: str, path: str) -> None:
+        target = await self.storage.run(AtomicFile, path)
+        try:
+            async for chunk in self.storage.iter_file_chunks(key, chunk_size=FILL_CHUNK):
+                await self.storage.run(target.write, chunk)
+            await self.storage.run(target.commit)
+        except BaseException:
+            await self.storage.run(target.abort)
+            raise
+
+        self._forget(path)
+        self._entries[path] = target.size
+        self.size += target.size
+        logger.debug(f"Download cache: stored {key} ({target.size} bytes)")
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.size <= self.max_bytes:
+            return
+        victims = []
+        for path, size in self._entries.items():
+            if self.size <= self.max_bytes:
+                break
+            if self._pins[path]:
+                continue
+            victims.append(path)
+            self.size -= size
+        # Unlinked without yielding to the loop, so a concurrent fill of the same
+        # key cannot write its copy before the old one is gone
+        for path in victims:
+            del self._entries[path]
+            _unlink(path)
+        logger.info(f"Download cache: evicted {len(victims)} files, {self.size} bytes cached")
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+_cache: Optional[DownloadCache] = None
+
+
+def get_download_cache() -> DownloadCache:
+    global _cache
+    if _cache is None:
+        _cache = DownloadCache(
+            settings.DOWNLOAD_CACHE_DIR,
+            settings.DOWNLOAD_CACHE_MAX_BYTES,
+            settings.DOWNLOAD_CACHE_MAX_OBJECT_BYTES,
+            get_storage(),
+        )
+    return _cache
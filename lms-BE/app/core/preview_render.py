@@ -0,0 +1,101 @@
+"""
+Thumbnail and preview rendering for images and PDFs.
+
+``render_previews`` runs inside a worker process (see
+``app.features.files.service_previews``), so this module imports nothing from
+the application: a freshly spawned worker only loads the standard library and
+Pillow. Pillow is an optional dependency (``pip install .[previews]``) and PDFs
+are rasterised with ``pdftoppm`` from poppler-utils when it is on the PATH;
+without them the affected types are reported as unsupported.
+"""
+
+import os
+import shutil
+import subprocess
+from typing import Dict, Optional, Tuple
+
+PDF_TYPES = {"application/pdf"}
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+PREVIEW_SUFFIX = ".preview.jpg"
+JPEG_QUALITY = {"thumbnail": 75, "preview": 82}
+
+
+class UnsupportedPreview(Exception):
+    """The file cannot be previewed (type, missing tool, unreadable content); retrying will not help."""
+
+
+def is_previewable(content_type: Optional[str]) -> bool:
+    return bool(content_type) and (content_type.startswith("image/") or content_type in PDF_TYPES)
+
+
+def preview_keys(source_key: str) -> Tuple[str, str]:
+    """``(thumbnail, preview)`` object keys, stored next to the source object."""
+    return f"{source_key}{THUMBNAIL_SUFFIX}", f"{source_key}{PREVIEW_SUFFIX}"
+
+
+def render_previews(
+    source: str, content_type: str, out_dir: str, thumbnail_px: int, preview_px: int, timeout: float
+) -> Dict[str, str]:
+    """
+    Render the first page / frame of ``source`` as JPEGs bounded by the given sizes.
+
+    Returns:
+        ``{"thumbnail": path, "preview": path}`` inside ``out_dir``
+
+    Raises:
+        UnsupportedPreview: If the file cannot be previewed
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise UnsupportedPreview("Pillow is not installed")
+
+    if content_type in PDF_TYPES:
+        source = _rasterize_first_page(source, out_dir, preview_px, timeout)
+
+    try:
+        with Image.open(source) as opened:
+            # JPEG sources decode straight at a reduced scale
+            opened.draft("RGB", (preview_px, preview_px))
+            image = _flatten(ImageOps.exif_transpose(opened))
+    except (Image.UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise UnsupportedPreview(f"Cannot decode image: {e}")
+
+    outputs = {}
+    # The thumbnail is scaled down from the preview, not from the original
+    for kind, px in (("preview", preview_px), ("thumbnail", thumbnail_px)):
+        image.thumbnail((px, px), Image.Resampling.LANCZOS)
+        path = os.path.join(out_dir, f"{kind}.jpg")
+        image.save(path, "JPEG", quality=JPEG_QUALITY[kind], optimize=True, progressive=True)
+        outputs[kind] = path
+    return outputs
+
+
+def _flatten(image):
+    """RGB copy of ``image``, with transparency composited onto white."""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA", "P", "PA"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _rasterize_first_page(source: str, out_dir: str, size_px: int, timeout: float) -> str:
+    pdftoppm = shutil.which("pdftoppm")
+    if not pdftoppm:
+        raise UnsupportedPreview("pdftoppm (poppler-utils) is not installed")
+    prefix = os.path.join(out_dir, "page")
+    try:
+        subprocess.run(
+            [pdftoppm, "-f", "1", "-l", "1", "-singlefile", "-png", "-scale-to", str(size_px), source, prefix],
+            check=True,
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.CalledProcessError as e:
+        # Damaged or encrypted documents fail the same way on every attempt
+        raise UnsupportedPreview(f"pdftoppm failed: {e.stderr.decode(errors='replace').strip()[:200]}")
+    return f"{prefix}.png"
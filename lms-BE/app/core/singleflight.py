@@ -0,0 +1,78 @@
+"""
+In-process request coalescing ("single-flight").
+
+Concurrent callers asking for the same key share one in-flight coroutine
+instead of each running the same queries, so a burst of identical reads
+(hundreds of students opening the same course right after an announcement)
+costs one round of DB work per worker. Nothing is cached: once the shared
+call finishes, the next caller starts a fresh one.
+
+The shared result is handed to every caller as-is; treat it as read-only.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+_groups: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    """
+    Attributes:
+        name: Label used in ``singleflight_stats``
+        stats: ``calls`` (every request), ``executions`` (actual runs) and
+            ``coalesced`` (calls that joined a run already in flight)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+        _groups[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leader was cancelled (e.g. its client went away), not us: run it ourselves
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                self.stats["retries"] += 1
+                return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["executions"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody waited on is not logged as "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+def singleflight_stats() -> Dict[str, dict]:
+    report = {}
+    for name, group in sorted(_groups.items()):
+        stats = dict(group.stats)
+        stats["in_flight"] = len(group._inflight)
+        report[name] = stats
+    return report
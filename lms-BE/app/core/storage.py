@@ -3,19 +3,215 @@ S3-Compatible Object Storage — Cloudflare R2
 
 This module provides object storage functionality using Cloudflare R2 (S3-compatible API).
 It handles file uploads, presigned URLs, and file management for the LMS system.
+
+Storage engines implement ``StorageBackend``: ``MinIOClient`` (S3 / MinIO / R2)
+and ``LocalFileStorage`` (``app.core.storage_local``, plain files on disk).
+``settings.STORAGE_BACKEND`` picks one. Backends are synchronous; async code
+should go through ``get_storage()``, which runs their calls on a dedicated I/O
+thread pool.
 """
 
 from app.core.config import settings
+import asyncio
+import base64
+import binascii
+import functools
+import itertools
+import hashlib
+import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import BinaryIO, Optional
+from urllib.parse import quote
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Protocol, Tuple, TypeVar
+import certifi
+import urllib3
 from minio import Minio
 from minio.error import S3Error
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
+from minio.helpers import MIN_PART_SIZE
 from fastapi import UploadFile
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Read size when hashing spooled uploads
+HASH_CHUNK = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File exceeds the maximum upload size of {max_bytes} bytes")
+
+
+class MultipartNotSupportedError(Exception):
+    """Raised by the multipart methods of a backend whose ``supports_multipart`` is False."""
+
+
+class _HashingReader:
+    """
+    File-like wrapper that hashes and counts bytes as the storage client reads them.
+
+    The size limit is enforced while reading, so an oversized body is rejected
+    after at most one extra part instead of after the whole transfer.
+    """
+
+    def __init__(self, raw: BinaryIO, max_bytes: int):
+        self._raw = raw
+        self._max_bytes = max_bytes
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self.size += len(chunk)
+        if self.size > self._max_bytes:
+            raise UploadTooLargeError(self._max_bytes)
+        self.sha256.update(chunk)
+        return chunk
+
+
+def content_disposition(filename: str) -> str:
+    """Inline Content-Disposition carrying ``filename`` (RFC 6266 / 5987)."""
+    return f"inline; filename*=UTF-8''{quote(filename)}"
+
+
+def encode_cursor(object_name: str) -> str:
+    """Opaque listing cursor: the last object name of a page (used as S3 ``start-after``)."""
+    return base64.urlsafe_b64encode(object_name.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[str]:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by ``encode_cursor``
+    """
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid listing cursor")
+
+
+def unique_object_name(original_filename: str, folder: str = "") -> str:
+    """
+    Generate a unique object name with UUID prefix.
+    
+    Args:
+        original_filename: Original file name
+        folder: Optional folder path (e.g., 'notes', 'assignments')
+    
+    Returns:
+        Unique object name with format: folder/uuid_filename.ext
+    """
+    filename = f"{uuid.uuid4()}_{original_filename}"
+    if folder:
+        return f"{folder.strip('/')}/{filename}"
+    return filename
+
+
+class StorageBackend(Protocol):
+    """
+    Operations every storage engine provides (all blocking).
+    
+    Attributes:
+        bucket_name: Default bucket (S3) or top-level directory (local)
+        part_size: Chunk size used for streamed uploads
+        supports_multipart: Whether direct uploads can be split into presigned parts;
+            without it the multipart methods raise ``MultipartNotSupportedError``
+    """
+    
+    bucket_name: str
+    part_size: int
+    supports_multipart: bool
+    
+    def public_url(self, object_name: str, bucket_name: Optional[str] = None) -> str: ...
+    
+    def upload_stream(
+        self,
+        data: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None,
+        folder: str = "",
+        bucket_name: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        object_name: Optional[str] = None
+    ) -> dict: ...
+    
+    def generate_presigned_url(
+        self, object_name: str, bucket_name: Optional[str] = None, expiry: Optional[int] = None,
+        filename: Optional[str] = None
+    ) -> str: ...
+    
+    def generate_presigned_put_url(
+        self, object_name: str, expiry: Optional[int] = None, bucket_name: Optional[str] = None
+    ) -> str: ...
+    
+    def create_multipart_upload(
+        self, object_name: str, content_type: Optional[str] = None, bucket_name: Optional[str] = None
+    ) -> str: ...
+    
+    def generate_presigned_part_urls(
+        self, object_name: str, upload_id: str, part_count: int,
+        expiry: Optional[int] = None, bucket_name: Optional[str] = None
+    ) -> list: ...
+    
+    def complete_multipart_upload(
+        self, object_name: str, upload_id: str, parts: list, bucket_name: Optional[str] = None
+    ) -> None: ...
+    
+    def abort_multipart_upload(self, object_name: str, upload_id: str, bucket_name: Optional[str] = None) -> None: ...
+    
+    def delete_file(self, object_name: str, bucket_name: Optional[str] = None) -> bool: ...
+    
+    def delete_files(self, object_names: Iterable[str], bucket_name: Optional[str] = None) -> list: ...
+    
+    def file_exists(self, object_name: str, bucket_name: Optional[str] = None) -> bool: ...
+    
+    def get_file_info(self, object_name: str, bucket_name: Optional[str] = None) -> dict: ...
+    
+    def iter_file_chunks(
+        self,
+        object_name: str,
+        chunk_size: int = 1024 * 1024,
+        bucket_name: Optional[str] = None,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> Iterator[bytes]: ...
+    
+    def list_files(
+        self, prefix: str = "", limit: int = 1000, cursor: Optional[str] = None, bucket_name: Optional[str] = None
+    ) -> dict: ...
+
+
+def _build_http_client() -> urllib3.PoolManager:
+    """
+    HTTP pool shared by every storage call.
+    
+    Same TLS setup as the SDK default, but sized for the storage thread pool
+    and with explicit timeouts so a stalled connection cannot pin a worker.
+    Idempotent requests are retried with backoff on connection errors and 5xx.
+    """
+    return urllib3.PoolManager(
+        maxsize=settings.STORAGE_POOL_SIZE,
+        timeout=urllib3.Timeout(
+            connect=settings.STORAGE_CONNECT_TIMEOUT,
+            read=settings.STORAGE_READ_TIMEOUT
+        ),
+        retries=urllib3.Retry(
+            total=settings.STORAGE_MAX_RETRIES,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where()
+    )
+
 
 class MinIOClient:
     """
@@ -46,25 +242,33 @@ class MinIOClient:
         self.bucket_name = bucket_name or settings.MINIO_BUCKET_NAME
         self.secure = secure if secure is not None else settings.MINIO_SECURE
         self.url_expiry = url_expiry or settings.MINIO_URL_EXPIRY
+        self.part_size = max(settings.UPLOAD_PART_SIZE, MIN_PART_SIZE)
         
-        # Initialize MinIO client
+        # Initialize MinIO client on one shared, bounded connection pool
         self.client = Minio(
             endpoint=self.endpoint,
             access_key=self.access_key,
             secret_key=self.secret_key,
-            secure=self.secure
+            secure=self.secure,
+            http_client=_build_http_client()
         )
         
-        # Ensure default bucket exists
-        self._ensure_bucket_exists(self.bucket_name)
+        # Buckets are verified lazily on first upload, so building the client never touches the network
+        self._checked_buckets: set = set()
         
         logger.info(f"Storage client initialized: endpoint={self.endpoint}, bucket={self.bucket_name}")
     
+    supports_multipart = True
+    
     def _ensure_bucket_exists(self, bucket_name: str) -> None:
         """
         Verify bucket exists. For Cloudflare R2, buckets are pre-created in the
         dashboard, so we just check and log — never attempt to create.
+        Each bucket is checked once per process.
         """
+        if bucket_name in self._checked_buckets:
+            return
+        self._checked_buckets.add(bucket_name)
         try:
             exists = self.client.bucket_exists(bucket_name)
             if exists:
@@ -79,46 +283,39 @@ class MinIOClient:
             # Non-fatal — proceed and let actual operations fail with a clear error
     
     def _generate_unique_filename(self, original_filename: str, folder: str = "") -> str:
-        """
-        Generate a unique filename with UUID prefix.
-        
-        Args:
-            original_filename: Original file name
-            folder: Optional folder path (e.g., 'notes', 'assignments')
-        
-        Returns:
-            Unique object name with format: folder/uuid_filename.ext
-        """
-        # Extract file extension
-        file_extension = original_filename.split(".")[-1] if "." in original_filename else ""
-        
-        # Generate unique ID
-        unique_id = str(uuid.uuid4())
-        
-        # Create filename
-        if file_extension:
-            filename = f"{unique_id}_{original_filename}"
-        else:
-            filename = f"{unique_id}_{original_filename}"
-        
-        # Add folder prefix if provided
-        if folder:
-            return f"{folder.strip('/')}/{filename}"
-        return filename
+        """Generate a unique object name; see ``unique_object_name``."""
+        return unique_object_name(original_filename, folder)
     
-    async def upload_file(
+    def public_url(self, object_name: str, bucket_name: Optional[str] = None) -> str:
+        """Public URL of an object (always HTTPS for R2)."""
+        return f"https://{self.endpoint}/{bucket_name or self.bucket_name}/{object_name}"
+    
+    def upload_stream(
         self,
-        file: UploadFile,
+        data: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None,
         folder: str = "",
-        bucket_name: Optional[str] = None
+        bucket_name: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        object_name: Optional[str] = None
     ) -> dict:
         """
-        Upload a file to MinIO storage.
+        Upload a file-like object to MinIO storage (blocking).
+        
+        The body is read in ``part_size`` chunks (a multipart upload for
+        anything larger than one part), so memory per upload stays bounded by
+        the part size, and a SHA-256 of the content is computed on the way
+        through. Use ``AsyncStorage.upload_file`` from async code.
         
         Args:
-            file: FastAPI UploadFile object
+            data: Readable binary stream, read from its current position
+            filename: Original file name
+            content_type: MIME type of the file
             folder: Folder path within bucket (e.g., 'notes', 'assignments', 'submissions')
             bucket_name: Optional bucket name (defaults to self.bucket_name)
+            max_bytes: Optional size limit (defaults to settings.UPLOAD_MAX_BYTES)
+            object_name: Store under this exact key instead of a generated unique name
         
         Returns:
             Dictionary containing:
@@ -126,60 +323,57 @@ class MinIOClient:
                 - file_url: Public URL to access the file
                 - bucket: Bucket name
                 - size: File size in bytes
+                - sha256: Hex digest of the file content
         
-        Example:
-            >>> result = await minio_client.upload_file(file, folder="notes")
-            >>> print(result['file_url'])
-            http://localhost:9000/lms-files/notes/uuid_document.pdf
+        Raises:
+            UploadTooLargeError: If the file is larger than ``max_bytes``
         """
         bucket = bucket_name or self.bucket_name
+        limit = max_bytes or settings.UPLOAD_MAX_BYTES
+        
+        # Generate unique filename
+        object_name = object_name or unique_object_name(filename, folder)
         
         try:
-            # Ensure bucket exists
             self._ensure_bucket_exists(bucket)
-            
-            # Generate unique filename
-            object_name = self._generate_unique_filename(file.filename, folder)
-            
-            # Read file content
-            file_content = await file.read()
-            file_size = len(file_content)
-            
-            # Upload to MinIO
-            from io import BytesIO
+            reader = _HashingReader(data, limit)
+            # length=-1: size unknown up front, the client uploads part_size chunks
+            # and aborts the multipart upload if reading fails
             self.client.put_object(
                 bucket_name=bucket,
                 object_name=object_name,
-                data=BytesIO(file_content),
-                length=file_size,
-                content_type=file.content_type or "application/octet-stream"
+                data=reader,
+                length=-1,
+                part_size=self.part_size,
+                content_type=content_type or "application/octet-stream"
             )
-            
-            # Generate public URL (always HTTPS for R2)
-            file_url = f"https://{self.endpoint}/{bucket}/{object_name}"
-            
-            logger.info(f"File uploaded successfully: {object_name} ({file_size} bytes)")
-            
-            return {
-                "object_name": object_name,
-                "file_url": file_url,
-                "bucket": bucket,
-                "size": file_size,
-                "content_type": file.content_type
-            }
-            
+        except UploadTooLargeError:
+            logger.warning(f"Upload rejected, larger than {limit} bytes: {filename}")
+            raise
         except S3Error as e:
             logger.error(f"Error uploading file: {e}")
             raise
         except Exception as e:
             logger.error(f"Unexpected error during file upload: {e}")
             raise
+        
+        logger.info(f"File uploaded successfully: {object_name} ({reader.size} bytes)")
+        
+        return {
+            "object_name": object_name,
+            "file_url": self.public_url(object_name, bucket),
+            "bucket": bucket,
+            "size": reader.size,
+            "content_type": content_type,
+            "sha256": reader.sha256.hexdigest()
+        }
     
     def generate_presigned_url(
         self,
         object_name: str,
         bucket_name: Optional[str] = None,
-        expiry: Optional[int] = None
+        expiry: Optional[int] = None,
+        filename: Optional[str] = None
     ) -> str:
         """
         Generate a presigned URL for temporary secure access to a file.
@@ -191,6 +385,7 @@ class MinIOClient:
             object_name: Object path in bucket (e.g., 'notes/uuid_file.pdf')
             bucket_name: Optional bucket name (defaults to self.bucket_name)
             expiry: URL expiry time in seconds (defaults to self.url_expiry)
+            filename: Optional name the browser should use (for keys that are not readable names)
         
         Returns:
             Presigned URL string
@@ -206,7 +401,10 @@ class MinIOClient:
             url = self.client.presigned_get_object(
                 bucket_name=bucket,
                 object_name=object_name,
-                expires=timedelta(seconds=int(expiry_seconds))
+                expires=timedelta(seconds=int(expiry_seconds)),
+                response_headers=(
+                    {"response-content-disposition": content_disposition(filename)} if filename else None
+                )
             )
             logger.info(f"Generated presigned URL for {object_name} (expires in {expiry_seconds}s)")
             return url
@@ -214,6 +412,134 @@ class MinIOClient:
             logger.error(f"Error generating presigned URL: {e}")
             raise
     
+    def generate_presigned_put_url(
+        self,
+        object_name: str,
+        expiry: Optional[int] = None,
+        bucket_name: Optional[str] = None
+    ) -> str:
+        """
+        Generate a presigned URL the client can PUT an object to directly.
+        
+        Args:
+            object_name: Object path the upload will be stored at
+            expiry: URL expiry time in seconds (defaults to self.url_expiry)
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        
+        Returns:
+            Presigned URL string
+        """
+        bucket = bucket_name or self.bucket_name
+        expiry_seconds = expiry or self.url_expiry
+        return self.client.presigned_put_object(
+            bucket_name=bucket,
+            object_name=object_name,
+            expires=timedelta(seconds=int(expiry_seconds))
+        )
+    
+    def create_multipart_upload(
+        self,
+        object_name: str,
+        content_type: Optional[str] = None,
+        bucket_name: Optional[str] = None
+    ) -> str:
+        """
+        Start a multipart upload whose parts the client uploads directly.
+        
+        Args:
+            object_name: Object path the upload will be stored at
+            content_type: MIME type recorded on the final object
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        
+        Returns:
+            Upload ID to pass to the part URLs and to complete / abort
+        """
+        bucket = bucket_name or self.bucket_name
+        headers = {"Content-Type": content_type or "application/octet-stream"}
+        # minio-py only exposes multipart uploads through put_object; the
+        # lower-level calls are what it uses internally
+        return self.client._create_multipart_upload(bucket, object_name, headers)
+    
+    def generate_presigned_part_urls(
+        self,
+        object_name: str,
+        upload_id: str,
+        part_count: int,
+        expiry: Optional[int] = None,
+        bucket_name: Optional[str] = None
+    ) -> list:
+        """
+        Generate one presigned PUT URL per part of a multipart upload.
+        
+        Args:
+            object_name: Object path of the multipart upload
+            upload_id: ID returned by create_multipart_upload
+            part_count: Number of parts (numbered from 1)
+            expiry: URL expiry time in seconds (defaults to self.url_expiry)
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        
+        Returns:
+            List of URLs, index 0 being part 1
+        """
+        bucket = bucket_name or self.bucket_name
+        expires = timedelta(seconds=int(expiry or self.url_expiry))
+        return [
+            self.client.get_presigned_url(
+                "PUT",
+                bucket,
+                object_name,
+                expires=expires,
+                extra_query_params={"uploadId": upload_id, "partNumber": str(part_number)}
+            )
+            for part_number in range(1, part_count + 1)
+        ]
+    
+    def complete_multipart_upload(
+        self,
+        object_name: str,
+        upload_id: str,
+        parts: list,
+        bucket_name: Optional[str] = None
+    ) -> None:
+        """
+        Assemble the uploaded parts into the final object.
+        
+        Args:
+            object_name: Object path of the multipart upload
+            upload_id: ID returned by create_multipart_upload
+            parts: (part_number, etag) pairs as reported by the client
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        """
+        bucket = bucket_name or self.bucket_name
+        self.client._complete_multipart_upload(
+            bucket,
+            object_name,
+            upload_id,
+            [Part(number, etag) for number, etag in sorted(parts)]
+        )
+        logger.info(f"Multipart upload completed: {object_name} ({len(parts)} parts)")
+    
+    def abort_multipart_upload(
+        self,
+        object_name: str,
+        upload_id: str,
+        bucket_name: Optional[str] = None
+    ) -> None:
+        """
+        Abort a multipart upload and discard its uploaded parts.
+        
+        Args:
+            object_name: Object path of the multipart upload
+            upload_id: ID returned by create_multipart_upload
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        """
+        bucket = bucket_name or self.bucket_name
+        try:
+            self.client._abort_multipart_upload(bucket, object_name, upload_id)
+            logger.info(f"Multipart upload aborted: {object_name}")
+        except S3Error as e:
+            logger.warning(f"Could not abort multipart upload {object_name}: {e}")
+    
     def delete_file(
         self,
         object_name: str,
@@ -239,6 +565,34 @@ class MinIOClient:
             logger.error(f"Error deleting file: {e}")
             raise
     
+    def delete_files(
+        self,
+        object_names: Iterable[str],
+        bucket_name: Optional[str] = None
+    ) -> list:
+        """
+        Delete many objects with multi-object DELETE requests (up to 1000 keys each).
+        
+        Args:
+            object_names: Object paths in bucket
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+        
+        Returns:
+            Names of the objects that could not be deleted
+        """
+        bucket = bucket_name or self.bucket_name
+        
+        # remove_objects is lazy: the requests are only sent while iterating the errors
+        errors = self.client.remove_objects(
+            bucket_name=bucket,
+            delete_object_list=(DeleteObject(name) for name in object_names)
+        )
+        failed = []
+        for error in errors:
+            logger.error(f"Error deleting {error.name}: {error.code} {error.message}")
+            failed.append(error.name)
+        return failed
+    
     def file_exists(
         self,
         object_name: str,
@@ -292,65 +646,102 @@ class MinIOClient:
             logger.error(f"Error getting file info: {e}")
             raise
     
+    def iter_file_chunks(
+        self,
+        object_name: str,
+        chunk_size: int = 1024 * 1024,
+        bucket_name: Optional[str] = None,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """
+        Stream an object's content (or a byte range of it) in fixed-size chunks.
+
+        The underlying HTTP response is only held open while the generator is
+        being consumed, and is released back to the pool when it is closed.
+
+        Args:
+            object_name: Object path in bucket
+            chunk_size: Maximum bytes per yielded chunk
+            bucket_name: Optional bucket name (defaults to self.bucket_name)
+            offset: First byte to read
+            length: Number of bytes to read (default: to the end of the object)
+
+        Yields:
+            Raw byte chunks of the object
+        """
+        bucket = bucket_name or self.bucket_name
+
+        # Sent as a Range header; length 0 means "to the end"
+        response = self.client.get_object(
+            bucket_name=bucket, object_name=object_name, offset=offset, length=length or 0
+        )
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
     def list_files(
         self,
         prefix: str = "",
-        page: int = 1,
-        limit: int = 10,
+        limit: int = 1000,
+        cursor: Optional[str] = None,
         bucket_name: Optional[str] = None
     ) -> dict:
         """
-        List all files in the MinIO bucket with pagination.
+        List one page of objects under a prefix, in key order.
+        
+        Only ``limit + 1`` keys are requested (one ListObjectsV2 call for pages
+        up to 999), so the cost of a page does not depend on how many objects
+        the prefix holds. There is no total count for the same reason.
         
         Args:
             prefix: Optional prefix to filter files
-            page: Page number
             limit: Items per page
+            cursor: ``next_cursor`` of the previous page (None for the first page)
             bucket_name: Optional bucket name
         
         Returns:
-            Dictionary with items, total, page, limit
+            Dictionary with items, next_cursor (None on the last page) and limit
+        
+        Raises:
+            ValueError: If the cursor is invalid
         """
         bucket = bucket_name or self.bucket_name
+        start_after = decode_cursor(cursor)
         
         try:
-            if not self.client.bucket_exists(bucket):
-                return {"items": [], "total": 0, "page": page, "limit": limit}
-            
-            # List all objects with prefix
-            objects = self.client.list_objects(
-                bucket_name=bucket,
+            # The public list_objects always asks for 1000 keys per request
+            objects = self.client._list_objects(
+                bucket,
                 prefix=prefix,
-                recursive=True
+                start_after=start_after,
+                max_keys=limit + 1,
+                encoding_type="url"
             )
-            
-            # Convert to list to enable slicing and counting
-            all_files = []
-            for obj in objects:
-                all_files.append({
+            page = [
+                {
                     "object_name": obj.object_name,
                     "size": obj.size,
                     "last_modified": obj.last_modified,
                     "etag": obj.etag,
                     "is_dir": obj.is_dir
-                })
-            
-            total = len(all_files)
-            skip = (page - 1) * limit
-            paginated_items = all_files[skip : skip + limit]
-            
-            logger.info(f"Listed {len(paginated_items)}/{total} files from bucket {bucket} with prefix '{prefix}'")
-            
-            return {
-                "items": paginated_items,
-                "total": total,
-                "page": page,
-                "limit": limit
-            }
-            
+                }
+                for obj in itertools.islice(objects, limit + 1)
+            ]
         except S3Error as e:
+            if e.code == "NoSuchBucket":
+                return {"items": [], "next_cursor": None, "limit": limit}
             logger.error(f"Error listing files: {e}")
             raise
+        
+        items = page[:limit]
+        next_cursor = encode_cursor(items[-1]["object_name"]) if len(page) > limit else None
+        logger.info(f"Listed {len(items)} files from bucket {bucket} with prefix '{prefix}'")
+        
+        return {"items": items, "next_cursor": next_cursor, "limit": limit}
 
 
 # Global MinIO client instance
@@ -371,3 +762,230 @@ def get_minio_client() -> MinIOClient:
     if _minio_client is None:
         _minio_client = MinIOClient()
     return _minio_client
+
+
+T = TypeVar("T")
+
+
+class AsyncStorage:
+    """
+    Non-blocking facade over a ``StorageBackend`` for use from ``async def`` code.
+    
+    Backends are synchronous (the S3 SDK, or plain file I/O), so every call
+    runs on a dedicated thread pool sized for I/O (``STORAGE_MAX_WORKERS``)
+    instead of the event loop or the default executor shared with everything
+    else. For S3, connections come from the client's shared urllib3 pool,
+    which applies the timeouts and retries.
+    
+    Attributes:
+        backend: Underlying synchronous storage backend
+    """
+    
+    def __init__(self, backend: StorageBackend, max_workers: Optional[int] = None):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.STORAGE_MAX_WORKERS,
+            thread_name_prefix="storage"
+        )
+    
+    @property
+    def bucket_name(self) -> str:
+        return self.backend.bucket_name
+    
+    @property
+    def part_size(self) -> int:
+        return self.backend.part_size
+    
+    def public_url(self, object_name: str) -> str:
+        return self.backend.public_url(object_name)
+    
+    @property
+    def supports_multipart(self) -> bool:
+        return self.backend.supports_multipart
+    
+    def unique_object_name(self, filename: str, folder: str = "") -> str:
+        return unique_object_name(filename, folder)
+    
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking storage call on the storage thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+    
+    async def upload_file(
+        self,
+        file: UploadFile,
+        folder: str = "",
+        bucket_name: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        object_name: Optional[str] = None
+    ) -> dict:
+        """
+        Stream a spooled ``UploadFile`` to storage. See ``MinIOClient.upload_stream``.
+        
+        Raises:
+            UploadTooLargeError: If the file is larger than ``max_bytes``
+        """
+        limit = max_bytes or settings.UPLOAD_MAX_BYTES
+        # Starlette knows the size of the spooled part already: reject before transferring anything
+        if file.size is not None and file.size > limit:
+            raise UploadTooLargeError(limit)
+        
+        await file.seek(0)
+        return await self.run(
+            self.backend.upload_stream,
+            file.file,
+            file.filename,
+            content_type=file.content_type,
+            folder=folder,
+            bucket_name=bucket_name,
+            max_bytes=limit,
+            object_name=object_name
+        )
+    
+    async def hash_file(self, file: UploadFile, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+        """
+        SHA-256 and size of a spooled ``UploadFile`` (read locally, nothing is transferred).
+        
+        Raises:
+            UploadTooLargeError: If the file is larger than ``max_bytes``
+        """
+        limit = max_bytes or settings.UPLOAD_MAX_BYTES
+        
+        def _hash() -> Tuple[str, int]:
+            file.file.seek(0)
+            reader = _HashingReader(file.file, limit)
+            while reader.read(HASH_CHUNK):
+                pass
+            file.file.seek(0)
+            return reader.sha256.hexdigest(), reader.size
+        
+        return await self.run(_hash)
+    
+    async def presigned_get_url(
+        self, object_name: str, expiry: Optional[int] = None, filename: Optional[str] = None
+    ) -> str:
+        return await self.run(self.backend.generate_presigned_url, object_name, expiry=expiry, filename=filename)
+    
+    async def presigned_get_urls(
+        self,
+        object_names: Iterable[str],
+        expiry: Optional[int] = None,
+        filenames: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """
+        Presigned GET URLs for many objects in one pool hop.
+        
+        Signing is local work, so a whole page of objects is signed in one
+        call; objects that fail are left out (and logged) rather than failing
+        the page.
+        """
+        names = list(dict.fromkeys(object_names))
+        
+        def _sign() -> Dict[str, str]:
+            urls = {}
+            for name in names:
+                try:
+                    urls[name] = self.backend.generate_presigned_url(
+                        name, expiry=expiry, filename=(filenames or {}).get(name)
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to generate presigned URL for {name}: {e}")
+            return urls
+        
+        return await self.run(_sign) if names else {}
+    
+    async def presigned_put_url(self, object_name: str, expiry: Optional[int] = None) -> str:
+        return await self.run(self.backend.generate_presigned_put_url, object_name, expiry)
+    
+    async def create_multipart_upload(self, object_name: str, content_type: Optional[str] = None) -> str:
+        return await self.run(self.backend.create_multipart_upload, object_name, content_type)
+    
+    async def presigned_part_urls(
+        self, object_name: str, upload_id: str, part_count: int, expiry: Optional[int] = None
+    ) -> list:
+        return await self.run(self.backend.generate_presigned_part_urls, object_name, upload_id, part_count, expiry)
+    
+    async def complete_multipart_upload(self, object_name: str, upload_id: str, parts: list) -> None:
+        await self.run(self.backend.complete_multipart_upload, object_name, upload_id, parts)
+    
+    async def abort_multipart_upload(self, object_name: str, upload_id: str) -> None:
+        await self.run(self.backend.abort_multipart_upload, object_name, upload_id)
+    
+    async def exists(self, object_name: str) -> bool:
+        return await self.run(self.backend.file_exists, object_name)
+    
+    async def stat(self, object_name: str) -> dict:
+        return await self.run(self.backend.get_file_info, object_name)
+    
+    async def delete(self, object_name: str) -> bool:
+        return await self.run(self.backend.delete_file, object_name)
+
+    async def delete_many(self, object_names: Iterable[str]) -> list:
+        """Bulk delete; returns the names that could not be deleted."""
+        return await self.run(self.backend.delete_files, list(object_names))
+    
+    async def list_files(self, prefix: str = "", limit: int = 1000, cursor: Optional[str] = None) -> dict:
+        return await self.run(self.backend.list_files, prefix=prefix, limit=limit, cursor=cursor)
+
+    async def iter_objects(self, prefix: str = "", page_size: int = 1000) -> AsyncIterator[dict]:
+        """
+        Every object under ``prefix`` in key order, fetched one page at a time.
+
+        Memory is bounded by ``page_size`` whatever the size of the listing;
+        meant for reconciliation jobs that walk a whole prefix.
+        """
+        cursor = None
+        while True:
+            page = await self.list_files(prefix, limit=page_size, cursor=cursor)
+            for item in page["items"]:
+                yield item
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+    
+    async def iter_file_chunks(
+        self, object_name: str, chunk_size: int = 1024 * 1024, offset: int = 0, length: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Stream an object's content (or ``length`` bytes from ``offset``); each chunk is read on the storage pool."""
+        chunks = self.backend.iter_file_chunks(object_name, chunk_size, offset=offset, length=length)
+        sentinel = object()
+        try:
+            while True:
+                chunk = await self.run(next, chunks, sentinel)
+                if chunk is sentinel:
+                    break
+                yield chunk
+        finally:
+            await self.run(chunks.close)
+
+
+# Global async storage adapter
+_storage: Optional[AsyncStorage] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    Get the configured storage backend (``settings.STORAGE_BACKEND``).
+    
+    Returns:
+        The global MinIOClient for "s3", or the global LocalFileStorage for "local"
+    """
+    if settings.STORAGE_BACKEND == "local":
+        from app.core.storage_local import get_local_storage
+        return get_local_storage()
+    if settings.STORAGE_BACKEND != "s3":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND!r}")
+    return get_minio_client()
+
+
+def get_storage() -> AsyncStorage:
+    """
+    Get or create the global AsyncStorage adapter (wrapping the configured backend).
+    
+    Returns:
+        AsyncStorage instance
+    """
+    global _storage
+    if _storage is None:
+        _storage = AsyncStorage(get_storage_backend())
+    return _storage
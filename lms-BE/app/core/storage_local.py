@@ -0,0 +1,349 @@
+"""
+Local-filesystem storage engine.
+
+Objects are plain files under ``LOCAL_STORAGE_ROOT/<bucket>/<object name>``.
+Writes go to a temporary file in the target directory and are renamed into
+place, so readers never see a partial object. Presigned URLs point at the
+``/v1/files/local/...`` endpoints and carry an HMAC signature and expiry
+instead of S3 credentials. Public URLs (stored in notes and submissions) are
+the same path without a signature; that endpoint serves them to callers
+with an access token for the owning school.
+
+Meant for single-node deployments, local development and benchmarks that
+should not depend on a network service.
+"""
+
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from datetime import datetime, UTC
+from typing import BinaryIO, Iterable, Iterator, Optional
+from urllib.parse import quote
+
+from app.core.config import settings
+from app.core.storage import MultipartNotSupportedError, UploadTooLargeError, _HashingReader, decode_cursor, encode_cursor, unique_object_name
+
+logger = logging.getLogger(__name__)
+
+# Read / write buffer for copying streams to disk
+COPY_CHUNK = 1024 * 1024
+TEMP_PREFIX = ".tmp-"
+
+
+class AtomicFile:
+    """
+    Writable file that only appears at its final path once ``commit`` is called.
+
+    Use as a context manager: leaving the block without committing (or with an
+    exception) removes the temporary file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        self._file = os.fdopen(fd, "wb")
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "AtomicFile":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None or not self._file.closed:
+            self.abort()
+
+
+class LocalFileStorage:
+    """
+    ``StorageBackend`` that keeps objects on the local filesystem.
+
+    Attributes:
+        root: Absolute directory that holds one sub-directory per bucket
+        bucket_name: Default bucket (sub-directory of ``root``)
+        base_url: Public URL of the signed download / upload endpoints
+        url_expiry: Default expiry time for signed URLs in seconds
+    """
+
+    supports_multipart = False
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        bucket_name: Optional[str] = None,
+        base_url: Optional[str] = None,
+        signing_key: Optional[str] = None,
+        url_expiry: Optional[int] = None
+    ):
+        self.root = os.path.abspath(root or settings.LOCAL_STORAGE_ROOT)
+        self.bucket_name = bucket_name or settings.MINIO_BUCKET_NAME
+        self.base_url = (base_url or settings.LOCAL_STORAGE_BASE_URL).rstrip("/")
+        self.url_expiry = url_expiry or settings.MINIO_URL_EXPIRY
+        self.part_size = settings.UPLOAD_PART_SIZE
+        self._signing_key = (signing_key or settings.LOCAL_STORAGE_SIGNING_KEY or settings.SECRET_KEY).encode()
+
+        logger.info(f"Local storage initialized: root={self.root}, bucket={self.bucket_name}")
+
+    # -- paths and signatures ------------------------------------------------
+
+    def local_path(self, object_name: str, bucket_name: Optional[str] = None) -> str:
+        """
+        Filesystem path of an object.
+
+        Raises:
+            ValueError: If the name would resolve outside the bucket directory
+        """
+        bucket_dir = os.path.join(self.root, bucket_name or self.bucket_name)
+        path = os.path.normpath(os.path.join(bucket_dir, object_name))
+        if not path.startswith(bucket_dir + os.sep) or os.path.basename(path).startswith(TEMP_PREFIX):
+            raise ValueError(f"Invalid object name: {object_name!r}")
+        return path
+
+    def sign(self, method: str, object_name: str, expires: int) -> str:
+        message = f"{method.upper()}\n{object_name}\n{expires}".encode()
+        return hmac.new(self._signing_key, message, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, method: str, object_name: str, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(method, object_name, expires), signature)
+
+    def _signed_url(self, method: str, object_name: str, expiry: Optional[int]) -> str:
+        expires = int(time.time()) + int(expiry or self.url_expiry)
+        signature = self.sign(method, object_name, expires)
+        return f"{self.public_url(object_name)}?expires={expires}&signature={signature}"
+
+    def public_url(self, object_name: str, bucket_name: Optional[str] = None) -> str:
+        return f"{self.base_url}/{quote(object_name)}"
+
+    # -- writes ---------------------------------------------------------------
+
+    def open_atomic(self, object_name: str, bucket_name: Optional[str] = None) -> AtomicFile:
+        return AtomicFile(self.local_path(object_name, bucket_name))
+
+    def write_stream(
+        self,
+        object_name: str,
+        chunks: Iterable[bytes],
+        bucket_name: Optional[str] = None
+    ) -> int:
+        """Write ``chunks`` to ``object_name`` atomically; returns the size in bytes."""
+        with self.open_atomic(object_name, bucket_name) as target:
+            for chunk in chunks:
+                target.write(chunk)
+            target.commit()
+        return target.size
+
+    def upload_stream(
+        self,
+        data: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None,
+        folder: str = "",
+        bucket_name: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        object_name: Optional[str] = None
+    ) -> dict:
+        """
+        Copy a file-like object into storage. Same contract as ``MinIOClient.upload_stream``.
+
+        Raises:
+            UploadTooLargeError: If the file is larger than ``max_bytes``
+        """
+        limit = max_bytes or settings.UPLOAD_MAX_BYTES
+        object_name = object_name or unique_object_name(filename, folder)
+        reader = _HashingReader(data, limit)
+
+        try:
+            self.write_stream(object_name, iter(lambda: reader.read(COPY_CHUNK), b""), bucket_name)
+        except UploadTooLargeError:
+            logger.warning(f"Upload rejected, larger than {limit} bytes: {filename}")
+            raise
+
+        logger.info(f"File stored locally: {object_name} ({reader.size} bytes)")
+
+        return {
+            "object_name": object_name,
+            "file_url": self.public_url(object_name, bucket_name),
+            "bucket": bucket_name or self.bucket_name,
+            "size": reader.size,
+            "content_type": content_type,
+            "sha256": reader.sha256.hexdigest()
+        }
+
+    # -- presigned URLs -------------------------------------------------------
+
+    def generate_presigned_url(
+        self,
+        object_name: str,
+        bucket_name: Optional[str] = None,
+        expiry: Optional[int] = None,
+        filename: Optional[str] = None
+    ) -> str:
+        url = self._signed_url("GET", object_name, expiry)
+        # Only affects the download name, so it is not part of the signature
+        return f"{url}&filename={quote(filename)}" if filename else url
+
+    def generate_presigned_put_url(
+        self,
+        object_name: str,
+        expiry: Optional[int] = None,
+        bucket_name: Optional[str] = None
+    ) -> str:
+        return self._signed_url("PUT", object_name, expiry)
+
+    def create_multipart_upload(self, object_name: str, content_type: Optional[str] = None, bucket_name: Optional[str] = None) -> str:
+        raise MultipartNotSupportedError("Local storage does not support multipart uploads")
+
+    def generate_presigned_part_urls(self, object_name: str, upload_id: str, part_count: int, expiry: Optional[int] = None, bucket_name: Optional[str] = None) -> list:
+        raise MultipartNotSupportedError("Local storage does not support multipart uploads")
+
+    def complete_multipart_upload(self, object_name: str, upload_id: str, parts: list, bucket_name: Optional[str] = None) -> None:
+        raise MultipartNotSupportedError("Local storage does not support multipart uploads")
+
+    def abort_multipart_upload(self, object_name: str, upload_id: str, bucket_name: Optional[str] = None) -> None:
+        raise MultipartNotSupportedError("Local storage does not support multipart uploads")
+
+    # -- reads and management -------------------------------------------------
+
+    def delete_file(self, object_name: str, bucket_name: Optional[str] = None) -> bool:
+        # Like S3, deleting a missing object is not an error
+        try:
+            os.remove(self.local_path(object_name, bucket_name))
+        except FileNotFoundError:
+            pass
+        logger.info(f"File deleted successfully: {object_name}")
+        return True
+
+    def delete_files(self, object_names: Iterable[str], bucket_name: Optional[str] = None) -> list:
+        failed = []
+        for object_name in object_names:
+            try:
+                os.remove(self.local_path(object_name, bucket_name))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.error(f"Error deleting {object_name}: {e}")
+                failed.append(object_name)
+        return failed
+
+    def file_exists(self, object_name: str, bucket_name: Optional[str] = None) -> bool:
+        try:
+            return os.path.isfile(self.local_path(object_name, bucket_name))
+        except ValueError:
+            return False
+
+    def _info(self, object_name: str, st: os.stat_result) -> dict:
+        return {
+            "object_name": object_name,
+            "size": st.st_size,
+            "last_modified": datetime.fromtimestamp(st.st_mtime, UTC),
+            "content_type": mimetypes.guess_type(object_name)[0],
+            "etag": f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        }
+
+    def get_file_info(self, object_name: str, bucket_name: Optional[str] = None) -> dict:
+        """
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        return self._info(object_name, os.stat(self.local_path(object_name, bucket_name)))
+
+    def iter_file_chunks(
+        self,
+        object_name: str,
+        chunk_size: int = 1024 * 1024,
+        bucket_name: Optional[str] = None,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        with open(self.local_path(object_name, bucket_name), "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def _iter_objects(self, directory: str, key_prefix: str, prefix: str, start_after: str) -> Iterator[tuple]:
+        """
+        ``(object_name, path)`` under ``directory`` in S3 key order, lazily.
+
+        Directories sort as ``name/``, which makes a depth-first walk yield
+        keys in byte order; subtrees entirely before ``start_after`` or
+        outside ``prefix`` are never opened.
+        """
+        try:
+            with os.scandir(directory) as it:
+                entries = [(e.name + "/" if e.is_dir() else e.name, e.path) for e in it]
+        except FileNotFoundError:
+            return
+        for name, path in sorted(entries):
+            key = key_prefix + name
+            if name.endswith("/"):
+                # Skip subtrees that cannot contain a key matching the prefix or past the cursor
+                if not (key.startswith(prefix) or prefix.startswith(key)):
+                    continue
+                if key < start_after and not start_after.startswith(key):
+                    continue
+                yield from self._iter_objects(path, key, prefix, start_after)
+            elif key > start_after and key.startswith(prefix) and not name.startswith(TEMP_PREFIX):
+                yield key, path
+
+    def list_files(
+        self,
+        prefix: str = "",
+        limit: int = 1000,
+        cursor: Optional[str] = None,
+        bucket_name: Optional[str] = None
+    ) -> dict:
+        """One page of objects under ``prefix`` in key order, with the same shape as ``MinIOClient.list_files``."""
+        bucket_dir = os.path.join(self.root, bucket_name or self.bucket_name)
+        objects = self._iter_objects(bucket_dir, "", prefix, decode_cursor(cursor) or "")
+        items = []
+        for object_name, path in objects:
+            if len(items) == limit:
+                return {"items": items, "next_cursor": encode_cursor(items[-1]["object_name"]), "limit": limit}
+            try:
+                info = self._info(object_name, os.stat(path))
+            except FileNotFoundError:
+                continue
+            info["is_dir"] = False
+            del info["content_type"]
+            items.append(info)
+        return {"items": items, "next_cursor": None, "limit": limit}
+
+
+# Global local storage instance
+_local_storage: Optional[LocalFileStorage] = None
+
+
+def get_local_storage() -> LocalFileStorage:
+    global _local_storage
+    if _local_storage is None:
+        _local_storage = LocalFileStorage()
+    return _local_storage
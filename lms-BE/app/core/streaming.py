@@ -0,0 +1,272 @@
+"""
+Streaming Response Helpers
+
+Incremental CSV / XLSX / ZIP writers used by export endpoints, plus a line
+reader for large uploads. Rows are pulled from an
+async iterator (usually a server-side DB cursor) and encoded in small chunks, so
+memory stays flat no matter how many rows the export contains.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Iterable, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi import UploadFile
+from fastapi.responses import StreamingResponse
+
+# Flush buffered output to the client once it grows past this many bytes
+FLUSH_THRESHOLD = 64 * 1024
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only, non-seekable byte sink.
+
+    Writers (csv, zipfile) write into it synchronously; the owning generator
+    periodically calls ``drain()`` and yields what has accumulated.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._size += len(data)
+        return len(data)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        return data
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def iter_csv(header: Sequence[str], rows: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+    """Encode ``rows`` as UTF-8 CSV (with BOM so Excel picks up the encoding)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = "\ufeff" + buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    async for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        if buffer.tell() >= FLUSH_THRESHOLD:
+            yield (pending + buffer.getvalue()).encode("utf-8")
+            pending = ""
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    tail = pending + buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------------------
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_XLSX_SHEET_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+_XLSX_SHEET_CLOSE = "</sheetData></worksheet>"
+
+# Characters that are not allowed in XML 1.0 documents
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_workbook(sheet_name: str) -> str:
+    name = escape(_ILLEGAL_XML_CHARS.sub("", sheet_name)[:31] or "Sheet1", {'"': "&quot;"})
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _xlsx_cell(value: Any) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Iterable[Any]) -> bytes:
+    return ("<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>").encode("utf-8")
+
+
+async def iter_xlsx(
+    header: Sequence[str],
+    rows: AsyncIterator[Sequence[Any]],
+    sheet_name: str = "Sheet1",
+) -> AsyncIterator[bytes]:
+    """
+    Encode ``rows`` as a single-sheet XLSX workbook.
+
+    The workbook is a ZIP written to a non-seekable sink, so entries use data
+    descriptors and the sheet XML is compressed and emitted row by row.
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _xlsx_workbook(sheet_name))
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(_XLSX_SHEET_OPEN.encode("utf-8"))
+            sheet.write(_xlsx_row(header))
+            async for row in rows:
+                sheet.write(_xlsx_row(row))
+                if sink.size >= FLUSH_THRESHOLD:
+                    yield sink.drain()
+            sheet.write(_XLSX_SHEET_CLOSE.encode("utf-8"))
+
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+# ---------------------------------------------------------------------------
+# ZIP
+# ---------------------------------------------------------------------------
+
+async def iter_zip(entries: AsyncIterator[Tuple[str, AsyncIterator[bytes]]]) -> AsyncIterator[bytes]:
+    """
+    Build a ZIP archive on the fly from ``(arcname, chunk iterator)`` pairs.
+
+    Entries are stored uncompressed (uploads are mostly PDFs/images/archives
+    already) with ZIP64 headers, so neither size nor CRC needs to be known up
+    front and only the current chunk is held in memory.
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        async for arcname, chunks in entries:
+            info = zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, mode="w", force_zip64=True) as entry:
+                async for chunk in chunks:
+                    entry.write(chunk)
+                    if sink.size >= FLUSH_THRESHOLD:
+                        yield sink.drain()
+            if sink.size:
+                yield sink.drain()
+
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+# ---------------------------------------------------------------------------
+# Uploads
+# ---------------------------------------------------------------------------
+
+async def iter_upload_lines(upload: UploadFile, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+    """Yield the lines of an uploaded file without reading it into memory at once."""
+    pending = b""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+# ---------------------------------------------------------------------------
+# Response
+# ---------------------------------------------------------------------------
+
+def tabular_response(
+    header: Sequence[str],
+    rows: AsyncIterator[Sequence[Any]],
+    fmt: str,
+    filename: str,
+) -> StreamingResponse:
+    """Wrap a row iterator in a chunked CSV or XLSX download response."""
+    if fmt == "xlsx":
+        body = iter_xlsx(header, rows, sheet_name=filename)
+    else:
+        fmt = "csv"
+        body = iter_csv(header, rows)
+
+    return StreamingResponse(
+        body,
+        media_type=CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,197 @@
+"""
+Per-assignment structure and answer key.
+
+Assignment settings, questions, marks and options are loaded in a single query
+and cached (in process and in Redis, see ``app.core.cache``) as one compact
+payload. From it we derive, once per process:
+
+- the student view (no ``is_correct``) and the teacher view of the assignment
+- per-question option-id sets used by the grader
+
+Quizzes rarely change once published; every edit path calls
+``invalidate_answer_key`` which bumps the cache version.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import VersionedCache
+from app.core.conditional import make_etag
+from app.features.courses.models_assignment import Assignment
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_mcq import MCQOption
+from app.features.courses.models_question import Question
+from app.features.courses.schemas_assignment import AssignmentRead, AssignmentTeacherRead
+
+ANSWER_KEY_TTL = 24 * 3600
+
+
+@dataclass(frozen=True)
+class KeyedQuestion:
+    id: int
+    question_text: str
+    question_type: str
+    marks: float
+    order_index: int
+    # (id, option_text, is_correct) in display order
+    options: Tuple[Tuple[int, str, bool], ...]
+    option_ids: frozenset
+    correct_ids: frozenset
+
+    def as_dict(self, include_answers: bool = False) -> dict:
+        options = []
+        for option_id, option_text, is_correct in self.options:
+            option = {"id": option_id, "option_text": option_text}
+            if include_answers:
+                option["is_correct"] = is_correct
+            options.append(option)
+        return {
+            "id": self.id,
+            "question_text": self.question_text,
+            "question_type": self.question_type,
+            "marks": self.marks,
+            "order_index": self.order_index,
+            "options": options,
+        }
+
+    def option_dicts(self, option_ids: Iterable[int]) -> List[dict]:
+        wanted = set(option_ids)
+        return [{"id": oid, "option_text": text} for oid, text, _ in self.options if oid in wanted]
+
+
+class AnswerKey:
+    """Decoded cache payload. Instances are shared between requests: treat as read-only."""
+
+    def __init__(self, payload: dict):
+        self.assignment_id: int = payload["material_id"]
+        self.title: Optional[str] = payload.get("title")
+        self.course_id: int = payload["course_id"]
+        self.school_id: int = payload["school_id"]
+        self.is_deleted: bool = payload["is_deleted"]
+        self.assignment_type: str = payload["assignment_type"]
+        self.total_marks: float = payload["total_marks"]
+        self.due_date: Optional[date] = date.fromisoformat(payload["due_date"]) if payload["due_date"] else None
+        self.max_attempts: int = payload["max_attempts"]
+        self.time_limit_minutes: Optional[int] = payload.get("time_limit_minutes")
+
+        self.questions: Dict[int, KeyedQuestion] = {}
+        for q in payload["questions"]:
+            options = tuple((o["id"], o["option_text"], o["is_correct"]) for o in q["options"])
+            self.questions[q["id"]] = KeyedQuestion(
+                id=q["id"],
+                question_text=q["question_text"],
+                question_type=q["question_type"],
+                marks=q["marks"],
+                order_index=q["order_index"],
+                options=options,
+                option_ids=frozenset(o[0] for o in options),
+                correct_ids=frozenset(o[0] for o in options if o[2]),
+            )
+
+        self.teacher_view: dict = AssignmentTeacherRead.model_validate(payload).model_dump(mode="json")
+        self.student_view: dict = AssignmentRead.model_validate(payload).model_dump(mode="json")
+        # Validators for conditional GETs, computed once per decoded key
+        self.teacher_etag: str = make_etag("assignment", "teacher", json.dumps(self.teacher_view, sort_keys=True))
+        self.student_etag: str = make_etag("assignment", "student", json.dumps(self.student_view, sort_keys=True))
+
+
+_cache = VersionedCache("assignment_key", ttl=ANSWER_KEY_TTL, decode=AnswerKey)
+
+
+async def load_answer_key_payload(db: AsyncSession, assignment_id: int) -> Optional[dict]:
+    """Build the JSON payload from the DB: one query for the assignment, one for questions and options."""
+    row = (await db.execute(
+        select(Assignment, LearningMaterial)
+        .join(LearningMaterial, Assignment.material_id == LearningMaterial.id)
+        .where(Assignment.material_id == assignment_id)
+    )).first()
+    if not row:
+        return None
+    assignment, material = row
+
+    rows = (await db.execute(
+        select(
+            Question.id, Question.question_text, Question.question_type, Question.marks, Question.order_index,
+            MCQOption.id, MCQOption.option_text, MCQOption.is_correct,
+        )
+        .outerjoin(MCQOption, MCQOption.question_id == Question.id)
+        .where(Question.assignment_id == assignment_id)
+        .order_by(Question.order_index, Question.id, MCQOption.id)
+    )).all()
+
+    questions: Dict[int, dict] = {}
+    for q_id, text, q_type, marks, order_index, o_id, o_text, o_correct in rows:
+        question = questions.get(q_id)
+        if question is None:
+            question = questions[q_id] = {
+                "id": q_id,
+                "question_text": text,
+                "question_type": q_type,
+                "marks": float(marks),
+                "order_index": order_index,
+                "options": [],
+            }
+        if o_id is not None:
+            question["options"].append({"id": o_id, "option_text": o_text, "is_correct": bool(o_correct)})
+
+    return {
+        "material_id": assignment.material_id,
+        "title": material.title,
+        "course_id": material.course_id,
+        "school_id": material.school_id,
+        "is_deleted": material.is_deleted,
+        "assignment_type": assignment.assignment_type,
+        "total_marks": float(assignment.total_marks),
+        "due_date": assignment.due_date.isoformat() if assignment.due_date else None,
+        "max_attempts": assignment.max_attempts,
+        "time_limit_minutes": assignment.time_limit_minutes,
+        "description": assignment.description,
+        "reference_materials": assignment.reference_materials or [],
+        "questions": list(questions.values()),
+    }
+
+
+async def get_answer_key(db: AsyncSession, assignment_id: int) -> Optional[AnswerKey]:
+    return await _cache.get_or_load(assignment_id, lambda: load_answer_key_payload(db, assignment_id))
+
+
+async def invalidate_answer_key(assignment_id: int) -> None:
+    await _cache.invalidate(assignment_id)
+
+
+def score_answers(
+    key: AnswerKey, selections: Iterable[Tuple[int, Iterable[int]]]
+) -> Tuple[List[float], float, bool]:
+    """
+    Grade ``(question_id, selected option ids)`` pairs against the key.
+
+    An MCQ answer earns ``max(0, (right - wrong) / total_correct) * marks``.
+    Non-MCQ answers score 0 until a teacher grades them. Returns the
+    per-answer marks, the total, and whether every answer was auto-gradable.
+    """
+    marks: List[float] = []
+    total = 0.0
+    all_mcq = True
+    for question_id, selected in selections:
+        question = key.questions.get(question_id)
+        if question is None or question.question_type != "MCQ":
+            all_mcq = False
+            marks.append(0.0)
+            continue
+
+        selected = set(selected)
+        if not selected or not question.correct_ids:
+            marks.append(0.0)
+            continue
+
+        right = len(selected & question.correct_ids)
+        wrong = len(selected) - right
+        obtained = max(0.0, (right - wrong) / len(question.correct_ids)) * question.marks
+        marks.append(obtained)
+        total += obtained
+    return marks, total, all_mcq
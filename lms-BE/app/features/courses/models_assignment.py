@@ -31,6 +31,9 @@ class Assignment(Base):
 
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # Timed exam duration; NULL means untimed
+    time_limit_minutes: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     reference_materials: Mapped[list[dict] | None] = mapped_column(JSONB, nullable=True, default=list)
     
     material = relationship("LearningMaterial", back_populates="assignment")
@@ -0,0 +1,45 @@
+from sqlalchemy import Integer, ForeignKey, LargeBinary, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from datetime import datetime
+
+from app.core.db_base import Base
+
+class TextSignature(Base):
+    """MinHash signature of one TEXT answer or one text-bearing file submission."""
+
+    __tablename__ = "text_signatures"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    assignment_id: Mapped[int] = mapped_column(
+        ForeignKey("assignments.material_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+
+    student_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    # Exactly one of the two sources is set
+    student_answer_id: Mapped[int | None] = mapped_column(
+        ForeignKey("student_answers.id", ondelete="CASCADE"),
+        nullable=True,
+        unique=True
+    )
+    submission_id: Mapped[int | None] = mapped_column(
+        ForeignKey("submissions.id", ondelete="CASCADE"),
+        nullable=True,
+        unique=True
+    )
+
+    question_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # NUM_PERM little-endian uint32 values; NULL when the text is too short to compare
+    signature: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
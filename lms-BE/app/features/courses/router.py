@@ -1,8 +1,9 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.conditional import is_not_modified, json_response, not_modified, query_stamp
 from app.features.courses.schemas import CourseCreate, CourseRead, CourseUpdate
 from app.features.courses import service as course_crud
 from app.features.auth.dependencies import get_current_user, require_role
@@ -29,13 +30,23 @@ from app.core.pagination import PaginatedResponse
 # LIST → any logged-in user
 @router.get("/", response_model=PaginatedResponse[CourseRead])
 async def list_courses_api(
+    request: Request,
     page: int = 1,
     limit: int = 10,
     deleted: Optional[bool] = Query(None),
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    return await course_crud.get_courses_for_user(db, current_user, page, limit, is_deleted=deleted)
+    etag = None
+    stamp_query = course_crud.courses_stamp_query(current_user, is_deleted=deleted)
+    if stamp_query is not None:
+        active_role = getattr(current_user, 'active_role', current_user.role)
+        etag = await query_stamp(db, stamp_query, "courses", current_user.id, active_role, page, limit, deleted)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+    result = await course_crud.get_courses_for_user(db, current_user, page, limit, is_deleted=deleted)
+    return json_response(request, PaginatedResponse[CourseRead].model_validate(result, from_attributes=True), etag=etag)
 
 
 # GET → any logged-in user
@@ -1,20 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from app.core.database import get_db
+from app.core.conditional import json_response
 from app.features.courses.schemas_assignment import (
-    AssignmentRead,
-    AssignmentTeacherRead,
     StudentAssignmentCreate,
     StudentAssignmentRead,
+    StudentAssignmentTeacherRead,
+    AnswerKeyUpdate,
+    RegradeJobRead,
+    ExamAutosave,
+    ExamSessionRead,
 )
-from app.features.courses.models_assignment import Assignment
-from app.features.courses.models_question import Question
 from app.features.courses.models_student_assignment import StudentAssignment
 from app.features.courses.models_answer import StudentAnswer
-from app.features.courses.service_assignment import create_student_attempt
+from app.features.courses.service_assignment import (
+    create_student_attempt,
+    import_question_bank,
+    update_answer_key,
+    load_attempt_answers,
+    build_attempt_response,
+)
+from app.features.courses.answer_key import get_answer_key
+from app.features.courses.service_analytics import get_assignment_analytics
+from app.features.courses.service_similarity import get_similarity_report, DEFAULT_THRESHOLD
+from app.features.courses.service_regrade import start_regrade, get_regrade_progress
+from app.features.courses.service_exam import start_exam, get_exam_session, save_exam_answers, submit_exam
+from app.features.courses import service_materials as material_crud
+from app.core.streaming import iter_upload_lines
 from app.features.auth.dependencies import require_role
 from app.features.users.models import User
 from app.core.school_guard import validate_school_subscription
@@ -24,35 +42,127 @@ router = APIRouter(prefix="/assignments", tags=["Assignments"])
 @router.get("/{assignment_id}")
 async def get_assignment_details(
     assignment_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_role("teacher", "student", "admin", "principal")),
     school_info = Depends(validate_school_subscription)
 ):
     school_id = current_user.school_id if current_user.role != "super_admin" else None
     
-    # Load with questions and options
-    stmt = (
-        select(Assignment)
-        .options(
-            selectinload(Assignment.questions).selectinload(Question.options),
-            selectinload(Assignment.material)
-        )
-        .filter(Assignment.material_id == assignment_id)
-    )
-    result = await db.execute(stmt)
-    assignment = result.scalars().first()
-    
-    if not assignment:
+    # Questions and options come from the versioned assignment cache
+    key = await get_answer_key(db, assignment_id)
+    if not key:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     # Check school isolation
-    if school_id and assignment.material.school_id != school_id:
+    if school_id and key.school_id != school_id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
     if current_user.role in ["teacher", "admin", "principal"]:
-        return AssignmentTeacherRead.model_validate(assignment)
+        return json_response(request, key.teacher_view, etag=key.teacher_etag)
     
-    return AssignmentRead.model_validate(assignment)
+    return json_response(request, key.student_view, etag=key.student_etag)
+
+@router.get("/{assignment_id}/analytics")
+async def get_assignment_analytics_api(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("teacher", "admin", "principal")),
+    school_info = Depends(validate_school_subscription)
+):
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+
+    key = await get_answer_key(db, assignment_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    if school_id and key.school_id != school_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return await get_assignment_analytics(db, key)
+
+@router.get("/{assignment_id}/similarity")
+async def get_similarity_report_api(
+    assignment_id: int,
+    threshold: float = Query(DEFAULT_THRESHOLD, ge=0.1, le=1.0),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("teacher", "admin", "principal")),
+    school_info = Depends(validate_school_subscription)
+):
+    """Clusters of near-duplicate TEXT answers / text file submissions."""
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+
+    key = await get_answer_key(db, assignment_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    if school_id and key.school_id != school_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return await get_similarity_report(db, assignment_id, threshold)
+
+@router.put("/{assignment_id}/questions/{question_id}/answer-key", response_model=RegradeJobRead)
+async def update_answer_key_api(
+    assignment_id: int,
+    question_id: int,
+    data: AnswerKeyUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("teacher")),
+    school_info = Depends(validate_school_subscription)
+):
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    material = await material_crud.get_material(db, assignment_id, school_id=school_id)
+    if not material or material.type != "assignment":
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    await update_answer_key(db, current_user.id, material, question_id, data)
+    job_id = await start_regrade(assignment_id, material.school_id, current_user.id)
+    return await get_regrade_progress(job_id) or {"job_id": job_id, "assignment_id": assignment_id, "status": "queued"}
+
+@router.post("/{assignment_id}/regrade", response_model=RegradeJobRead)
+async def regrade_assignment_api(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("teacher")),
+    school_info = Depends(validate_school_subscription)
+):
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    material = await material_crud.get_material(db, assignment_id, school_id=school_id)
+    if not material or material.type != "assignment":
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    job_id = await start_regrade(assignment_id, material.school_id, current_user.id)
+    return await get_regrade_progress(job_id) or {"job_id": job_id, "assignment_id": assignment_id, "status": "queued"}
+
+@router.get("/{assignment_id}/regrade/{job_id}", response_model=RegradeJobRead)
+async def get_regrade_progress_api(
+    assignment_id: int,
+    job_id: str,
+    current_user: User = Depends(require_role("teacher", "admin", "principal")),
+    school_info = Depends(validate_school_subscription)
+):
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    progress = await get_regrade_progress(job_id)
+    if not progress or progress["assignment_id"] != assignment_id or (school_id and progress["school_id"] != school_id):
+        raise HTTPException(status_code=404, detail="Re-grade job not found")
+    return progress
+
+@router.post("/{assignment_id}/questions/import")
+async def import_questions_api(
+    assignment_id: int,
+    file: UploadFile = File(..., description="JSON Lines file, one question object per line"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("teacher")),
+    school_info = Depends(validate_school_subscription)
+):
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    material = await material_crud.get_material(db, assignment_id, school_id=school_id)
+    if not material or material.type != "assignment":
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    key = await get_answer_key(db, assignment_id)
+    if not key or key.assignment_type not in ["MCQ", "TEXT"]:
+        raise HTTPException(status_code=400, detail="Questions can only be imported into MCQ or TEXT assignments")
+
+    return await import_question_bank(db, current_user.id, material, iter_upload_lines(file))
 
 @router.post("/submit", response_model=StudentAssignmentRead)
 async def submit_assignment_attempt_api(
@@ -63,6 +173,42 @@ async def submit_assignment_attempt_api(
 ):
     return await create_student_attempt(db, current_user.id, data, school_id=current_user.school_id)
 
+@router.post("/{assignment_id}/exam/start", response_model=ExamSessionRead)
+async def start_exam_api(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("student")),
+    school_info = Depends(validate_school_subscription)
+):
+    return await start_exam(db, current_user.id, assignment_id, school_id=current_user.school_id)
+
+@router.get("/{assignment_id}/exam", response_model=ExamSessionRead)
+async def get_exam_session_api(
+    assignment_id: int,
+    current_user: User = Depends(require_role("student")),
+    school_info = Depends(validate_school_subscription)
+):
+    return await get_exam_session(current_user.id, assignment_id)
+
+@router.put("/{assignment_id}/exam/answers")
+async def autosave_exam_answers_api(
+    assignment_id: int,
+    data: ExamAutosave,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("student")),
+    school_info = Depends(validate_school_subscription)
+):
+    return await save_exam_answers(db, current_user.id, assignment_id, current_user.school_id, data.answers)
+
+@router.post("/{assignment_id}/exam/submit", response_model=StudentAssignmentRead)
+async def submit_exam_api(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("student")),
+    school_info = Depends(validate_school_subscription)
+):
+    return await submit_exam(db, current_user.id, assignment_id)
+
 @router.get("/attempts/{attempt_id}")
 async def get_attempt_details_api(
     attempt_id: int,
@@ -70,52 +216,46 @@ async def get_attempt_details_api(
     current_user: User = Depends(require_role("teacher", "student", "admin", "principal")),
     school_info = Depends(validate_school_subscription)
 ):
-    stmt = (
-        select(StudentAssignment)
-        .options(
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.question).selectinload(Question.options),
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.selected_options),
-            selectinload(StudentAssignment.assignment)
-        )
-        .filter(StudentAssignment.id == attempt_id)
-    )
-    result = await db.execute(stmt)
-    attempt = result.scalars().first()
+    attempt = await db.get(StudentAssignment, attempt_id)
     
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
-    # Manually attach total_marks for Pydantic schema
-    if attempt.assignment:
-        attempt.total_marks = attempt.assignment.total_marks
+    key = await get_answer_key(db, attempt.assignment_id)
+    answers = await load_attempt_answers(db, attempt.id)
+    fields = {
+        "id": attempt.id,
+        "assignment_id": attempt.assignment_id,
+        "student_id": attempt.student_id,
+        "attempt_number": attempt.attempt_number,
+        "submitted_at": attempt.submitted_at,
+        "total_score": attempt.total_score,
+        "status": attempt.status,
+    }
         
     if current_user.role in ["teacher", "admin", "principal"]:
-        from app.features.courses.schemas_assignment import StudentAssignmentTeacherRead
-        return StudentAssignmentTeacherRead.model_validate(attempt)
+        return StudentAssignmentTeacherRead.model_validate(build_attempt_response(fields, key, answers, include_answers=True))
     
     # Check if student is allowed to see correct answers
     can_see_answers = False
-    if attempt.assignment:
-        from datetime import date
-        if attempt.assignment.due_date and date.today() > attempt.assignment.due_date:
+    if key:
+        if key.due_date and date.today() > key.due_date:
             can_see_answers = True
             
-        if not can_see_answers and attempt.assignment.max_attempts:
-            from sqlalchemy import func
+        if not can_see_answers and key.max_attempts:
             stmt_count = select(func.count(StudentAssignment.id)).filter_by(
                 student_id=current_user.id,
                 assignment_id=attempt.assignment_id
             )
             count_result = await db.execute(stmt_count)
             attempts_made = count_result.scalar() or 0
-            if attempts_made >= attempt.assignment.max_attempts:
+            if attempts_made >= key.max_attempts:
                 can_see_answers = True
                 
     if can_see_answers:
-        from app.features.courses.schemas_assignment import StudentAssignmentTeacherRead
-        return StudentAssignmentTeacherRead.model_validate(attempt)
+        return StudentAssignmentTeacherRead.model_validate(build_attempt_response(fields, key, answers, include_answers=True))
         
-    return StudentAssignmentRead.model_validate(attempt)
+    return StudentAssignmentRead.model_validate(build_attempt_response(fields, key, answers))
 
 @router.get("/{assignment_id}/attempts", response_model=list[StudentAssignmentRead])
 async def get_assignment_attempts_api(
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.core.database import get_db
+from app.core.conditional import json_response
 from app.features.auth.dependencies import get_current_user
 from app.features.users.models import User
 from app.features.courses.schemas_discussion import (
@@ -24,11 +25,14 @@ async def create_course_post(
 @router.get("/courses/{course_id}/posts", response_model=List[CoursePostRead])
 async def list_course_posts(
     course_id: int,
+    request: Request,
     post_type: Optional[str] = Query(None, description="Filter by post type"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return await discussion_service.get_posts(db, course_id, current_user, post_type)
+    # Posts merge DB rows with pending Redis ones, so the body hash is the validator
+    posts = await discussion_service.get_posts(db, course_id, current_user, post_type)
+    return json_response(request, [CoursePostRead.model_validate(p) for p in posts])
 
 @router.get("/posts/{post_id}", response_model=CoursePostWithReplies)
 async def get_post_details(
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.conditional import json_response
 from app.features.courses.schemas_materials import (
     NotesCreate,
     AssignmentCreate,
@@ -19,14 +20,15 @@ from app.features.users.models import User
 @router.get("/course/{course_id}")
 async def get_course_materials_api(
     course_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_role("teacher", "student", "admin", "principal")),
     school_info = Depends(validate_school_subscription)
 ):
     student_id = current_user.id if current_user.role == "student" else None
     school_id = current_user.school_id if current_user.role != "super_admin" else None
-    materials = await material_crud.get_course_materials(db, course_id, school_id=school_id, student_id=student_id)
-    return materials
+    etag, materials = await material_crud.get_course_materials(db, course_id, school_id=school_id, student_id=student_id)
+    return json_response(request, materials, etag=etag)
 
 
 @router.get("/teacher/{teacher_id}/course/{course_id}")
@@ -72,6 +72,7 @@ class AssignmentCreate(BaseModel):
     total_marks: float
     due_date: date
     max_attempts: int = 1
+    time_limit_minutes: Optional[int] = Field(None, gt=0)
     questions: Optional[List[QuestionCreate]] = None
     reference_materials: List[ReferenceMaterial] = Field(default_factory=list)
 
@@ -81,6 +82,7 @@ class AssignmentRead(BaseModel):
     total_marks: float
     due_date: date
     max_attempts: int
+    time_limit_minutes: Optional[int] = None
     description: Optional[str] = None
     reference_materials: List[ReferenceMaterial] = Field(default_factory=list)
     questions: List[QuestionRead] = []
@@ -91,6 +93,20 @@ class AssignmentTeacherRead(AssignmentRead):
     questions: List[QuestionTeacherRead] = []
     model_config = ConfigDict(from_attributes=True)
 
+class AnswerKeyUpdate(BaseModel):
+    correct_option_ids: List[int] = Field(..., min_length=1)
+    marks: Optional[float] = Field(None, gt=0)
+
+class RegradeJobRead(BaseModel):
+    job_id: str
+    assignment_id: int
+    status: str
+    total: int = 0
+    processed: int = 0
+    changed_attempts: int = 0
+    notified_students: int = 0
+    error: Optional[str] = None
+
 # --- Student Submission Schemas ---
 
 class StudentAnswerSubmission(BaseModel):
@@ -102,6 +118,16 @@ class StudentAssignmentCreate(BaseModel):
     assignment_id: int
     answers: List[StudentAnswerSubmission]
 
+class ExamAutosave(BaseModel):
+    answers: List[StudentAnswerSubmission]
+
+class ExamSessionRead(BaseModel):
+    assignment_id: int
+    started_at: datetime
+    deadline: datetime
+    remaining_seconds: int
+    answers: List[StudentAnswerSubmission] = []
+
 class StudentAnswerRead(BaseModel):
     question_id: int
     answer_text: Optional[str] = None
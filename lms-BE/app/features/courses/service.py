@@ -13,6 +13,7 @@ from app.features.users.models import User
 
 from app.features.activity_logs.service import log_action
 from app.features.activity_logs.schemas import ActivityLogCreate
+from app.core.cache import course_tag, invalidate_tags, school_tag
 
 async def create_course(db: AsyncSession, course_in: CourseCreate, user: User) -> Course:
     school_id = user.school_id
@@ -35,6 +36,7 @@ async def create_course(db: AsyncSession, course_in: CourseCreate, user: User) -
 
     await db.commit()
     await db.refresh(course)
+    await invalidate_tags(school_tag(school_id))
     
     await log_action(db, ActivityLogCreate(
         action="create_course",
@@ -53,24 +55,17 @@ async def get_courses(db: AsyncSession, school_id: Optional[int] = None):
     result = await db.execute(query)
     return result.scalars().all()
 
-async def get_courses_for_user(db: AsyncSession, user: User, page: int = 1, limit: int = 10, is_deleted: Optional[bool] = None):
-    skip = (page - 1) * limit
-    
-    # Base query
-    query = select(Course)
-    count_query = select(func.count(Course.id))
-    
+def _scope_courses_for_user(query, user: User, is_deleted: Optional[bool] = None):
+    """Apply the role-based visibility filters to any select over Course; None if the role sees nothing."""
     active_role = getattr(user, 'active_role', user.role)
     
     # Super Admin bypasses school filter
     if active_role != "super_admin":
         query = query.filter(Course.school_id == user.school_id)
-        count_query = count_query.filter(Course.school_id == user.school_id)
 
     if active_role in ("super_admin", "principal"):
         if is_deleted is not None:
             query = query.filter(Course.is_deleted == is_deleted)
-            count_query = count_query.filter(Course.is_deleted == is_deleted)
             
     elif active_role == "teacher":
         deleted_filter = is_deleted if is_deleted is not None else False
@@ -82,14 +77,6 @@ async def get_courses_for_user(db: AsyncSession, user: User, page: int = 1, limi
                 Course.is_deleted == deleted_filter,
             )
         )
-        count_query = (
-            count_query
-            .join(TeacherCourse, TeacherCourse.course_id == Course.id)
-            .filter(
-                TeacherCourse.teacher_id == user.id,
-                Course.is_deleted == deleted_filter,
-            )
-        )
     elif active_role == "student":
         deleted_filter = is_deleted if is_deleted is not None else False
         query = (
@@ -100,16 +87,17 @@ async def get_courses_for_user(db: AsyncSession, user: User, page: int = 1, limi
                 Course.is_deleted == deleted_filter,
             )
         )
-        count_query = (
-            count_query
-            .join(StudentCourse, StudentCourse.course_id == Course.id)
-            .filter(
-                StudentCourse.student_id == user.id,
-                Course.is_deleted == deleted_filter,
-            )
-        )
     else:
+        return None
+    return query
+
+async def get_courses_for_user(db: AsyncSession, user: User, page: int = 1, limit: int = 10, is_deleted: Optional[bool] = None):
+    skip = (page - 1) * limit
+    
+    query = _scope_courses_for_user(select(Course), user, is_deleted)
+    if query is None:
         return {"items": [], "total": 0, "page": page, "limit": limit}
+    count_query = _scope_courses_for_user(select(func.count(Course.id)), user, is_deleted)
 
     # Execute queries
     result = await db.execute(query.offset(skip).limit(limit))
@@ -125,6 +113,12 @@ async def get_courses_for_user(db: AsyncSession, user: User, page: int = 1, limi
         "limit": limit
     }
 
+def courses_stamp_query(user: User, is_deleted: Optional[bool] = None):
+    """One-row aggregate that changes whenever the user's visible course list does."""
+    return _scope_courses_for_user(
+        select(func.count(Course.id), func.sum(Course.id), func.max(Course.updated_at)), user, is_deleted
+    )
+
 async def get_course(db: AsyncSession, course_id: int, school_id: Optional[int] = None):
     query = select(Course).filter(
         Course.id == course_id,
@@ -150,6 +144,7 @@ async def update_course(db: AsyncSession, course: Course, data: CourseUpdate):
     course.updated_at = datetime.now(UTC)
     await db.commit()
     await db.refresh(course)
+    await invalidate_tags(course_tag(course.id), school_tag(course.school_id))
     return course
 
 
@@ -158,6 +153,7 @@ async def soft_delete_course(db: AsyncSession, course: Course):
     course.is_deleted = True
     course.updated_at = datetime.now(UTC)
     await db.commit()
+    await invalidate_tags(course_tag(cid), school_tag(cschool))
 
     await log_action(db, ActivityLogCreate(
         action="course_deleted",
@@ -173,6 +169,7 @@ async def restore_course(db: AsyncSession, course: Course):
     course.is_deleted = False
     course.updated_at = datetime.now(UTC)
     await db.commit()
+    await invalidate_tags(course_tag(cid), school_tag(cschool))
 
     await log_action(db, ActivityLogCreate(
         action="course_restored",
@@ -184,5 +181,7 @@ async def restore_course(db: AsyncSession, course: Course):
 
 
 async def hard_delete_course(db: AsyncSession, course: Course):
+    cid, cschool = course.id, course.school_id
     await db.delete(course)
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    await invalidate_tags(course_tag(cid), school_tag(cschool))
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Item analytics for MCQ / TEXT assignments.
+
+Every attempt's answers are loaded as flat columns and aggregated with NumPy
+in one pass (an attempts x questions score matrix), rather than walking ORM
+objects. Results are cached per assignment and invalidated whenever a new
+attempt is submitted or an attempt is re-graded.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import VersionedCache
+from app.features.courses.answer_key import AnswerKey
+from app.features.courses.models_answer import StudentAnswer, student_answer_options
+from app.features.courses.models_student_assignment import StudentAssignment
+
+HISTOGRAM_BINS = 10
+ITEM_HISTOGRAM_EDGES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+_cache = VersionedCache("assignment_analytics", ttl=24 * 3600)
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def _columnwise_corr(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Pearson correlation of each column of ``x`` with the matching column of ``y``."""
+    xc = x - x.mean(axis=0)
+    yc = y - y.mean(axis=0)
+    denom = np.sqrt((xc ** 2).sum(axis=0) * (yc ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denom > 0, (xc * yc).sum(axis=0) / denom, np.nan)
+
+
+async def compute_assignment_analytics(db: AsyncSession, key: AnswerKey) -> dict:
+    assignment_id = key.assignment_id
+    attempt_filter = (
+        StudentAssignment.assignment_id == assignment_id,
+        StudentAssignment.is_deleted == False,
+    )
+
+    attempts = (await db.execute(
+        select(StudentAssignment.id, cast(StudentAssignment.total_score, Float)).where(*attempt_filter)
+    )).all()
+
+    answers = (await db.execute(
+        select(StudentAnswer.student_assignment_id, StudentAnswer.question_id, cast(StudentAnswer.marks_obtained, Float))
+        .join(StudentAssignment, StudentAssignment.id == StudentAnswer.student_assignment_id)
+        .where(*attempt_filter)
+    )).all()
+
+    # Option pick counts are aggregated by the DB; only a few rows per question come back
+    picks = (await db.execute(
+        select(StudentAnswer.question_id, student_answer_options.c.mcq_option_id, func.count())
+        .join(student_answer_options, student_answer_options.c.student_answer_id == StudentAnswer.id)
+        .join(StudentAssignment, StudentAssignment.id == StudentAnswer.student_assignment_id)
+        .where(*attempt_filter)
+        .group_by(StudentAnswer.question_id, student_answer_options.c.mcq_option_id)
+    )).all()
+
+    questions = sorted(key.questions.values(), key=lambda q: (q.order_index, q.id))
+    q_index = {q.id: i for i, q in enumerate(questions)}
+    q_marks = np.array([q.marks for q in questions], dtype=float)
+
+    n_attempts = len(attempts)
+    attempt_ids = np.array([a[0] for a in attempts], dtype=np.int64)
+    totals = np.nan_to_num(np.array([a[1] for a in attempts], dtype=float))
+    order = np.argsort(attempt_ids)
+    attempt_ids, totals = attempt_ids[order], totals[order]
+
+    # attempts x questions matrix of marks, plus a mask of which cells were answered
+    scores = np.zeros((n_attempts, len(questions)), dtype=float)
+    answered = np.zeros((n_attempts, len(questions)), dtype=bool)
+    if answers and n_attempts and questions:
+        attempt_col, question_col, marks_col = zip(*answers)
+        rows = np.searchsorted(attempt_ids, np.fromiter(attempt_col, dtype=np.int64, count=len(answers)))
+        q_cols = np.fromiter((q_index.get(q, -1) for q in question_col), dtype=np.int64, count=len(answers))
+        # None (ungraded) becomes NaN here and is scored as 0
+        marks = np.nan_to_num(np.array(marks_col, dtype=float))
+        known = q_cols >= 0
+        scores[rows[known], q_cols[known]] = marks[known]
+        answered[rows[known], q_cols[known]] = True
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        item = np.where(q_marks > 0, scores / q_marks, 0.0)
+
+    responses = answered.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_values = np.where(responses > 0, (item * answered).sum(axis=0) / responses, np.nan)
+
+    # Point-biserial: item score vs. rest-of-test score (total minus the item itself)
+    rest = totals[:, None] - scores
+    discrimination = _columnwise_corr(item, rest) if n_attempts > 1 else np.full(len(questions), np.nan)
+
+    pick_counts = {(q_id, o_id): count for q_id, o_id, count in picks}
+
+    items: List[dict] = []
+    for i, question in enumerate(questions):
+        n = int(responses[i])
+        hist, _ = np.histogram(item[answered[:, i], i], bins=ITEM_HISTOGRAM_EDGES)
+        options = []
+        for option_id, option_text, is_correct in question.options:
+            count = int(pick_counts.get((question.id, option_id), 0))
+            options.append({
+                "option_id": option_id,
+                "option_text": option_text,
+                "is_correct": is_correct,
+                "count": count,
+                "selection_rate": _round(count / n) if n else None,
+            })
+        items.append({
+            "question_id": question.id,
+            "question_text": question.question_text,
+            "question_type": question.question_type,
+            "marks": question.marks,
+            "responses": n,
+            "mean_marks": _round(scores[answered[:, i], i].mean()) if n else None,
+            "p_value": _round(p_values[i]),
+            "discrimination": _round(discrimination[i]),
+            "score_histogram": {"edges": ITEM_HISTOGRAM_EDGES, "counts": hist.tolist()},
+            "options": options,
+        })
+
+    upper = max(key.total_marks, float(totals.max()) if n_attempts else 0.0) or 1.0
+    hist, edges = np.histogram(totals, bins=HISTOGRAM_BINS, range=(0.0, upper))
+
+    return {
+        "assignment_id": assignment_id,
+        "attempts": n_attempts,
+        "total_marks": key.total_marks,
+        "mean_score": _round(totals.mean()) if n_attempts else None,
+        "median_score": _round(np.median(totals)) if n_attempts else None,
+        "std_score": _round(totals.std()) if n_attempts else None,
+        "score_histogram": {"edges": [_round(e) for e in edges.tolist()], "counts": hist.tolist()},
+        "questions": items,
+    }
+
+
+async def get_assignment_analytics(db: AsyncSession, key: AnswerKey) -> dict:
+    return await _cache.get_or_load(key.assignment_id, lambda: compute_assignment_analytics(db, key))
+
+
+async def invalidate_assignment_analytics(assignment_id: int) -> None:
+    await _cache.invalidate(assignment_id)
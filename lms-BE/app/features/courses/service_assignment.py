@@ -1,22 +1,39 @@
-from sqlalchemy import func
+from fastapi import HTTPException
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 from datetime import datetime, UTC
-from typing import List, Optional
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
 
 from app.features.courses.models_materials import LearningMaterial
 from app.features.courses.models_assignment import Assignment
 from app.features.courses.models_question import Question
 from app.features.courses.models_mcq import MCQOption
 from app.features.courses.models_student_assignment import StudentAssignment
-from app.features.courses.models_answer import StudentAnswer
-from app.features.courses.schemas_assignment import AssignmentCreate, AssignmentRead, StudentAssignmentCreate
+from app.features.courses.models_answer import StudentAnswer, student_answer_options
+from app.features.courses.answer_key import get_answer_key, invalidate_answer_key, score_answers
+from app.features.courses.service_analytics import invalidate_assignment_analytics
+from app.features.courses.service_similarity import index_attempt
+from app.features.courses.service_materials import invalidate_course_materials
+from app.features.courses.schemas_assignment import AnswerKeyUpdate, AssignmentCreate, AssignmentRead, QuestionCreate, StudentAssignmentCreate
 from app.features.activity_logs.service import log_action
 from app.features.activity_logs.schemas import ActivityLogCreate
 from app.features.notifications.service import create_notification
 from app.features.notifications.schemas import NotificationCreate
 from app.features.enrollments.models_student import StudentCourse
+from app.core.background import run_with_session
+from app.core.cache import invalidate_tags, user_tag
+from app.features.submissions.fast_path import (
+    submission_admission,
+    get_assignment_meta,
+    invalidate_assignment_meta,
+    is_enrolled,
+    reserve_attempt,
+    release_attempt,
+)
 
 async def create_advanced_assignment(
     db: AsyncSession, teacher_id: int, data: AssignmentCreate, school_id: int
@@ -39,6 +56,7 @@ async def create_advanced_assignment(
         total_marks=data.total_marks,
         due_date=data.due_date,
         max_attempts=data.max_attempts,
+        time_limit_minutes=data.time_limit_minutes,
         description=data.description,
         reference_materials=[rm.model_dump() for rm in data.reference_materials],
     )
@@ -46,28 +64,12 @@ async def create_advanced_assignment(
 
     # 3. Create Questions & Options if not FILE_UPLOAD
     if data.assignment_type in ["MCQ", "TEXT"] and data.questions:
-        for q_data in data.questions:
-            question = Question(
-                assignment_id=material.id,
-                question_text=q_data.question_text,
-                question_type=q_data.question_type,
-                marks=q_data.marks,
-                order_index=q_data.order_index,
-            )
-            db.add(question)
-            await db.flush()
-
-            if q_data.question_type == "MCQ" and q_data.options:
-                for opt_data in q_data.options:
-                    option = MCQOption(
-                        question_id=question.id,
-                        option_text=opt_data.option_text,
-                        is_correct=opt_data.is_correct,
-                    )
-                    db.add(option)
+        await db.flush()
+        await insert_question_tree(db, material.id, data.questions)
 
     await db.commit()
     await db.refresh(material)
+    await invalidate_course_materials(material.course_id, school_id)
 
     # Activity Logging & Notifications
     await log_action(db, ActivityLogCreate(
@@ -91,153 +93,406 @@ async def create_advanced_assignment(
 
     return material
 
-from fastapi import HTTPException
+# Questions per INSERT ... RETURNING round trip when writing question trees
+QUESTION_INSERT_BATCH = 1000
 
-async def create_student_attempt(
-    db: AsyncSession, student_id: int, data: StudentAssignmentCreate, school_id: int
-) -> StudentAssignment:
-    # 0. Load assignment and material to enforce business rules
-    stmt_assign = (
-        select(Assignment, LearningMaterial)
-        .join(LearningMaterial, Assignment.material_id == LearningMaterial.id)
-        .filter(Assignment.material_id == data.assignment_id)
-    )
-    result_assign = await db.execute(stmt_assign)
-    row = result_assign.first()
-    if not row:
-        raise HTTPException(status_code=404, detail="Assignment not found")
-        
-    assignment, material = row
-    
-    # Check school isolation
-    if material.school_id != school_id:
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    # Check student enrollment
-    stmt_enroll = select(StudentCourse).filter(
-        StudentCourse.student_id == student_id,
-        StudentCourse.course_id == material.course_id
-    )
-    res_enroll = await db.execute(stmt_enroll)
-    if not res_enroll.scalars().first():
-        raise HTTPException(status_code=403, detail="You are not enrolled in this course")
-
-    # Check due date
-    if datetime.now(UTC).date() > assignment.due_date:
-        raise HTTPException(status_code=400, detail="Submission deadline has passed")
-
-    # 1. Get current attempt number
-    stmt = (
-        select(func.max(StudentAssignment.attempt_number))
-        .filter(
-            StudentAssignment.student_id == student_id,
-            StudentAssignment.assignment_id == data.assignment_id
-        )
-    )
-    result = await db.execute(stmt)
-    current_max = result.scalar() or 0
-    new_attempt_number = current_max + 1
-
-    # Check attempt limit
-    if new_attempt_number > assignment.max_attempts:
-        raise HTTPException(status_code=400, detail="Maximum attempts reached")
-
-    # 2. Create StudentAssignment record
-    attempt = StudentAssignment(
-        student_id=student_id,
-        assignment_id=data.assignment_id,
-        attempt_number=new_attempt_number,
-        submitted_at=datetime.now(UTC),
-        status="submitted",
-    )
-    db.add(attempt)
-    await db.flush()
+async def insert_question_tree(
+    db: AsyncSession, assignment_id: int, questions: Iterable[QuestionCreate]
+) -> Tuple[int, float]:
+    """
+    Insert questions and their MCQ options with set-based statements.
 
-    # 3. Create StudentAnswer records
-    for ans_data in data.answers:
-        answer = StudentAnswer(
-            student_assignment_id=attempt.id,
-            question_id=ans_data.question_id,
-            answer_text=ans_data.answer_text,
-        )
-        if ans_data.selected_option_ids:
-            stmt = select(MCQOption).where(MCQOption.id.in_(ans_data.selected_option_ids))
-            opts_res = await db.execute(stmt)
-            options = opts_res.scalars().all()
-            answer.selected_options = list(options)
-        db.add(answer)
+    Each batch is one multi-row ``INSERT ... RETURNING id`` for the questions
+    (ids come back in parameter order) and one bulk insert for all of their
+    options. Returns ``(questions inserted, sum of their marks)``.
+    """
+    count, marks = 0, 0.0
+    batch: List[QuestionCreate] = []
 
-    await db.flush()
+    async def flush_batch():
+        question_ids = (await db.scalars(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True),
+            [
+                {
+                    "assignment_id": assignment_id,
+                    "question_text": q.question_text,
+                    "question_type": q.question_type.value,
+                    "marks": q.marks,
+                    "order_index": q.order_index,
+                }
+                for q in batch
+            ],
+        )).all()
 
-    # 4. Auto-evaluate MCQ components
-    if assignment and assignment.assignment_type in ["MCQ", "TEXT"]:
-        await evaluate_mcq_submission(db, attempt.id)
-    
+        option_rows = [
+            {"question_id": question_id, "option_text": o.option_text, "is_correct": o.is_correct}
+            for question_id, q in zip(question_ids, batch)
+            if q.question_type == "MCQ" and q.options
+            for o in q.options
+        ]
+        if option_rows:
+            await db.execute(insert(MCQOption), option_rows)
+
+    for q_data in questions:
+        batch.append(q_data)
+        count += 1
+        marks += q_data.marks
+        if len(batch) >= QUESTION_INSERT_BATCH:
+            await flush_batch()
+            batch.clear()
+    if batch:
+        await flush_batch()
+    return count, marks
+
+async def import_question_bank(
+    db: AsyncSession, teacher_id: int, material: LearningMaterial, lines: AsyncIterator[bytes]
+) -> dict:
+    """
+    Append questions from a JSON Lines question bank (one QuestionCreate
+    object per line) to an existing assignment, in a single transaction.
+    Questions without an ``order_index`` are placed after the existing ones.
+    """
+    next_index = await db.scalar(
+        select(func.coalesce(func.max(Question.order_index), -1)).where(Question.assignment_id == material.id)
+    ) + 1
+
+    count, marks = 0, 0.0
+    errors = []
+    batch: List[QuestionCreate] = []
+    line_no = 0
+    async for raw in lines:
+        line_no += 1
+        if not raw.strip():
+            continue
+        try:
+            q_data = QuestionCreate.model_validate_json(raw)
+        except ValidationError as e:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'line'}: {err['msg']}" for err in e.errors()
+            )
+            errors.append(f"line {line_no}: {problems}")
+            if len(errors) >= 20:
+                break
+            continue
+        if "order_index" not in q_data.model_fields_set:
+            q_data.order_index = next_index
+        next_index = max(next_index, q_data.order_index) + 1
+
+        # Keep parsing after the first error so the teacher gets every bad line at once
+        if errors:
+            continue
+        batch.append(q_data)
+        if len(batch) >= QUESTION_INSERT_BATCH:
+            inserted = await insert_question_tree(db, material.id, batch)
+            count, marks = count + inserted[0], marks + inserted[1]
+            batch = []
+
+    if errors:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid question bank. " + " | ".join(errors))
+    if batch:
+        inserted = await insert_question_tree(db, material.id, batch)
+        count, marks = count + inserted[0], marks + inserted[1]
+    if not count:
+        raise HTTPException(status_code=400, detail="Question bank is empty")
+
+    material.updated_at = datetime.now(UTC)
     await db.commit()
-    
-    # Refetch with answers loaded to avoid MissingGreenlet during serialization
-    stmt = (
-        select(StudentAssignment)
-        .options(
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.question).selectinload(Question.options),
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.selected_options)
-        )
-        .filter(StudentAssignment.id == attempt.id)
+    await invalidate_answer_key(material.id)
+    await invalidate_assignment_analytics(material.id)
+
+    await log_action(db, ActivityLogCreate(
+        user_id=teacher_id,
+        course_id=material.course_id,
+        action="import_questions",
+        entity_type="material",
+        entity_id=material.id,
+        details=f"Imported {count} questions into assignment: {material.title}"
+    ), school_id=material.school_id)
+
+    return {"assignment_id": material.id, "imported": count, "imported_marks": marks}
+
+async def update_answer_key(
+    db: AsyncSession, teacher_id: int, material: LearningMaterial, question_id: int, data: AnswerKeyUpdate
+) -> None:
+    """Replace the correct options (and optionally the marks) of one MCQ question."""
+    question = await db.get(Question, question_id)
+    if not question or question.assignment_id != material.id:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if question.question_type != "MCQ":
+        raise HTTPException(status_code=400, detail="Only MCQ questions have an answer key")
+
+    option_ids = set((await db.scalars(
+        select(MCQOption.id).where(MCQOption.question_id == question_id)
+    )).all())
+    correct = set(data.correct_option_ids)
+    if not correct <= option_ids:
+        raise HTTPException(status_code=400, detail="Correct options must belong to the question")
+
+    await db.execute(
+        update(MCQOption)
+        .where(MCQOption.question_id == question_id)
+        .values(is_correct=MCQOption.id.in_(correct))
     )
-    result = await db.execute(stmt)
-    attempt = result.scalars().first()
+    if data.marks is not None:
+        # Move the assignment total by the same amount, so scores are not reported against a stale total
+        await db.execute(
+            update(Assignment)
+            .where(Assignment.material_id == material.id)
+            .values(total_marks=Assignment.total_marks - question.marks + data.marks)
+        )
+        question.marks = data.marks
+    material.updated_at = datetime.now(UTC)
+    await db.commit()
+    await invalidate_answer_key(material.id)
+    if data.marks is not None:
+        await invalidate_assignment_meta(material.id)
+        await invalidate_course_materials(material.course_id, material.school_id)
 
     await log_action(db, ActivityLogCreate(
+        user_id=teacher_id,
+        course_id=material.course_id,
+        action="update_answer_key",
+        entity_type="question",
+        entity_id=question_id,
+        details=f"Updated answer key of question {question_id} in assignment: {material.title}"
+    ), school_id=material.school_id)
+
+async def create_student_attempt(
+    db: AsyncSession,
+    student_id: int,
+    data: StudentAssignmentCreate,
+    school_id: int,
+    submitted_at: Optional[datetime] = None,
+    from_exam_session: bool = False,
+) -> dict:
+    """
+    Grade and store one attempt. ``submitted_at`` lets timed exam sessions
+    that are flushed after their deadline keep the time they actually ended.
+    Timed assignments only accept attempts from an exam session, whose
+    deadline already accounts for the due date and is enforced by the session.
+    """
+    submitted_at = submitted_at or datetime.now(UTC)
+    async with submission_admission.slot(data.assignment_id):
+        # 0. Assignment rules (cached) to enforce business rules
+        meta = await get_assignment_meta(db, data.assignment_id)
+        if not meta or meta.is_deleted:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+
+        # Check school isolation
+        if meta.school_id != school_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+
+        if not from_exam_session:
+            if meta.time_limit_minutes:
+                raise HTTPException(
+                    status_code=400,
+                    detail="This assignment is timed; start it as an exam and submit it from the exam session",
+                )
+            # Check due date
+            if meta.due_date and submitted_at.date() > meta.due_date:
+                raise HTTPException(status_code=400, detail="Submission deadline has passed")
+
+        # Check student enrollment (cached roster)
+        if not await is_enrolled(db, student_id, meta.course_id):
+            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
+
+        # 1. Atomically reserve the next attempt number
+        new_attempt_number = await reserve_attempt(
+            db, "attempt", student_id, data.assignment_id, meta.max_attempts
+        )
+        try:
+            attempt = await _insert_attempt(db, student_id, data, meta, new_attempt_number, submitted_at)
+        except IntegrityError:
+            await db.rollback()
+            await release_attempt("attempt", student_id, data.assignment_id)
+            raise HTTPException(status_code=409, detail="This attempt was already submitted")
+        except Exception:
+            await db.rollback()
+            await release_attempt("attempt", student_id, data.assignment_id)
+            raise
+
+    await invalidate_assignment_analytics(data.assignment_id)
+    await invalidate_tags(user_tag(student_id))
+    if any(a.answer_text for a in data.answers):
+        run_with_session(index_attempt, attempt["id"])
+
+    run_with_session(log_action, ActivityLogCreate(
         user_id=student_id,
+        course_id=meta.course_id,
         action="submit_assignment",
         entity_type="student_assignment",
-        entity_id=attempt.id,
+        entity_id=attempt["id"],
         details=f"Submitted attempt {new_attempt_number} for assignment {data.assignment_id}"
     ), school_id=school_id)
 
     return attempt
 
-async def evaluate_mcq_submission(db: AsyncSession, student_assignment_id: int):
-    # Load attempt with answers and questions
-    stmt = (
-        select(StudentAssignment)
-        .options(
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.question).selectinload(Question.options),
-            selectinload(StudentAssignment.answers).selectinload(StudentAnswer.selected_options)
+async def _insert_attempt(
+    db: AsyncSession,
+    student_id: int,
+    data: StudentAssignmentCreate,
+    meta,
+    attempt_number: int,
+    submitted_at: datetime,
+) -> dict:
+    key = await get_answer_key(db, data.assignment_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    # 2. Validate answers against the cached key (no per-answer queries)
+    answers = []
+    seen = set()
+    for ans_data in data.answers:
+        question = key.questions.get(ans_data.question_id)
+        if question is None:
+            raise HTTPException(status_code=400, detail=f"Question {ans_data.question_id} does not belong to this assignment")
+        if ans_data.question_id in seen:
+            raise HTTPException(status_code=400, detail=f"Duplicate answer for question {ans_data.question_id}")
+        seen.add(ans_data.question_id)
+        selected = [oid for oid in dict.fromkeys(ans_data.selected_option_ids) if oid in question.option_ids]
+        answers.append((ans_data, question, selected))
+
+    # 3. Auto-evaluate MCQ components in one pass before anything is written
+    auto_graded = meta.assignment_type in ["MCQ", "TEXT"]
+    if auto_graded:
+        marks, total_score, all_mcq = score_answers(key, ((q.id, sel) for _, q, sel in answers))
+        status = "evaluated" if all_mcq and answers else "submitted"
+    else:
+        marks, total_score, status = [None] * len(answers), None, "submitted"
+
+    # 4. Insert the attempt, all answers and all selected options in three statements
+    attempt_id = await db.scalar(
+        insert(StudentAssignment).returning(StudentAssignment.id).values(
+            student_id=student_id,
+            assignment_id=data.assignment_id,
+            attempt_number=attempt_number,
+            submitted_at=submitted_at,
+            total_score=total_score,
+            status=status,
+            is_deleted=False,
         )
-        .filter(StudentAssignment.id == student_assignment_id)
     )
-    result = await db.execute(stmt)
-    attempt = result.scalars().first()
-    
+
+    answer_ids = []
+    if answers:
+        answer_ids = (await db.scalars(
+            insert(StudentAnswer).returning(StudentAnswer.id, sort_by_parameter_order=True),
+            [
+                {
+                    "student_assignment_id": attempt_id,
+                    "question_id": question.id,
+                    "answer_text": ans_data.answer_text,
+                    "marks_obtained": mark,
+                }
+                for (ans_data, question, _), mark in zip(answers, marks)
+            ],
+        )).all()
+
+        option_rows = [
+            {"student_answer_id": answer_id, "mcq_option_id": option_id}
+            for answer_id, (_, _, selected) in zip(answer_ids, answers)
+            for option_id in selected
+        ]
+        if option_rows:
+            await db.execute(insert(student_answer_options), option_rows)
+
+    await db.commit()
+
+    # Response is assembled from what was just written plus the cached key
+    return build_attempt_response(
+        {
+            "id": attempt_id,
+            "assignment_id": data.assignment_id,
+            "student_id": student_id,
+            "attempt_number": attempt_number,
+            "submitted_at": submitted_at,
+            "total_score": total_score,
+            "status": status,
+        },
+        key,
+        [
+            {
+                "question_id": question.id,
+                "answer_text": ans_data.answer_text,
+                "marks_obtained": mark,
+                "option_ids": selected,
+            }
+            for (ans_data, question, selected), mark in zip(answers, marks)
+        ],
+    )
+
+async def load_attempt_answers(db: AsyncSession, student_assignment_id: int) -> List[dict]:
+    """All answers of an attempt with their selected option ids, in one query."""
+    rows = (await db.execute(
+        select(
+            StudentAnswer.id, StudentAnswer.question_id, StudentAnswer.answer_text,
+            StudentAnswer.marks_obtained, student_answer_options.c.mcq_option_id,
+        )
+        .outerjoin(student_answer_options, student_answer_options.c.student_answer_id == StudentAnswer.id)
+        .where(StudentAnswer.student_assignment_id == student_assignment_id)
+        .order_by(StudentAnswer.id)
+    )).all()
+
+    answers = {}
+    for answer_id, question_id, answer_text, marks_obtained, option_id in rows:
+        answer = answers.get(answer_id)
+        if answer is None:
+            answer = answers[answer_id] = {
+                "id": answer_id,
+                "question_id": question_id,
+                "answer_text": answer_text,
+                "marks_obtained": float(marks_obtained) if marks_obtained is not None else None,
+                "option_ids": [],
+            }
+        if option_id is not None:
+            answer["option_ids"].append(option_id)
+    return list(answers.values())
+
+def build_attempt_response(attempt: dict, key, answers: List[dict], include_answers: bool = False) -> dict:
+    """
+    Shape an attempt like StudentAssignmentRead using the cached assignment key
+    for question text and options. ``include_answers`` exposes ``is_correct``.
+    """
+    items = []
+    for answer in answers:
+        question = key.questions.get(answer["question_id"]) if key else None
+        items.append({
+            "question_id": answer["question_id"],
+            "answer_text": answer["answer_text"],
+            "marks_obtained": answer["marks_obtained"],
+            "question": question.as_dict(include_answers) if question else None,
+            "selected_options": question.option_dicts(answer["option_ids"]) if question else [],
+        })
+    return {
+        **attempt,
+        "total_marks": key.total_marks if key else None,
+        "answers": items,
+    }
+
+async def evaluate_mcq_submission(db: AsyncSession, student_assignment_id: int):
+    attempt = await db.get(StudentAssignment, student_assignment_id)
     if not attempt:
         return None
 
-    total_score = 0
-    all_mcq = True
-    for answer in attempt.answers:
-        if answer.question.question_type == "MCQ":
-            if answer.selected_options:
-                correct_selected = sum(1 for o in answer.selected_options if o.is_correct)
-                wrong_selected = len(answer.selected_options) - correct_selected
-                total_correct = sum(1 for o in answer.question.options if o.is_correct)
-                
-                if total_correct > 0:
-                    score_factor = max(0.0, (correct_selected - wrong_selected) / total_correct)
-                    answer.marks_obtained = score_factor * float(answer.question.marks)
-                    total_score += answer.marks_obtained
-                else:
-                    answer.marks_obtained = 0
-            else:
-                answer.marks_obtained = 0
-        else:
-            all_mcq = False
-            if answer.marks_obtained is None:
-                answer.marks_obtained = 0
-        
+    key = await get_answer_key(db, attempt.assignment_id)
+    if not key:
+        return None
+
+    answers = await load_attempt_answers(db, student_assignment_id)
+    marks, total_score, all_mcq = score_answers(key, ((a["question_id"], a["option_ids"]) for a in answers))
+
+    updates = []
+    for answer, mark in zip(answers, marks):
+        question = key.questions.get(answer["question_id"])
+        if question is not None and question.question_type == "MCQ":
+            updates.append({"id": answer["id"], "marks_obtained": mark})
+        elif answer["marks_obtained"] is None:
+            # Ungraded non-MCQ answers start at 0 until a teacher grades them
+            updates.append({"id": answer["id"], "marks_obtained": 0})
+    if updates:
+        await db.execute(update(StudentAnswer), updates)
+
     attempt.total_score = total_score
-    if all_mcq and attempt.answers:
-        attempt.status = "evaluated"
-    else:
-        attempt.status = "submitted"
+    attempt.status = "evaluated" if all_mcq and answers else "submitted"
     return attempt
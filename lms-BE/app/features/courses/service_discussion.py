@@ -11,6 +11,9 @@ from app.features.users.models import User
 from app.features.enrollments.models_student import StudentCourse
 from app.features.enrollments.models_teacher import TeacherCourse
 from app.core.redis_client import get_redis
+from app.core.singleflight import SingleFlight
+
+_posts_flight = SingleFlight("course_posts")
 
 async def check_course_access(db: AsyncSession, course_id: int, user: User):
     if user.role == "super_admin":
@@ -110,6 +113,10 @@ async def get_posts(db: AsyncSession, course_id: int, user: User, post_type: Opt
     if not await check_course_access(db, course_id, user):
         raise HTTPException(status_code=403, detail="You do not have access to this course")
 
+    # Announcements bring the whole class at once; identical concurrent reads share one load
+    return await _posts_flight.do((course_id, post_type), lambda: _load_posts(db, course_id, post_type))
+
+async def _load_posts(db: AsyncSession, course_id: int, post_type: Optional[str] = None):
     from sqlalchemy.orm import selectinload
     stmt = select(CoursePost).options(selectinload(CoursePost.author)).where(CoursePost.course_id == course_id)
     if post_type:
@@ -0,0 +1,276 @@
+"""
+Timed exam sessions.
+
+A session is one Redis hash per (assignment, student):
+
+    exam:<assignment_id>:<student_id>
+        started_at   epoch seconds
+        deadline     epoch seconds (start + time limit, capped at the due date)
+        school_id
+        a:<question_id>  compact JSON ``[[option ids], text]``
+
+Autosaves only touch that hash, so answering questions costs no Postgres
+writes. The final submit (or the scheduler, once the deadline has passed)
+turns the draft into a StudentAssignment through the regular bulk attempt
+path, which spreads inserts across the exam window instead of one spike at
+the due time. A flush that is rejected keeps the draft and is retried a few
+times before it is left in Redis for a teacher to look at; if the student
+starts the exam again meanwhile, it is moved to ``exam_recovery:...`` first.
+"""
+
+import json
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+from typing import List
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis
+from app.features.courses.answer_key import get_answer_key
+from app.features.courses.schemas_assignment import StudentAnswerSubmission, StudentAssignmentCreate
+from app.features.courses.service_assignment import create_student_attempt
+from app.features.submissions.fast_path import attempts_used, is_enrolled
+
+logger = logging.getLogger(__name__)
+
+# Late autosaves / submits within this window still count (network latency)
+EXAM_GRACE_SECONDS = 30
+# Drafts are kept this long after the deadline in case a flush has to be retried
+EXAM_DRAFT_RETENTION = 24 * 3600
+EXAM_DEADLINES_KEY = "exam_deadlines"
+FLUSH_BATCH = 200
+# Rejected flushes are retried after this many seconds (times the failure count)
+FLUSH_RETRY_SECONDS = 300
+FLUSH_MAX_FAILURES = 5
+
+
+def _session_key(assignment_id: int, student_id: int) -> str:
+    return f"exam:{assignment_id}:{student_id}"
+
+
+def _recovery_key(assignment_id: int, student_id: int, started_at: str) -> str:
+    return f"exam_recovery:{assignment_id}:{student_id}:{started_at}"
+
+
+def _member(assignment_id: int, student_id: int) -> str:
+    return f"{assignment_id}:{student_id}"
+
+
+def _session_view(assignment_id: int, data: dict) -> dict:
+    now = time.time()
+    deadline = float(data["deadline"])
+    answers = []
+    for field, raw in data.items():
+        if field.startswith("a:"):
+            option_ids, text = json.loads(raw)
+            answers.append({"question_id": int(field[2:]), "selected_option_ids": option_ids, "answer_text": text})
+    answers.sort(key=lambda a: a["question_id"])
+    return {
+        "assignment_id": assignment_id,
+        "started_at": datetime.fromtimestamp(float(data["started_at"]), UTC),
+        "deadline": datetime.fromtimestamp(deadline, UTC),
+        "remaining_seconds": max(0, int(deadline - now)),
+        "answers": answers,
+    }
+
+
+async def _load_key(db: AsyncSession, assignment_id: int, school_id: int):
+    key = await get_answer_key(db, assignment_id)
+    if not key or key.is_deleted:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    if key.school_id != school_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if key.assignment_type not in ["MCQ", "TEXT"]:
+        raise HTTPException(status_code=400, detail="Exam mode is only available for MCQ or TEXT assignments")
+    return key
+
+
+async def start_exam(db: AsyncSession, student_id: int, assignment_id: int, school_id: int) -> dict:
+    """Start (or resume) the student's exam session."""
+    redis = await get_redis()
+    session_key = _session_key(assignment_id, student_id)
+    existing = await redis.hgetall(session_key)
+    if existing and "flush_failures" not in existing:
+        return _session_view(assignment_id, existing)
+    if existing:
+        await _set_aside_rejected_draft(redis, assignment_id, student_id, existing)
+
+    key = await _load_key(db, assignment_id, school_id)
+    now = datetime.now(UTC)
+    if key.due_date and now.date() > key.due_date:
+        raise HTTPException(status_code=400, detail="Submission deadline has passed")
+    if not await is_enrolled(db, student_id, key.course_id):
+        raise HTTPException(status_code=403, detail="You are not enrolled in this course")
+    if await attempts_used(db, "attempt", student_id, assignment_id) >= key.max_attempts:
+        raise HTTPException(status_code=400, detail=f"Maximum attempts ({key.max_attempts}) reached for this assignment.")
+
+    # Last instant of the due date: attempts are accepted through the whole day
+    deadline = datetime.combine(key.due_date, datetime.max.time(), UTC) if key.due_date else None
+    if key.time_limit_minutes:
+        timed = now + timedelta(minutes=key.time_limit_minutes)
+        deadline = min(deadline, timed) if deadline else timed
+    if deadline is None:
+        raise HTTPException(status_code=400, detail="Assignment has neither a due date nor a time limit")
+
+    fields = {"started_at": now.timestamp(), "deadline": deadline.timestamp(), "school_id": school_id}
+    ttl = int(deadline.timestamp() - now.timestamp()) + EXAM_DRAFT_RETENTION
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hsetnx(session_key, "started_at", fields["started_at"])
+        pipe.hsetnx(session_key, "deadline", fields["deadline"])
+        pipe.hsetnx(session_key, "school_id", school_id)
+        pipe.expire(session_key, ttl)
+        pipe.zadd(EXAM_DEADLINES_KEY, {_member(assignment_id, student_id): deadline.timestamp()}, nx=True)
+        await pipe.execute()
+
+    # A concurrent start may have won the HSETNX race; report what is stored
+    return _session_view(assignment_id, await redis.hgetall(session_key))
+
+
+async def get_exam_session(student_id: int, assignment_id: int) -> dict:
+    redis = await get_redis()
+    data = await redis.hgetall(_session_key(assignment_id, student_id))
+    if not data:
+        raise HTTPException(status_code=404, detail="No active exam session")
+    return _session_view(assignment_id, data)
+
+
+async def save_exam_answers(
+    db: AsyncSession, student_id: int, assignment_id: int, school_id: int, answers: List[StudentAnswerSubmission]
+) -> dict:
+    """Autosave: merge answers into the session hash. No Postgres writes."""
+    redis = await get_redis()
+    session_key = _session_key(assignment_id, student_id)
+    deadline = await redis.hget(session_key, "deadline")
+    if deadline is None:
+        raise HTTPException(status_code=404, detail="No active exam session")
+    if time.time() > float(deadline) + EXAM_GRACE_SECONDS:
+        raise HTTPException(status_code=409, detail="Exam time is over")
+
+    key = await _load_key(db, assignment_id, school_id)
+    fields = {}
+    for answer in answers:
+        question = key.questions.get(answer.question_id)
+        if question is None:
+            raise HTTPException(status_code=400, detail=f"Question {answer.question_id} does not belong to this assignment")
+        option_ids = [oid for oid in dict.fromkeys(answer.selected_option_ids) if oid in question.option_ids]
+        fields[f"a:{answer.question_id}"] = json.dumps([option_ids, answer.answer_text], separators=(",", ":"))
+
+    if fields:
+        await redis.hset(session_key, mapping=fields)
+    return {"saved": len(fields), "remaining_seconds": max(0, int(float(deadline) - time.time()))}
+
+
+async def submit_exam(db: AsyncSession, student_id: int, assignment_id: int) -> dict:
+    """
+    Flush the draft into a graded attempt. Used by the student's final submit
+    and by the timeout job; whoever removes the deadline entry first does the
+    flush, so a session can never be submitted twice.
+    """
+    redis = await get_redis()
+    session_key = _session_key(assignment_id, student_id)
+    data = await redis.hgetall(session_key)
+    if not data:
+        raise HTTPException(status_code=404, detail="No active exam session")
+
+    if not await redis.zrem(EXAM_DEADLINES_KEY, _member(assignment_id, student_id)):
+        raise HTTPException(status_code=409, detail="This exam has already been submitted")
+
+    session = _session_view(assignment_id, data)
+    # Autosaves stop at the deadline (plus grace), so a later flush records the deadline
+    ended_at = min(datetime.now(UTC), session["deadline"])
+    try:
+        attempt = await create_student_attempt(
+            db,
+            student_id,
+            StudentAssignmentCreate(
+                assignment_id=assignment_id,
+                answers=[StudentAnswerSubmission(**a) for a in session["answers"]],
+            ),
+            school_id=int(data["school_id"]),
+            submitted_at=ended_at,
+            from_exam_session=True,
+        )
+    except HTTPException as e:
+        if 400 <= e.status_code < 500:
+            await _hold_rejected_draft(redis, assignment_id, student_id, e.detail)
+        else:
+            await redis.zadd(EXAM_DEADLINES_KEY, {_member(assignment_id, student_id): float(data["deadline"])})
+        raise
+    except Exception:
+        # Transient failures (overload, DB errors) hand the session back to the timeout job
+        await redis.zadd(EXAM_DEADLINES_KEY, {_member(assignment_id, student_id): float(data["deadline"])})
+        raise
+    await redis.delete(session_key)
+    return attempt
+
+
+async def _hold_rejected_draft(redis, assignment_id: int, student_id: int, reason) -> None:
+    """
+    Keep a draft whose flush was rejected instead of losing it with the claim.
+
+    It is queued again with a growing delay (the cause, e.g. an attempt
+    counter out of step, may clear up); after ``FLUSH_MAX_FAILURES`` it stays
+    in Redis for ``EXAM_DRAFT_RETENTION`` so the answers can be recovered.
+    """
+    session_key = _session_key(assignment_id, student_id)
+    member = _member(assignment_id, student_id)
+    failures = await redis.hincrby(session_key, "flush_failures", 1)
+    await redis.expire(session_key, EXAM_DRAFT_RETENTION)
+    if failures < FLUSH_MAX_FAILURES:
+        await redis.zadd(EXAM_DEADLINES_KEY, {member: time.time() + FLUSH_RETRY_SECONDS * failures})
+        logger.warning(f"Exam submit for {member} rejected ({reason}); retry {failures} scheduled")
+    else:
+        logger.error(f"Exam submit for {member} rejected {failures} times ({reason}); draft kept in {session_key}")
+
+
+async def _set_aside_rejected_draft(redis, assignment_id: int, student_id: int, data: dict) -> None:
+    """
+    Move a draft whose flush was rejected out of the way of a new session.
+
+    It keeps its remaining retention under a recovery key. A retry that is
+    still queued is cancelled; one that is running right now has to finish first.
+    """
+    member = _member(assignment_id, student_id)
+    claimed = await redis.zrem(EXAM_DEADLINES_KEY, member)
+    if not claimed and int(data["flush_failures"]) < FLUSH_MAX_FAILURES:
+        raise HTTPException(status_code=409, detail="Your previous exam session is being submitted, try again shortly")
+    recovery_key = _recovery_key(assignment_id, student_id, data["started_at"])
+    try:
+        await redis.rename(_session_key(assignment_id, student_id), recovery_key)
+    except ResponseError:
+        # Expired in the meantime: nothing left to keep
+        return
+    logger.warning(f"Exam session {member}: rejected draft moved to {recovery_key}, starting a new session")
+
+
+async def flush_expired_exam_sessions():
+    """Scheduler job: submit every session whose deadline (plus grace) has passed."""
+    try:
+        redis = await get_redis()
+        members = await redis.zrangebyscore(
+            EXAM_DEADLINES_KEY, "-inf", time.time() - EXAM_GRACE_SECONDS, start=0, num=FLUSH_BATCH
+        )
+    except RedisError as e:
+        logger.error(f"Exam flush job: Redis unavailable: {e}")
+        return
+
+    flushed = 0
+    for member in members:
+        assignment_id, student_id = (int(part) for part in member.split(":"))
+        async with AsyncSessionLocal() as db:
+            try:
+                await submit_exam(db, student_id, assignment_id)
+                flushed += 1
+            except HTTPException as e:
+                if e.status_code == 404 and not await redis.exists(_session_key(assignment_id, student_id)):
+                    # Draft already expired; nothing left to submit
+                    await redis.zrem(EXAM_DEADLINES_KEY, member)
+                logger.warning(f"Exam flush job: could not submit {member}: {e.detail}")
+            except Exception as e:
+                logger.error(f"Exam flush job: error submitting {member}: {e}")
+    if flushed:
+        logger.info(f"Exam flush job: submitted {flushed} timed-out exam sessions")
@@ -3,7 +3,9 @@ from sqlalchemy.future import select
 from sqlalchemy import func
 from sqlalchemy.orm import selectinload
 from datetime import datetime, UTC
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
 
 from app.features.courses.models_materials import LearningMaterial
 from app.features.courses.models_notes import Notes
@@ -19,6 +21,13 @@ from app.features.notifications.service import create_notification
 from app.features.notifications.schemas import NotificationCreate
 from app.features.enrollments.models_student import StudentCourse
 from app.features.submissions.models import Submission
+from app.features.submissions.fast_path import invalidate_assignment_meta
+from app.features.courses.answer_key import invalidate_answer_key
+from app.features.files.service_previews import preview_urls_for
+from app.core.cache import cached, course_tag, invalidate_tags, school_tag, tenant_key
+from app.core.conditional import make_etag
+from app.core.singleflight import SingleFlight
+from app.core.config import settings
 
 
 # -------------------- CREATE --------------------
@@ -42,6 +51,7 @@ async def create_notes(db: AsyncSession, teacher_id: int, data: NotesCreate, sch
 
     await db.commit()
     await db.refresh(material)
+    await invalidate_course_materials(material.course_id, school_id)
 
     await log_action(db, ActivityLogCreate(
         user_id=teacher_id,
@@ -90,6 +100,7 @@ async def create_assignment(
 
     await db.commit()
     await db.refresh(material)
+    await invalidate_course_materials(material.course_id, school_id)
 
     await log_action(db, ActivityLogCreate(
         user_id=teacher_id,
@@ -115,7 +126,20 @@ async def create_assignment(
 
 # -------------------- READ --------------------
 
-async def get_course_materials(db: AsyncSession, course_id: int, school_id: int, student_id: int = None):
+_materials_flight = SingleFlight("course_materials")
+
+# Notes whose file has no previews (yet): the keys are always present in listings
+NO_PREVIEWS = {"thumbnail_url": None, "preview_url": None}
+
+
+# Shared per-course material list (without the per-student overlay)
+@cached(
+    "course_materials",
+    key=lambda db, course_id, school_id: tenant_key(school_id, "course", course_id),
+    tags=lambda db, course_id, school_id: (course_tag(course_id), school_tag(school_id)),
+    ttl=settings.COURSE_MATERIALS_CACHE_TTL,
+)
+async def _load_course_materials_payload(db: AsyncSession, course_id: int, school_id: int) -> dict:
     stmt = (
         select(LearningMaterial)
         .options(selectinload(LearningMaterial.notes), selectinload(LearningMaterial.assignment))
@@ -128,56 +152,9 @@ async def get_course_materials(db: AsyncSession, course_id: int, school_id: int,
     )
     result = await db.execute(stmt)
     materials = result.scalars().all()
-    
-    # If student_id is provided, get their submissions for these materials
-    # We need to check both the legacy Submission table and the new StudentAssignment table
-    submission_map = {}
-    if student_id:
-        from app.features.courses.models_student_assignment import StudentAssignment
-        
-        # Legacy File Submissions - get latest grade
-        sub_stmt = select(
-            Submission.assignment_id, 
-            func.count(Submission.id),
-            func.max(Submission.grade) # Simplified: taking max grade
-        ).where(
-            Submission.student_id == student_id,
-            Submission.school_id == school_id,
-            Submission.assignment_id.in_([m.id for m in materials if m.type == "assignment"])
-        ).group_by(Submission.assignment_id)
-        
-        sub_result = await db.execute(sub_stmt)
-        for row in sub_result.all():
-            submission_map[row[0]] = {
-                "attempts": row[1],
-                "score": float(row[2]) if row[2] is not None else None
-            }
+    previews = await preview_urls_for(db, [m.notes.content_url for m in materials if m.type == "notes" and m.notes])
 
-        # New Assessment Attempts - get best total_score
-        adv_stmt = select(
-            StudentAssignment.assignment_id, 
-            func.count(StudentAssignment.id),
-            func.max(StudentAssignment.total_score)
-        ).where(
-            StudentAssignment.student_id == student_id,
-            StudentAssignment.assignment_id.in_([m.id for m in materials if m.type == "assignment"])
-        ).group_by(StudentAssignment.assignment_id)
-        
-        adv_result = await db.execute(adv_stmt)
-        for row in adv_result.all():
-            if row[0] in submission_map:
-                submission_map[row[0]]["attempts"] += row[1]
-                # Keep the best score if it exists
-                if row[2] is not None:
-                    current_score = submission_map[row[0]]["score"]
-                    submission_map[row[0]]["score"] = max(current_score, float(row[2])) if current_score is not None else float(row[2])
-            else:
-                submission_map[row[0]] = {
-                    "attempts": row[1],
-                    "score": float(row[2]) if row[2] is not None else None
-                }
-    
-    response = []
+    items = []
     for m in materials:
         item = {
             "id": m.id,
@@ -190,6 +167,7 @@ async def get_course_materials(db: AsyncSession, course_id: int, school_id: int,
         }
         if m.type == "notes" and m.notes:
             item["file_url"] = m.notes.content_url
+            item.update(previews.get(m.notes.content_url, NO_PREVIEWS))
         elif m.type == "assignment" and m.assignment:
             item["total_marks"] = m.assignment.total_marks
             item["due_date"] = m.assignment.due_date
@@ -197,16 +175,114 @@ async def get_course_materials(db: AsyncSession, course_id: int, school_id: int,
             item["assignment_type"] = m.assignment.assignment_type
             item["description"] = m.assignment.description
             item["reference_materials"] = m.assignment.reference_materials or []
-            
-            if student_id:
-                sub_data = submission_map.get(m.id, {"attempts": 0, "score": None})
-                item["submission_status"] = "submitted" if sub_data["attempts"] > 0 else "pending"
-                item["attempts_made"] = sub_data["attempts"]
-                item["score"] = sub_data["score"]
-            
-        response.append(item)
-        
-    return response
+        items.append(item)
+
+    # The list changes through material writes, all of which bump updated_at,
+    # and when the preview worker finishes a file (it invalidates the cache)
+    latest = max((m.updated_at for m in materials), default=None)
+    version = f"{latest.isoformat() if latest else '-'}:{len(materials)}:{len(previews)}"
+    return {
+        "etag": make_etag("materials", school_id, course_id, version),
+        "items": jsonable_encoder(items),
+    }
+
+
+async def _student_overlay(db: AsyncSession, student_id: int, school_id: int, assignment_ids: List[int]) -> dict:
+    """Per-student ``{assignment_id: {"attempts", "score"}}`` across file submissions and attempts."""
+    from app.features.courses.models_student_assignment import StudentAssignment
+
+    # We need to check both the legacy Submission table and the new StudentAssignment table
+    submission_map = {}
+    if not assignment_ids:
+        return submission_map
+
+    # Legacy File Submissions - get latest grade
+    sub_stmt = select(
+        Submission.assignment_id,
+        func.count(Submission.id),
+        func.max(Submission.grade) # Simplified: taking max grade
+    ).where(
+        Submission.student_id == student_id,
+        Submission.school_id == school_id,
+        Submission.assignment_id.in_(assignment_ids)
+    ).group_by(Submission.assignment_id)
+
+    sub_result = await db.execute(sub_stmt)
+    for row in sub_result.all():
+        submission_map[row[0]] = {
+            "attempts": row[1],
+            "score": float(row[2]) if row[2] is not None else None
+        }
+
+    # New Assessment Attempts - get best total_score
+    adv_stmt = select(
+        StudentAssignment.assignment_id,
+        func.count(StudentAssignment.id),
+        func.max(StudentAssignment.total_score)
+    ).where(
+        StudentAssignment.student_id == student_id,
+        StudentAssignment.assignment_id.in_(assignment_ids)
+    ).group_by(StudentAssignment.assignment_id)
+
+    adv_result = await db.execute(adv_stmt)
+    for row in adv_result.all():
+        if row[0] in submission_map:
+            submission_map[row[0]]["attempts"] += row[1]
+            # Keep the best score if it exists
+            if row[2] is not None:
+                current_score = submission_map[row[0]]["score"]
+                submission_map[row[0]]["score"] = max(current_score, float(row[2])) if current_score is not None else float(row[2])
+        else:
+            submission_map[row[0]] = {
+                "attempts": row[1],
+                "score": float(row[2]) if row[2] is not None else None
+            }
+    return submission_map
+
+
+async def get_course_materials(
+    db: AsyncSession, course_id: int, school_id: int, student_id: int = None
+) -> Tuple[str, List[dict]]:
+    """
+    Returns ``(etag, materials)``. The shared course list comes from the
+    materials cache; only the student's attempts / scores are queried per call.
+    """
+    # Identical concurrent requests (refresh storms) share one run; the cached
+    # list itself is also single-flight across all students of the course
+    return await _materials_flight.do(
+        (school_id, course_id, student_id), lambda: _get_course_materials(db, course_id, school_id, student_id)
+    )
+
+
+async def _get_course_materials(db: AsyncSession, course_id: int, school_id: int, student_id: Optional[int]):
+    payload = await _load_course_materials_payload(db, course_id, school_id)
+    items = payload["items"]
+    if not student_id:
+        return payload["etag"], items
+
+    assignment_ids = [m["id"] for m in items if m["type"] == "assignment"]
+    submission_map = await _student_overlay(db, student_id, school_id, assignment_ids)
+
+    # Cached items are shared between requests; only copy the ones we annotate
+    response = []
+    for m in items:
+        if m["type"] == "assignment" and "assignment_type" in m:
+            sub_data = submission_map.get(m["id"], {"attempts": 0, "score": None})
+            m = {
+                **m,
+                "submission_status": "submitted" if sub_data["attempts"] > 0 else "pending",
+                "attempts_made": sub_data["attempts"],
+                "score": sub_data["score"],
+            }
+        response.append(m)
+
+    overlay = ",".join(f"{aid}:{v['attempts']}:{v['score']}" for aid, v in sorted(submission_map.items()))
+    return make_etag(payload["etag"], student_id, overlay), response
+
+
+async def invalidate_course_materials(course_id: int, school_id: Optional[int]) -> None:
+    """Material writes change the course listing and the school's stats."""
+    await invalidate_tags(course_tag(course_id), school_tag(school_id))
 
 async def get_teacher_course_materials(db: AsyncSession, teacher_id: int, course_id: int, school_id: int):
     stmt = (
@@ -222,6 +298,7 @@ async def get_teacher_course_materials(db: AsyncSession, teacher_id: int, course
     )
     result = await db.execute(stmt)
     materials = result.scalars().all()
+    previews = await preview_urls_for(db, [m.notes.content_url for m in materials if m.type == "notes" and m.notes])
     
     response = []
     for m in materials:
@@ -235,6 +312,7 @@ async def get_teacher_course_materials(db: AsyncSession, teacher_id: int, course
         }
         if m.type == "notes" and m.notes:
             item["file_url"] = m.notes.content_url
+            item.update(previews.get(m.notes.content_url, NO_PREVIEWS))
         elif m.type == "assignment" and m.assignment:
             item["total_marks"] = m.assignment.total_marks
             item["due_date"] = m.assignment.due_date
@@ -281,6 +359,10 @@ async def update_material(
     material.updated_at = datetime.now(UTC)
     await db.commit()
     await db.refresh(material)
+    await invalidate_course_materials(material.course_id, material.school_id)
+    if material.type == "assignment":
+        await invalidate_assignment_meta(material.id)
+        await invalidate_answer_key(material.id)
     return material
 
 
@@ -290,14 +372,28 @@ async def soft_delete_material(db: AsyncSession, material: LearningMaterial):
     material.is_deleted = True
     material.updated_at = datetime.now(UTC)
     await db.commit()
+    await invalidate_course_materials(material.course_id, material.school_id)
+    if material.type == "assignment":
+        await invalidate_assignment_meta(material.id)
+        await invalidate_answer_key(material.id)
 
 
 async def restore_material(db: AsyncSession, material: LearningMaterial):
     material.is_deleted = False
     material.updated_at = datetime.now(UTC)
     await db.commit()
+    await invalidate_course_materials(material.course_id, material.school_id)
+    if material.type == "assignment":
+        await invalidate_assignment_meta(material.id)
+        await invalidate_answer_key(material.id)
 
 
 async def hard_delete_material(db: AsyncSession, material: LearningMaterial):
+    material_id, material_type = material.id, material.type
+    course_id, school_id = material.course_id, material.school_id
     await db.delete(material)
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    await invalidate_course_materials(course_id, school_id)
+    if material_type == "assignment":
+        await invalidate_assignment_meta(material_id)
+        await invalidate_answer_key(material_id)
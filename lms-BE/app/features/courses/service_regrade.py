@@ -0,0 +1,255 @@
+"""
+Bulk re-grading after an answer-key correction.
+
+A re-grade job walks every attempt of an assignment in chunks. Each chunk's
+answers and option picks are loaded as flat columns and re-scored in one NumPy
+pass; changed ``marks_obtained`` / ``total_score`` values are written back with
+set-based ``UPDATE ... FROM (VALUES ...)`` statements. Students whose score changed
+get a single aggregated notification. Progress is kept in a Redis hash so the
+teacher can poll it.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from redis.exceptions import RedisError
+from sqlalchemy import Float, Integer, Numeric, cast, column, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.background import run_with_session
+from app.core.redis_client import get_redis
+from app.features.activity_logs.schemas import ActivityLogCreate
+from app.features.activity_logs.service import log_action
+from app.features.courses.answer_key import AnswerKey, get_answer_key
+from app.features.courses.models_answer import StudentAnswer, student_answer_options
+from app.features.courses.models_student_assignment import StudentAssignment
+from app.features.courses.service_analytics import invalidate_assignment_analytics
+from app.features.notifications.schemas import NotificationCreate
+from app.features.notifications.service import create_notifications_bulk
+
+logger = logging.getLogger(__name__)
+
+REGRADE_CHUNK = 2000
+# Rows per UPDATE ... FROM (VALUES ...) statement (2 bind parameters each)
+UPDATE_BATCH = 10000
+REGRADE_JOB_TTL = 24 * 3600
+# Differences below this are float noise, not a grade change
+EPSILON = 1e-9
+
+
+def _job_key(job_id: str) -> str:
+    return f"regrade_job:{job_id}"
+
+
+async def _set_progress(job_id: str, **fields) -> None:
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(_job_key(job_id), mapping={k: "" if v is None else v for k, v in fields.items()})
+            pipe.expire(_job_key(job_id), REGRADE_JOB_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Re-grade {job_id}: could not record progress: {e}")
+
+
+async def get_regrade_progress(job_id: str) -> Optional[dict]:
+    redis = await get_redis()
+    data = await redis.hgetall(_job_key(job_id))
+    if not data:
+        return None
+    return {
+        "job_id": job_id,
+        "assignment_id": int(data["assignment_id"]),
+        "school_id": int(data["school_id"]) if data.get("school_id") else None,
+        "status": data["status"],
+        "total": int(data.get("total") or 0),
+        "processed": int(data.get("processed") or 0),
+        "changed_attempts": int(data.get("changed_attempts") or 0),
+        "notified_students": int(data.get("notified_students") or 0),
+        "error": data.get("error") or None,
+    }
+
+
+async def start_regrade(assignment_id: int, school_id: Optional[int], teacher_id: int) -> str:
+    """Queue a re-grade of every attempt of ``assignment_id`` and return its job id."""
+    job_id = uuid.uuid4().hex
+    await _set_progress(job_id, assignment_id=assignment_id, school_id=school_id, status="queued")
+    run_with_session(run_regrade, job_id, assignment_id, school_id, teacher_id)
+    return job_id
+
+
+def rescore_answers(
+    key: AnswerKey,
+    question_ids: np.ndarray,
+    old_marks: np.ndarray,
+    pick_answer_idx: np.ndarray,
+    pick_option_ids: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized MCQ scoring for many answers at once.
+
+    ``pick_answer_idx[i]`` is the row (into ``question_ids``) of the answer
+    that selected ``pick_option_ids[i]``. Non-MCQ answers keep ``old_marks``.
+    """
+    questions = list(key.questions.values())
+    q_pos = {q.id: i for i, q in enumerate(questions)}
+    q_marks = np.array([q.marks for q in questions] + [0.0])
+    q_correct = np.array([len(q.correct_ids) for q in questions] + [0])
+    q_mcq = np.array([q.question_type == "MCQ" for q in questions] + [False])
+    correct_options = {oid for q in questions for oid in q.correct_ids}
+
+    n = len(question_ids)
+    # Unknown questions map to the trailing sentinel row (not MCQ, 0 marks)
+    q_idx = np.fromiter((q_pos.get(int(q), len(questions)) for q in question_ids), dtype=np.int64, count=n)
+
+    is_right = np.fromiter((int(o) in correct_options for o in pick_option_ids), dtype=float, count=len(pick_option_ids))
+    picked = np.bincount(pick_answer_idx, minlength=n).astype(float)
+    right = np.bincount(pick_answer_idx, weights=is_right, minlength=n)
+    wrong = picked - right
+
+    n_correct = q_correct[q_idx]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factor = np.where(n_correct > 0, (right - wrong) / n_correct, 0.0)
+    mcq_marks = np.where(picked > 0, np.maximum(0.0, factor) * q_marks[q_idx], 0.0)
+    return np.where(q_mcq[q_idx], mcq_marks, old_marks)
+
+
+async def _update_by_id(db: AsyncSession, model, field: str, rows: List[tuple]) -> None:
+    """``UPDATE model SET field = v.value FROM (VALUES (id, value), ...) v WHERE model.id = v.id``, batched."""
+    for start in range(0, len(rows), UPDATE_BATCH):
+        new_values = values(column("id", Integer), column("value", Numeric), name="new_values").data(
+            rows[start:start + UPDATE_BATCH]
+        )
+        await db.execute(
+            update(model)
+            .where(model.id == new_values.c.id)
+            .values({field: new_values.c.value})
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def _regrade_chunk(db: AsyncSession, key: AnswerKey, attempts: List[tuple]) -> List[tuple]:
+    """Re-score one chunk of attempts; returns ``(student_id, attempt_number, old_total, new_total)`` for changed ones."""
+    attempt_ids = [a[0] for a in attempts]
+    answers = (await db.execute(
+        select(StudentAnswer.id, StudentAnswer.student_assignment_id, StudentAnswer.question_id,
+               cast(StudentAnswer.marks_obtained, Float))
+        .where(StudentAnswer.student_assignment_id.in_(attempt_ids))
+        .order_by(StudentAnswer.id)
+    )).all()
+    if not answers:
+        return []
+
+    picks = (await db.execute(
+        select(student_answer_options.c.student_answer_id, student_answer_options.c.mcq_option_id)
+        .join(StudentAnswer, StudentAnswer.id == student_answer_options.c.student_answer_id)
+        .where(StudentAnswer.student_assignment_id.in_(attempt_ids))
+    )).all()
+
+    answer_ids = np.array([a[0] for a in answers], dtype=np.int64)
+    answer_attempts = np.array([a[1] for a in answers], dtype=np.int64)
+    question_ids = np.array([a[2] for a in answers], dtype=np.int64)
+    old_marks = np.nan_to_num(np.array([a[3] for a in answers], dtype=float))
+
+    if picks:
+        pick_answer_idx = np.searchsorted(answer_ids, np.array([p[0] for p in picks], dtype=np.int64))
+        pick_option_ids = np.array([p[1] for p in picks], dtype=np.int64)
+    else:
+        pick_answer_idx = np.zeros(0, dtype=np.int64)
+        pick_option_ids = np.zeros(0, dtype=np.int64)
+
+    new_marks = rescore_answers(key, question_ids, old_marks, pick_answer_idx, pick_option_ids)
+    changed = np.abs(new_marks - old_marks) > EPSILON
+    if not changed.any():
+        return []
+
+    # Apply the per-attempt delta so manual adjustments to total_score survive
+    attempt_ids_arr = np.array(attempt_ids, dtype=np.int64)
+    order = np.argsort(attempt_ids_arr)
+    attempt_pos = order[np.searchsorted(attempt_ids_arr[order], answer_attempts[changed])]
+    delta = np.bincount(attempt_pos, weights=(new_marks - old_marks)[changed], minlength=len(attempts))
+
+    await _update_by_id(
+        db, StudentAnswer, "marks_obtained",
+        list(zip(answer_ids[changed].tolist(), new_marks[changed].tolist())),
+    )
+
+    results = []
+    totals = []
+    for (attempt_id, student_id, attempt_number, old_total), d in zip(attempts, delta.tolist()):
+        if abs(d) <= EPSILON:
+            continue
+        old_total = old_total or 0.0
+        new_total = max(0.0, old_total + d)
+        totals.append((attempt_id, new_total))
+        results.append((student_id, attempt_number, old_total, new_total))
+
+    await _update_by_id(db, StudentAssignment, "total_score", totals)
+    return results
+
+
+def _fmt(score: float) -> str:
+    return f"{score:g}"
+
+
+async def run_regrade(db: AsyncSession, job_id: str, assignment_id: int, school_id: Optional[int], teacher_id: int):
+    try:
+        key = await get_answer_key(db, assignment_id)
+        if not key:
+            await _set_progress(job_id, status="failed", error="Assignment not found")
+            return
+
+        attempts = (await db.execute(
+            select(StudentAssignment.id, StudentAssignment.student_id, StudentAssignment.attempt_number,
+                   cast(StudentAssignment.total_score, Float))
+            .where(StudentAssignment.assignment_id == assignment_id, StudentAssignment.is_deleted == False)
+            .order_by(StudentAssignment.id)
+        )).all()
+        await _set_progress(job_id, status="running", total=len(attempts), processed=0, changed_attempts=0)
+
+        changes: Dict[int, List[tuple]] = defaultdict(list)
+        changed_attempts = 0
+        for start in range(0, len(attempts), REGRADE_CHUNK):
+            chunk = attempts[start:start + REGRADE_CHUNK]
+            for student_id, attempt_number, old_total, new_total in await _regrade_chunk(db, key, chunk):
+                changes[student_id].append((attempt_number, old_total, new_total))
+                changed_attempts += 1
+            await db.commit()
+            await _set_progress(job_id, processed=start + len(chunk), changed_attempts=changed_attempts)
+
+        # Gradebook exports and analytics read scores live; drop the cached analytics
+        await invalidate_assignment_analytics(assignment_id)
+
+        title = f"'{key.title}'" if key.title else f"assignment #{assignment_id}"
+        notifications = []
+        for student_id, rows in changes.items():
+            detail = ", ".join(
+                f"attempt {n}: {_fmt(old)} → {_fmt(new)}" for n, old, new in sorted(rows)
+            )
+            notifications.append(NotificationCreate(
+                user_id=student_id,
+                type="assignment_regraded",
+                message=f"Your score for {title} was updated after an answer key correction ({detail}).",
+                entity_id=assignment_id,
+                # Every re-grade changes scores again, so it must not be merged with one earlier in the hour
+                event_id=f"regrade:{job_id}",
+            ))
+        await create_notifications_bulk(db, notifications, school_id=key.school_id)
+
+        await log_action(db, ActivityLogCreate(
+            user_id=teacher_id,
+            course_id=key.course_id,
+            action="regrade_assignment",
+            entity_type="material",
+            entity_id=assignment_id,
+            details=f"Re-graded {len(attempts)} attempts, {changed_attempts} changed"
+        ), school_id=key.school_id)
+
+        await _set_progress(job_id, status="completed", notified_students=len(notifications))
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Re-grade {job_id} for assignment {assignment_id} failed: {e}")
+        await _set_progress(job_id, status="failed", error=str(e))
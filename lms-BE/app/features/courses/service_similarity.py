@@ -0,0 +1,338 @@
+"""
+Near-duplicate detection for TEXT answers and text file submissions.
+
+Each answer is normalised to word 3-gram shingles and reduced to a
+``NUM_PERM``-value MinHash signature, computed once (in the background as
+attempts and submissions arrive, with an hourly backfill for anything missed)
+and stored in ``text_signatures``; the report only reads them. It splits every
+signature into ``LSH_BANDS`` bands; only answers that collide in at least one
+band bucket are compared, so finding candidates is roughly linear in the
+number of answers instead of all pairs. Candidates are
+confirmed with the signature estimate of Jaccard similarity and grouped into
+clusters (union-find).
+"""
+
+import asyncio
+import logging
+import os
+import re
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.core.storage import get_storage, get_storage_backend
+from app.features.courses.models_answer import StudentAnswer
+from app.features.courses.models_similarity import TextSignature
+from app.features.courses.models_student_assignment import StudentAssignment
+from app.features.files.models import FileRecord
+from app.features.submissions.models import Submission
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+# Shorter answers ("Paris", "O(n log n)") match by nature and are not compared
+MIN_TOKENS = 8
+DEFAULT_THRESHOLD = 0.6
+INSERT_BATCH = 1000
+# Answers signed per backfill run
+BACKFILL_BATCH = 5000
+# Shingles hashed per NumPy block, bounds memory for long documents
+HASH_BLOCK = 4096
+EXCERPT_LENGTH = 200
+
+# Uploaded files are only compared when their text can be read directly
+MAX_EXTRACT_BYTES = 2 * 1024 * 1024
+TEXT_CONTENT_TYPES = {"application/json", "application/xml", "application/x-python", "application/javascript"}
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".csv", ".json", ".xml", ".html", ".htm",
+    ".py", ".java", ".c", ".h", ".cpp", ".cs", ".js", ".ts", ".sql", ".rb", ".go",
+}
+
+# Fixed seed: signatures are stored, so every process must use the same permutations
+_rng = np.random.default_rng(0x4C4D53)
+_PERM_A = _rng.integers(1, 2 ** 64, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 64, size=NUM_PERM, dtype=np.uint64)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def shingle(text: str) -> Optional[set]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> Optional[bytes]:
+    """MinHash signature of ``text`` as ``NUM_PERM`` little-endian uint32s, or None if too short."""
+    shingles = shingle(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_BLOCK):
+        block = hashes[start:start + HASH_BLOCK, None]
+        # Multiply-shift hashing; uint64 overflow wraps, which is the point
+        permuted = (block * _PERM_A + _PERM_B) >> np.uint64(32)
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype("<u4").tobytes()
+
+
+async def _store_signatures(db: AsyncSession, rows: List[dict]) -> int:
+    """Compute signatures for ``rows`` (each carrying a ``text``) off the event loop and insert them."""
+    if not rows:
+        return 0
+    texts = [row.pop("text") for row in rows]
+    signatures = await asyncio.to_thread(lambda: [minhash(t) for t in texts])
+    for row, signature in zip(rows, signatures):
+        row["signature"] = signature
+    for start in range(0, len(rows), INSERT_BATCH):
+        await db.execute(pg_insert(TextSignature).values(rows[start:start + INSERT_BATCH]).on_conflict_do_nothing())
+    await db.commit()
+    return len(rows)
+
+
+def _answer_rows(result: Iterable[tuple]) -> List[dict]:
+    return [
+        {
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "student_answer_id": answer_id,
+            "question_id": question_id,
+            "text": text,
+        }
+        for answer_id, question_id, text, student_id, assignment_id in result
+    ]
+
+
+def _answers_query():
+    return (
+        select(
+            StudentAnswer.id, StudentAnswer.question_id, StudentAnswer.answer_text,
+            StudentAssignment.student_id, StudentAssignment.assignment_id,
+        )
+        .join(StudentAssignment, StudentAssignment.id == StudentAnswer.student_assignment_id)
+        .where(StudentAnswer.answer_text.isnot(None), StudentAnswer.answer_text != "")
+    )
+
+
+async def index_attempt(db: AsyncSession, attempt_id: int) -> None:
+    """Background job: sign the TEXT answers of a freshly submitted attempt."""
+    result = (await db.execute(_answers_query().where(StudentAnswer.student_assignment_id == attempt_id))).all()
+    await _store_signatures(db, _answer_rows(result))
+
+
+async def backfill_text_signatures() -> None:
+    """Background job: sign answers that predate the similarity index (or whose background job was lost)."""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = (await db.execute(
+                _answers_query()
+                .outerjoin(TextSignature, TextSignature.student_answer_id == StudentAnswer.id)
+                .where(TextSignature.id.is_(None))
+                .order_by(StudentAnswer.id)
+                .limit(BACKFILL_BATCH)
+            )).all()
+            stored = await _store_signatures(db, _answer_rows(result))
+        if stored:
+            logger.info(f"Similarity backfill: signed {stored} answers")
+    except Exception as e:
+        logger.error(f"Error backfilling text signatures: {e}")
+
+
+def _is_text_file(object_name: str, content_type: Optional[str]) -> bool:
+    if content_type and (content_type.startswith("text/") or content_type in TEXT_CONTENT_TYPES):
+        return True
+    return os.path.splitext(object_name)[1].lower() in TEXT_EXTENSIONS
+
+
+def _read_text(object_name: str) -> str:
+    buffer = bytearray()
+    chunks = get_storage_backend().iter_file_chunks(object_name)
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= MAX_EXTRACT_BYTES:
+                break
+    finally:
+        chunks.close()
+    return bytes(buffer[:MAX_EXTRACT_BYTES]).decode("utf-8", errors="ignore")
+
+
+async def index_submission(db: AsyncSession, submission_id: int) -> None:
+    """Background job: sign an uploaded submission if it is a plain-text file."""
+    submission = await db.get(Submission, submission_id)
+    if not submission or not submission.object_name:
+        return
+    record = (await db.execute(
+        select(FileRecord.content_type, FileRecord.storage_key).where(FileRecord.object_name == submission.object_name)
+    )).first()
+    content_type, storage_key = record if record else (None, None)
+    if not _is_text_file(submission.object_name, content_type):
+        return
+    text = await get_storage().run(_read_text, storage_key or submission.object_name)
+    await _store_signatures(db, [{
+        "assignment_id": submission.assignment_id,
+        "student_id": submission.student_id,
+        "submission_id": submission.id,
+        "question_id": None,
+        "text": text,
+    }])
+
+
+def _candidate_pairs(signatures: np.ndarray, student_ids: np.ndarray) -> np.ndarray:
+    """
+    LSH banding: index pairs ``(i, j), i < j`` that share a band bucket.
+
+    Rather than every pair in a bucket, each member is paired with the
+    bucket's first row, and members of that row's student also with the first
+    row of another student, so a bucket costs O(size) and clusters still form
+    through union-find.
+    """
+    n = len(signatures)
+    rows_idx = np.arange(n)
+    chunks = []
+    for band in range(LSH_BANDS):
+        rows = np.ascontiguousarray(signatures[:, band * LSH_ROWS:(band + 1) * LSH_ROWS])
+        keys = rows.view(f"V{rows.shape[1] * rows.itemsize}").ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(first) == n:
+            continue
+        rep = first[inverse]
+        members = np.flatnonzero(rep != rows_idx)
+        chunks.append(np.stack([rep[members], members], axis=1))
+
+        # The representative's own student would be filtered out: also link to another student
+        other = np.flatnonzero(student_ids != student_ids[rep])
+        buckets, first_other = np.unique(inverse[other], return_index=True)
+        other_rep = np.full(len(first), -1)
+        other_rep[buckets] = other[first_other]
+        same = members[other_rep[inverse[members]] >= 0]
+        same = same[student_ids[same] == student_ids[rep[same]]]
+        linked = other_rep[inverse[same]]
+        chunks.append(np.stack([np.minimum(linked, same), np.maximum(linked, same)], axis=1))
+    if not chunks:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(chunks).astype(np.int64), axis=0)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_clusters(
+    signatures: np.ndarray, student_ids: np.ndarray, threshold: float
+) -> Tuple[int, List[Tuple[List[int], float, float]]]:
+    """
+    Group near-duplicate rows of ``signatures``.
+
+    Returns the number of LSH candidate pairs and, for each cluster, its member
+    row indexes with the min / max estimated similarity of its confirmed pairs.
+    Answers of the same student (several attempts) are never paired.
+    """
+    candidates = _candidate_pairs(signatures, student_ids)
+    if not len(candidates):
+        return 0, []
+    i, j = candidates[:, 0], candidates[:, 1]
+    similarity = (signatures[i] == signatures[j]).mean(axis=1)
+    keep = (similarity >= threshold) & (student_ids[i] != student_ids[j])
+
+    parent = list(range(len(signatures)))
+    for a, b in zip(i[keep].tolist(), j[keep].tolist()):
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    stats: Dict[int, List[float]] = {}
+    for a, s in zip(i[keep].tolist(), similarity[keep].tolist()):
+        root = _find(parent, a)
+        low, high = stats.get(root, (1.0, 0.0))
+        stats[root] = [min(low, s), max(high, s)]
+
+    members: Dict[int, List[int]] = {}
+    for idx in range(len(signatures)):
+        root = _find(parent, idx)
+        if root in stats:
+            members.setdefault(root, []).append(idx)
+    clusters = [(members[root], low, high) for root, (low, high) in stats.items()]
+    return len(candidates), clusters
+
+
+async def get_similarity_report(db: AsyncSession, assignment_id: int, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    rows = (await db.execute(
+        select(
+            TextSignature.student_id, TextSignature.student_answer_id, TextSignature.submission_id,
+            TextSignature.question_id, TextSignature.signature, StudentAnswer.student_assignment_id,
+        )
+        .outerjoin(StudentAnswer, StudentAnswer.id == TextSignature.student_answer_id)
+        .outerjoin(StudentAssignment, StudentAssignment.id == StudentAnswer.student_assignment_id)
+        .where(
+            TextSignature.assignment_id == assignment_id,
+            TextSignature.signature.isnot(None),
+            or_(TextSignature.submission_id.isnot(None), StudentAssignment.is_deleted == False),
+        )
+    )).all()
+
+    # Answers are only compared with answers to the same question; files with files
+    groups: Dict[Optional[int], List[tuple]] = {}
+    for row in rows:
+        groups.setdefault(row.question_id if row.submission_id is None else None, []).append(row)
+
+    report_clusters = []
+    candidate_total = 0
+    for question_id, group in groups.items():
+        signatures = np.frombuffer(b"".join(r.signature for r in group), dtype="<u4").reshape(len(group), NUM_PERM)
+        student_ids = np.array([r.student_id for r in group], dtype=np.int64)
+        # CPU-bound for large classes: keep it off the event loop
+        n_candidates, clusters = await asyncio.to_thread(find_clusters, signatures, student_ids, threshold)
+        candidate_total += n_candidates
+        for member_idx, low, high in clusters:
+            report_clusters.append({
+                "question_id": question_id,
+                "source": "submission" if question_id is None else "answer",
+                "size": len(member_idx),
+                "min_similarity": round(low, 4),
+                "max_similarity": round(high, 4),
+                "members": [
+                    {
+                        "student_id": group[k].student_id,
+                        "attempt_id": group[k].student_assignment_id,
+                        "student_answer_id": group[k].student_answer_id,
+                        "submission_id": group[k].submission_id,
+                    }
+                    for k in member_idx
+                ],
+            })
+
+    answer_ids = [m["student_answer_id"] for c in report_clusters for m in c["members"] if m["student_answer_id"]]
+    if answer_ids:
+        excerpts = dict((await db.execute(
+            select(StudentAnswer.id, func.left(StudentAnswer.answer_text, EXCERPT_LENGTH))
+            .where(StudentAnswer.id.in_(answer_ids))
+        )).all())
+        for cluster in report_clusters:
+            for member in cluster["members"]:
+                member["excerpt"] = excerpts.get(member["student_answer_id"])
+
+    report_clusters.sort(key=lambda c: (-c["size"], -c["max_similarity"]))
+    return {
+        "assignment_id": assignment_id,
+        "threshold": threshold,
+        "signatures": len(rows),
+        "candidate_pairs": candidate_total,
+        "clusters": report_clusters,
+    }
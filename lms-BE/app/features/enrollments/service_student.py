@@ -10,6 +10,8 @@ from app.features.notifications.service import create_notification
 from app.features.notifications.schemas import NotificationCreate
 from app.features.activity_logs.service import log_action
 from app.features.activity_logs.schemas import ActivityLogCreate
+from app.features.submissions.fast_path import invalidate_course_roster
+from app.core.cache import invalidate_tags, user_tag
 
 
 async def enroll_student_in_course(
@@ -55,6 +57,9 @@ async def enroll_student_in_course(
         await db.rollback()
         raise ValueError("Student already enrolled in this course")
 
+    await invalidate_course_roster(course_id)
+    await invalidate_tags(user_tag(student_id))
+
     await log_action(db, ActivityLogCreate(
         user_id=student_id,
         action="course_enrolled",
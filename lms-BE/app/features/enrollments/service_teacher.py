@@ -10,6 +10,7 @@ from app.features.activity_logs.service import log_action
 from app.features.activity_logs.schemas import ActivityLogCreate
 from app.features.notifications.service import create_notification
 from app.features.notifications.schemas import NotificationCreate
+from app.core.cache import invalidate_tags, user_tag
 
 
 async def assign_teacher_to_course(
@@ -54,6 +55,7 @@ async def assign_teacher_to_course(
     except IntegrityError:
         await db.rollback()
         raise ValueError("Teacher already assigned to this course")
+    await invalidate_tags(user_tag(teacher_id))
 
     await log_action(db, ActivityLogCreate(
         user_id=teacher_id,
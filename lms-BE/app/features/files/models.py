@@ -25,6 +25,21 @@ class FileRecord(Base):
     content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     """MIME type (e.g., application/pdf, image/jpeg)"""
 
+    sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    """Hex SHA-256 of the content, when it was computed during upload"""
+
+    storage_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    """Key of the shared FileBlob holding the bytes (content-addressed mode); NULL means the object lives at object_name"""
+
+    preview_status: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    """ready / unsupported / failed once the preview worker has handled the file; NULL until then"""
+
+    thumbnail_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    """Object key of the first-page thumbnail (set when preview_status is ready)"""
+
+    preview_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    """Object key of the low-resolution preview (set when preview_status is ready)"""
+
     school_id: Mapped[Optional[int]] = mapped_column(
         Integer,
         ForeignKey("schools.id", ondelete="CASCADE"),
@@ -50,3 +65,58 @@ class FileRecord(Base):
     # Relationships
     uploader = relationship("User")
     school = relationship("School")
+
+
+class FileBlob(Base):
+    """Content-addressed object shared by every FileRecord with the same bytes."""
+
+    __tablename__ = "file_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    """Hex SHA-256 of the content"""
+
+    storage_key: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    """Object key in storage (blobs/<first two hex chars>/<sha256>)"""
+
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    """Size in bytes"""
+
+    content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    """MIME type recorded by the first upload"""
+
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    """Number of FileRecords referencing this blob (reconciled by the GC job)"""
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(UTC),
+    )
+
+    released_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    """When ref_count last dropped to 0; the blob is collected after a grace period"""
+
+
+class SchoolStorageUsage(Base):
+    """Bytes and files stored per school and top-level folder (persisted copy of the Redis counters)."""
+
+    __tablename__ = "school_storage_usage"
+
+    school_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("schools.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    folder: Mapped[str] = mapped_column(String, primary_key=True)
+    """Folder under schools/<id>/ (e.g. notes, assignments); empty for files at the school root"""
+
+    bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    files: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(UTC),
+    )
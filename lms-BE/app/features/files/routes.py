@@ -6,37 +6,64 @@ Uses a DB-backed FileRecord table for school-scoped file tracking.
 """
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Depends
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from typing import Optional
+from typing import List, Optional
 import logging
+import mimetypes
+import os
 
+from app.core.config import settings
 from app.core.rate_limiter import limiter
-from app.core.storage import get_minio_client
+from app.core.storage import UploadTooLargeError, get_storage
+from app.core.storage_local import COPY_CHUNK, LocalFileStorage
+from app.core.preview_render import PREVIEW_SUFFIX, THUMBNAIL_SUFFIX
 from app.core.database import get_db
-from app.features.auth.dependencies import get_current_user
+from app.features.auth.dependencies import get_current_user, require_role
 from app.features.users.models import User
 from app.features.files.models import FileRecord
+from app.features.files.service_batch import upload_batch
+from app.features.files.service_blobs import BLOB_PREFIX, release_blob, resolve_storage_keys, store_deduplicated
+from app.features.files.service_download import download_response, get_downloadable_record
+from app.features.files.service_previews import enqueue_previews
+from app.features.files.service_quota import QuotaCheckedRoute, check_quota, get_usage_report, record_usage
+from app.features.files.service_reconcile import reconcile_storage
+from app.core.download_cache import get_download_cache
+from app.features.files.service import (
+    abort_direct_upload,
+    complete_direct_upload,
+    resolve_upload_folder,
+    start_direct_upload,
+)
 from app.schemas.file import (
+    BatchUploadResponse,
+    DirectUploadCompleteRequest,
+    DirectUploadRequest,
+    DirectUploadResponse,
     FileUploadResponse,
     PresignedURLRequest,
     PresignedURLResponse,
     FileInfoResponse,
     FileListResponse,
     FileListItem,
+    ReconcileReport,
+    SchoolStorageUsageResponse,
 )
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/files", tags=["Files"])
+# Endpoints receiving file bodies: the school quota is checked before the body is read
+upload_router = APIRouter(route_class=QuotaCheckedRoute)
 
 
 # ---------------------------------------------------------------------------
 # Upload
 # ---------------------------------------------------------------------------
 
-@router.post("/upload", response_model=FileUploadResponse, status_code=201)
+@upload_router.post("/upload", response_model=FileUploadResponse, status_code=201)
 @limiter.limit("20/minute")
 async def upload_file(
     request: Request,
@@ -50,31 +77,37 @@ async def upload_file(
         if not file.filename:
             raise HTTPException(status_code=400, detail="No filename provided")
 
-        minio_client = get_minio_client()
-
-        target_folder = folder or ""
-        school_id: Optional[int] = None
-
-        if current_user.role != "super_admin":
-            if not current_user.school_id:
-                raise HTTPException(status_code=403, detail="User is not assigned to a school")
-            school_id = current_user.school_id
-            target_folder = f"schools/{school_id}/{target_folder}".strip("/")
-
-        # Upload to MinIO
-        result = await minio_client.upload_file(file, folder=target_folder)
+        storage = get_storage()
+
+        school_id, target_folder = resolve_upload_folder(current_user, folder)
+        if file.size is not None:
+            # Exact size, for uploads that arrived without a Content-Length
+            await check_quota(db, school_id, file.size)
+
+        try:
+            if settings.STORAGE_DEDUP:
+                # Content-addressed: identical bytes are stored once and shared
+                record, result = await store_deduplicated(db, file, target_folder, school_id, current_user.id)
+            else:
+                # Stream to MinIO
+                result = await storage.upload_file(file, folder=target_folder)
+                record = FileRecord(
+                    object_name=result["object_name"],
+                    original_filename=file.filename,
+                    size=result["size"],
+                    content_type=result.get("content_type"),
+                    sha256=result.get("sha256"),
+                    school_id=school_id,
+                    uploaded_by=current_user.id,
+                )
+                db.add(record)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
         # Save record in DB
-        record = FileRecord(
-            object_name=result["object_name"],
-            original_filename=file.filename,
-            size=result["size"],
-            content_type=result.get("content_type"),
-            school_id=school_id,
-            uploaded_by=current_user.id,
-        )
-        db.add(record)
         await db.commit()
+        await record_usage(school_id, result["object_name"], result["size"])
+        await enqueue_previews(record)
 
         logger.info(f"File uploaded and recorded: {result['object_name']} (school_id={school_id})")
 
@@ -87,6 +120,63 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
 
+@upload_router.post("/upload/batch", response_model=BatchUploadResponse)
+@limiter.limit("10/minute")
+async def upload_files_batch(
+    request: Request,
+    files: List[UploadFile] = File(..., description="Files to upload"),
+    folder: Optional[str] = Query("", description="Folder path within bucket (e.g., 'notes', 'assignments')"),
+    course_id: Optional[int] = Query(None, description="Also create a notes material per file in this course (teachers)"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Upload several files in one request; each file gets its own result."""
+    try:
+        return await upload_batch(db, current_user, files, folder, course_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to upload files: {str(e)}")
+
+
+# ---------------------------------------------------------------------------
+# Direct upload (presigned PUT / multipart, bytes never pass through the API)
+# ---------------------------------------------------------------------------
+
+@router.post("/direct-upload", response_model=DirectUploadResponse, status_code=201)
+@limiter.limit("20/minute")
+async def start_direct_file_upload(
+    request: Request,
+    data: DirectUploadRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get presigned URLs to upload a file straight to storage."""
+    return await start_direct_upload(db, current_user, data)
+
+
+@router.post("/direct-upload/complete", response_model=FileUploadResponse, status_code=201)
+async def complete_direct_file_upload(
+    data: DirectUploadCompleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Verify a direct upload in storage and register it in the DB."""
+    result = await complete_direct_upload(db, current_user, data)
+    return FileUploadResponse(**result)
+
+
+@router.delete("/direct-upload/{upload_token}", status_code=204)
+async def abort_direct_file_upload(
+    upload_token: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Abandon a direct upload and discard anything already uploaded."""
+    await abort_direct_upload(current_user, upload_token)
+    return None
+
+
 # ---------------------------------------------------------------------------
 # List
 # ---------------------------------------------------------------------------
@@ -182,14 +272,17 @@ async def generate_presigned_url(
             if not result.scalars().first():
                 raise HTTPException(status_code=403, detail="Cannot access files outside your school")
 
-        minio_client = get_minio_client()
+        storage = get_storage()
+        record = await db.scalar(select(FileRecord).where(FileRecord.object_name == target_object))
+        storage_key = record.storage_key if record and record.storage_key else target_object
 
-        if not minio_client.file_exists(target_object):
+        if not await storage.exists(storage_key):
             raise HTTPException(status_code=404, detail="File not found")
 
-        url = minio_client.generate_presigned_url(
-            object_name=target_object,
+        url = await storage.presigned_get_url(
+            storage_key,
             expiry=request.expiry,
+            filename=record.original_filename if storage_key != target_object else None,
         )
 
         logger.info(f"Generated presigned URL for: {target_object}")
@@ -207,6 +300,22 @@ async def generate_presigned_url(
         raise HTTPException(status_code=500, detail=f"Failed to generate URL: {str(e)}")
 
 
+# ---------------------------------------------------------------------------
+# Download proxy
+# ---------------------------------------------------------------------------
+
+@router.get("/download/{file_id}")
+async def download_file(
+    request: Request,
+    file_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream a file through the API (Range supported); hot files are served from a local disk cache."""
+    record = await get_downloadable_record(db, current_user, file_id)
+    return await download_response(request, record)
+
+
 # ---------------------------------------------------------------------------
 # File info
 # ---------------------------------------------------------------------------
@@ -231,8 +340,9 @@ async def get_file_info(
             if not result.scalars().first():
                 raise HTTPException(status_code=403, detail="Cannot access files outside your school")
 
-        minio_client = get_minio_client()
-        info = minio_client.get_file_info(object_name)
+        storage_key = (await resolve_storage_keys(db, [object_name]))[object_name]
+        info = await get_storage().stat(storage_key)
+        info["object_name"] = object_name
 
         return FileInfoResponse(**info)
 
@@ -274,18 +384,33 @@ async def delete_file(
             )
             record = result.scalars().first()
 
-        minio_client = get_minio_client()
+        if record and record.storage_key:
+            # Shared blob: drop this reference; the GC job deletes the bytes once unreferenced
+            await release_blob(db, record.storage_key)
+            await db.delete(record)
+            await db.commit()
+            get_download_cache().discard(record.storage_key)
+            await record_usage(record.school_id, object_name, -record.size, files=-1)
+            logger.info(f"File deleted: {object_name} (blob {record.storage_key} released)")
+            return None
+
+        storage = get_storage()
 
-        if not minio_client.file_exists(object_name):
+        if not await storage.exists(object_name):
             raise HTTPException(status_code=404, detail="File not found")
 
-        minio_client.delete_file(object_name)
+        await storage.delete(object_name)
+        get_download_cache().discard(object_name)
+        if record and record.thumbnail_key:
+            # Previews of a shared blob stay with the blob; these belong to this file only
+            await storage.delete_many([record.thumbnail_key, record.preview_key])
         logger.info(f"File deleted: {object_name}")
 
         # Remove DB record if it exists
         if record:
             await db.delete(record)
             await db.commit()
+            await record_usage(record.school_id, object_name, -record.size, files=-1)
 
         return None
 
@@ -294,3 +419,157 @@ async def delete_file(
     except Exception as e:
         logger.error(f"Error deleting file: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
+
+
+# ---------------------------------------------------------------------------
+# Storage usage
+# ---------------------------------------------------------------------------
+
+@router.get("/usage", response_model=list[SchoolStorageUsageResponse])
+async def get_storage_usage(
+    school_id: Optional[int] = Query(None, description="Only this school (super admin)"),
+    current_user: User = Depends(require_role("super_admin", "principal")),
+    db: AsyncSession = Depends(get_db),
+):
+    """Bytes and files stored per school and folder, with each school's quota."""
+    if current_user.role != "super_admin":
+        school_id = current_user.school_id
+    return await get_usage_report(db, school_id)
+
+
+# ---------------------------------------------------------------------------
+# Reconciliation (super admin)
+# ---------------------------------------------------------------------------
+
+@router.post("/reconcile", response_model=ReconcileReport)
+async def reconcile_files(
+    dry_run: bool = Query(True, description="Only report differences, change nothing"),
+    school_id: Optional[int] = Query(None, description="Limit the run to one school's prefix"),
+    current_user: User = Depends(require_role("super_admin")),
+):
+    """Compare database references with storage; optionally delete missing records and unreferenced objects."""
+    return await reconcile_storage(dry_run=dry_run, school_id=school_id)
+
+
+# ---------------------------------------------------------------------------
+# Local storage engine (HMAC-signed URLs instead of S3 presigned URLs)
+# ---------------------------------------------------------------------------
+
+def _verified_local_path(method: str, object_name: str, expires: int, signature: str) -> str:
+    backend = get_storage().backend
+    if not isinstance(backend, LocalFileStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    if not backend.verify_signature(method, object_name, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    try:
+        return backend.local_path(object_name)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid object name")
+
+
+async def _authorized_local_path(request: Request, db: AsyncSession, object_name: str) -> str:
+    """
+    Local path of an object requested through its unsigned public URL.
+
+    Public URLs are stored (notes, submissions, previews), so they cannot
+    carry an expiring signature; instead the caller's access token decides:
+    objects under ``schools/<id>/`` are readable by that school, blobs (and
+    their previews) by schools holding a record that points at them, and
+    super admin uploads outside ``schools/`` by every signed-in user.
+    """
+    backend = get_storage().backend
+    if not isinstance(backend, LocalFileStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    current_user = await get_current_user(token, db)
+    try:
+        path = backend.local_path(object_name)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid object name")
+    # Authorise the key the path resolves to, not the raw name ("x/../schools/2/...")
+    object_name = os.path.relpath(path, os.path.join(backend.root, backend.bucket_name)).replace(os.sep, "/")
+
+    if current_user.role != "super_admin":
+        if object_name.startswith(f"{BLOB_PREFIX}/"):
+            blob = object_name.removesuffix(THUMBNAIL_SUFFIX).removesuffix(PREVIEW_SUFFIX)
+            allowed = await db.scalar(
+                select(FileRecord.id)
+                .where(FileRecord.storage_key == blob, FileRecord.school_id == current_user.school_id)
+                .limit(1)
+            )
+        elif object_name.startswith("schools/"):
+            allowed = current_user.school_id and object_name.startswith(f"schools/{current_user.school_id}/")
+        else:
+            allowed = True
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Cannot access files outside your school")
+    return path
+
+
+@router.get("/local/{object_name:path}", include_in_schema=False)
+async def download_local_file(
+    request: Request,
+    object_name: str,
+    expires: Optional[int] = Query(None),
+    signature: Optional[str] = Query(None),
+    filename: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Serve a locally stored object. Supports Range; zero-copy where the server offers pathsend.
+
+    Presigned URLs carry ``expires`` / ``signature``; public URLs (without
+    them) need an access token instead.
+    """
+    if expires is not None and signature is not None:
+        path = _verified_local_path("GET", object_name, expires, signature)
+    else:
+        path = await _authorized_local_path(request, db, object_name)
+    if not await get_storage().run(os.path.isfile, path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(
+        path,
+        media_type=mimetypes.guess_type(filename or object_name)[0] or "application/octet-stream",
+        filename=filename,
+        content_disposition_type="inline",
+        headers={"Cache-Control": "private, max-age=0"},
+    )
+
+
+@router.put("/local/{object_name:path}", status_code=200, include_in_schema=False)
+async def upload_local_file(
+    request: Request,
+    object_name: str,
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Receive a direct upload for the local engine; the object appears atomically when complete."""
+    path = _verified_local_path("PUT", object_name, expires, signature)
+    storage = get_storage()
+    target = await storage.run(storage.backend.open_atomic, object_name)
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            if target.size + len(buffer) + len(chunk) > settings.UPLOAD_MAX_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_BYTES} bytes",
+                )
+            buffer += chunk
+            if len(buffer) >= COPY_CHUNK:
+                await storage.run(target.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await storage.run(target.write, bytes(buffer))
+        await storage.run(target.commit)
+    except BaseException:
+        await storage.run(target.abort)
+        raise
+
+    logger.info(f"Local direct upload stored: {path} ({target.size} bytes)")
+    return {"object_name": object_name, "size": target.size}
+
+
+router.include_router(upload_router)
@@ -0,0 +1,225 @@
+"""
+Direct-to-storage uploads.
+
+The client asks for presigned URLs, PUTs the bytes straight to object storage
+(one URL for small files, one per part for multipart uploads) and then calls
+complete. Completion verifies the object with ``stat_object`` and only then
+writes the ``FileRecord``, so the API workers never carry the upload body.
+
+Started uploads are kept in Redis under ``upload:pending:<token>`` until they
+are completed, aborted or expire.
+"""
+
+import json
+import logging
+import math
+import secrets
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from minio.error import S3Error
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.storage import MultipartNotSupportedError, get_storage
+from app.features.files.models import FileRecord
+from app.features.files.service_blobs import attach_existing_blob
+from app.features.files.service_previews import enqueue_previews
+from app.features.files.service_quota import check_quota, record_usage
+from app.features.users.models import User
+from app.schemas.file import DirectUploadCompleteRequest, DirectUploadRequest
+
+logger = logging.getLogger(__name__)
+
+# S3 allows at most this many parts per multipart upload
+MAX_PARTS = 10000
+# Extra time the pending record outlives its URLs, so a PUT finishing at the deadline can still complete
+PENDING_GRACE_SECONDS = 300
+
+
+def _pending_key(token: str) -> str:
+    return f"upload:pending:{token}"
+
+
+def resolve_upload_folder(current_user: User, folder: Optional[str]) -> Tuple[Optional[int], str]:
+    """School id and storage folder for an upload; non-super_admin uploads live under schools/{id}/."""
+    target_folder = folder or ""
+    if current_user.role == "super_admin":
+        return None, target_folder
+    if not current_user.school_id:
+        raise HTTPException(status_code=403, detail="User is not assigned to a school")
+    school_id = current_user.school_id
+    return school_id, f"schools/{school_id}/{target_folder}".strip("/")
+
+
+async def start_direct_upload(db: AsyncSession, current_user: User, data: DirectUploadRequest) -> dict:
+    if data.size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_BYTES} bytes",
+        )
+
+    school_id, folder = resolve_upload_folder(current_user, data.folder)
+    await check_quota(db, school_id, data.size)
+    storage = get_storage()
+
+    if settings.STORAGE_DEDUP and data.sha256:
+        # The school already holds this content: register it without an upload
+        record = await attach_existing_blob(
+            db, data.sha256, data.size, data.filename, data.content_type, folder, school_id, current_user.id
+        )
+        if record is not None:
+            await db.commit()
+            await record_usage(school_id, record.object_name, record.size)
+            await enqueue_previews(record)
+            logger.info(f"Direct upload deduplicated: {record.object_name} -> {record.storage_key}")
+            return {
+                "object_name": record.object_name,
+                "method": "PUT",
+                "expires_in": 0,
+                "deduplicated": True,
+                "file": {
+                    "object_name": record.object_name,
+                    "file_url": storage.public_url(record.storage_key),
+                    "bucket": storage.bucket_name,
+                    "size": record.size,
+                    "content_type": record.content_type,
+                    "sha256": record.sha256,
+                    "deduplicated": True,
+                },
+            }
+    object_name = storage.unique_object_name(data.filename, folder)
+    expiry = settings.UPLOAD_PRESIGN_EXPIRY
+
+    result = {
+        "object_name": object_name,
+        "method": "PUT",
+        "expires_in": expiry,
+    }
+    pending = {
+        "object_name": object_name,
+        "filename": data.filename,
+        "size": data.size,
+        "content_type": data.content_type,
+        "school_id": school_id,
+        "user_id": current_user.id,
+        "upload_id": None,
+    }
+
+    if not storage.supports_multipart or data.size <= storage.part_size:
+        result["url"] = await storage.presigned_put_url(object_name, expiry)
+    else:
+        part_size = max(storage.part_size, math.ceil(data.size / MAX_PARTS))
+        part_count = math.ceil(data.size / part_size)
+        upload_id = await storage.create_multipart_upload(object_name, data.content_type)
+        urls = await storage.presigned_part_urls(object_name, upload_id, part_count, expiry)
+        result.update(
+            upload_id=upload_id,
+            part_size=part_size,
+            parts=[{"part_number": i, "url": url} for i, url in enumerate(urls, start=1)],
+        )
+        pending["upload_id"] = upload_id
+
+    token = secrets.token_urlsafe(24)
+    redis = await get_redis()
+    await redis.set(_pending_key(token), json.dumps(pending), ex=expiry + PENDING_GRACE_SECONDS)
+    result["upload_token"] = token
+
+    logger.info(
+        f"Direct upload started: {object_name} ({data.size} bytes, "
+        f"{len(result.get('parts', [])) or 1} part(s), school_id={school_id})"
+    )
+    return result
+
+
+async def _get_pending(current_user: User, token: str) -> dict:
+    redis = await get_redis()
+    raw = await redis.get(_pending_key(token))
+    pending = json.loads(raw) if raw else None
+    if not pending or pending["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return pending
+
+
+async def complete_direct_upload(
+    db: AsyncSession, current_user: User, data: DirectUploadCompleteRequest
+) -> dict:
+    pending = await _get_pending(current_user, data.upload_token)
+    object_name = pending["object_name"]
+    storage = get_storage()
+
+    # A retried completion finds the multipart upload already assembled
+    if pending["upload_id"] and not await storage.exists(object_name):
+        if not data.parts:
+            raise HTTPException(status_code=400, detail="Parts are required to complete a multipart upload")
+        try:
+            await storage.complete_multipart_upload(
+                object_name,
+                pending["upload_id"],
+                [(p.part_number, p.etag) for p in data.parts],
+            )
+        except S3Error as e:
+            raise HTTPException(status_code=400, detail=f"Could not complete upload: {e.message}")
+        except MultipartNotSupportedError as e:
+            # Started on an engine with multipart support before the storage engine was switched
+            raise HTTPException(status_code=400, detail=f"Could not complete upload: {e}")
+
+    try:
+        info = await storage.stat(object_name)
+    except (S3Error, OSError):
+        raise HTTPException(status_code=400, detail="File has not been uploaded")
+
+    if info["size"] != pending["size"]:
+        # Whatever was uploaded is not what was announced (and may exceed the limit): drop it
+        await storage.delete(object_name)
+        await (await get_redis()).delete(_pending_key(data.upload_token))
+        raise HTTPException(
+            status_code=400,
+            detail=f"Uploaded size {info['size']} does not match the announced size {pending['size']}",
+        )
+
+    record = FileRecord(
+        object_name=object_name,
+        original_filename=pending["filename"],
+        size=info["size"],
+        content_type=info.get("content_type") or pending["content_type"],
+        school_id=pending["school_id"],
+        uploaded_by=current_user.id,
+    )
+    db.add(record)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Upload has already been completed")
+
+    await (await get_redis()).delete(_pending_key(data.upload_token))
+    await record_usage(pending["school_id"], object_name, record.size)
+    await enqueue_previews(record)
+    logger.info(f"Direct upload completed and recorded: {object_name} (school_id={pending['school_id']})")
+
+    return {
+        "object_name": object_name,
+        "file_url": storage.public_url(object_name),
+        "bucket": storage.bucket_name,
+        "size": record.size,
+        "content_type": record.content_type,
+    }
+
+
+async def abort_direct_upload(current_user: User, token: str) -> None:
+    pending = await _get_pending(current_user, token)
+    storage = get_storage()
+
+    if pending["upload_id"]:
+        try:
+            await storage.abort_multipart_upload(pending["object_name"], pending["upload_id"])
+        except MultipartNotSupportedError:
+            logger.warning(f"Direct upload {pending['object_name']}: multipart upload left on the previous storage engine")
+    elif await storage.exists(pending["object_name"]):
+        await storage.delete(pending["object_name"])
+
+    await (await get_redis()).delete(_pending_key(token))
+    logger.info(f"Direct upload aborted: {pending['object_name']}")
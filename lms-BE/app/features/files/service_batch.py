@@ -0,0 +1,252 @@
+"""
+Batch uploads: several files in one multipart request.
+
+The request pays authentication, rate limiting and the quota check once.
+Files are streamed to storage ``UPLOAD_BATCH_CONCURRENCY`` at a time, and every
+stored file gets its FileRecord from a single multi-row INSERT. With a
+``course_id``, a notes material per file is created in the same transaction.
+A file that fails (too large, storage error) is reported in its result and
+does not fail the others.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, UTC
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.background import run_with_session
+from app.core.config import settings
+from app.core.school_guard import validate_school_subscription
+from app.core.storage import UploadTooLargeError, get_storage
+from app.features.activity_logs.schemas import ActivityLogCreate
+from app.features.activity_logs.service import log_action
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_notes import Notes
+from app.features.courses.service_materials import invalidate_course_materials
+from app.features.enrollments.models_student import StudentCourse
+from app.features.enrollments.models_teacher import TeacherCourse
+from app.features.files.models import FileRecord
+from app.features.files.service import resolve_upload_folder
+from app.features.files.service_blobs import store_deduplicated_batch
+from app.features.files.service_previews import enqueue_previews
+from app.features.files.service_quota import check_quota, record_usage
+from app.features.notifications.schemas import NotificationCreate
+from app.features.notifications.service import create_notifications_bulk
+from app.features.users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+async def _check_notes_course(db: AsyncSession, current_user: User, course_id: int) -> None:
+    """Notes can only be added by a teacher of the course, in a school with an active subscription."""
+    if current_user.role != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can create notes")
+    await validate_school_subscription(current_user, db)
+    teaches = await db.scalar(
+        select(TeacherCourse.course_id).where(
+            TeacherCourse.teacher_id == current_user.id,
+            TeacherCourse.course_id == course_id,
+            TeacherCourse.school_id == current_user.school_id,
+        )
+    )
+    if teaches is None:
+        raise HTTPException(status_code=403, detail="You are not assigned to this course")
+
+
+def _error(e: BaseException) -> str:
+    if isinstance(e, UploadTooLargeError):
+        return str(e)
+    return f"Failed to upload file: {e}"
+
+
+async def _store(files: List[UploadFile], folder: str, db: AsyncSession) -> list:
+    """Per file: a FileRecord row (without owner columns) or the exception it failed with."""
+    storage = get_storage()
+    concurrency = settings.UPLOAD_BATCH_CONCURRENCY
+    now = datetime.now(UTC)
+
+    if settings.STORAGE_DEDUP:
+        stored = await store_deduplicated_batch(db, files, concurrency)
+        return [
+            s if isinstance(s, BaseException) else {
+                "object_name": storage.unique_object_name(f.filename, folder),
+                "original_filename": f.filename,
+                "size": s["size"],
+                "content_type": f.content_type,
+                "sha256": s["sha256"],
+                "storage_key": s["storage_key"],
+                "created_at": now,
+                "_file_url": storage.public_url(s["storage_key"]),
+                "_deduplicated": s["deduplicated"],
+            }
+            for f, s in zip(files, stored)
+        ]
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def upload(file: UploadFile) -> dict:
+        async with slots:
+            return await storage.upload_file(file, folder=folder)
+
+    stored = await asyncio.gather(*(upload(f) for f in files), return_exceptions=True)
+    return [
+        s if isinstance(s, BaseException) else {
+            "object_name": s["object_name"],
+            "original_filename": f.filename,
+            "size": s["size"],
+            "content_type": s.get("content_type"),
+            "sha256": s.get("sha256"),
+            "created_at": now,
+            "_file_url": s["file_url"],
+            "_deduplicated": False,
+        }
+        for f, s in zip(files, stored)
+    ]
+
+
+async def _announce_notes(db: AsyncSession, teacher_id: int, course_id: int, school_id: int, materials: List[tuple]) -> None:
+    """Activity log per material and one notification per enrolled student for the whole batch."""
+    for material_id, title in materials:
+        await log_action(db, ActivityLogCreate(
+            user_id=teacher_id,
+            course_id=course_id,
+            action="create_notes",
+            entity_type="material",
+            entity_id=material_id,
+            details=f"Created notes: {title}",
+        ), school_id=school_id)
+
+    titles = ", ".join(title for _, title in materials)
+    message = f"New notes available: {titles}" if len(materials) == 1 else f"{len(materials)} new notes available: {titles}"
+    students = (await db.scalars(select(StudentCourse.student_id).where(StudentCourse.course_id == course_id))).all()
+    await create_notifications_bulk(db, [
+        NotificationCreate(user_id=student_id, type="material_uploaded", message=message, entity_id=materials[0][0])
+        for student_id in students
+    ], school_id=school_id)
+
+
+async def upload_batch(
+    db: AsyncSession,
+    current_user: User,
+    files: List[UploadFile],
+    folder: Optional[str] = "",
+    course_id: Optional[int] = None,
+) -> dict:
+    """
+    Store ``files`` and register them; with ``course_id`` also create a notes material per file.
+
+    Returns ``{"uploaded", "failed", "results"}`` with one result per file, in request order.
+
+    Raises:
+        HTTPException: 400 for an empty or oversized batch, 403 if notes cannot
+            be created in the course, 413 if the batch exceeds the school's quota
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.UPLOAD_BATCH_MAX_FILES} files can be uploaded at once",
+        )
+
+    school_id, target_folder = resolve_upload_folder(current_user, folder)
+    if course_id is not None:
+        await _check_notes_course(db, current_user, course_id)
+    await check_quota(db, school_id, sum(f.size or 0 for f in files))
+
+    named = [f for f in files if f.filename]
+    stored = dict(zip(map(id, named), await _store(named, target_folder, db)))
+
+    results = []
+    rows = []
+    for file in files:
+        outcome = stored.get(id(file))
+        if outcome is None:
+            results.append({"filename": file.filename or "", "error": "No filename provided"})
+        elif isinstance(outcome, BaseException):
+            logger.warning(f"Batch upload: {file.filename} failed: {outcome}")
+            results.append({"filename": file.filename, "error": _error(outcome)})
+        else:
+            results.append({"filename": file.filename, "row": outcome})
+            rows.append(outcome)
+
+    storage = get_storage()
+    materials = []
+    if rows:
+        try:
+            records = (await db.scalars(
+                insert(FileRecord).returning(FileRecord, sort_by_parameter_order=True),
+                [
+                    {k: v for k, v in row.items() if not k.startswith("_")}
+                    | {"school_id": school_id, "uploaded_by": current_user.id}
+                    for row in rows
+                ],
+            )).all()
+            if course_id is not None:
+                titles = [os.path.splitext(row["original_filename"])[0] or row["original_filename"] for row in rows]
+                material_ids = (await db.scalars(
+                    insert(LearningMaterial).returning(LearningMaterial.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "course_id": course_id,
+                            "created_by_teacher_id": current_user.id,
+                            "school_id": school_id,
+                            "title": title,
+                            "type": "notes",
+                        }
+                        for title in titles
+                    ],
+                )).all()
+                await db.execute(insert(Notes), [
+                    {"material_id": material_id, "content_url": row["_file_url"]}
+                    for material_id, row in zip(material_ids, rows)
+                ])
+                materials = list(zip(material_ids, titles))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # Deduplicated bytes stay with their blob; the reconciliation job removes them if unreferenced
+            if not settings.STORAGE_DEDUP:
+                await storage.delete_many(row["object_name"] for row in rows)
+            raise
+
+        # All files share one folder, so one counter update covers the batch
+        await record_usage(school_id, rows[0]["object_name"], sum(row["size"] for row in rows), files=len(rows))
+        for record in records:
+            await enqueue_previews(record)
+        if materials:
+            await invalidate_course_materials(course_id, school_id)
+            run_with_session(_announce_notes, current_user.id, course_id, school_id, materials)
+        logger.info(f"Batch upload: {len(rows)} of {len(files)} files stored in {target_folder or '/'} (school_id={school_id})")
+
+    material_by_row = {id(row): material_id for row, (material_id, _) in zip(rows, materials)}
+    response = []
+    for result in results:
+        row = result.pop("row", None)
+        if row is None:
+            response.append({**result, "uploaded": False})
+            continue
+        response.append({
+            "filename": result["filename"],
+            "uploaded": True,
+            "file": {
+                "object_name": row["object_name"],
+                "file_url": row["_file_url"],
+                "bucket": storage.bucket_name,
+                "size": row["size"],
+                "content_type": row["content_type"],
+                "sha256": row["sha256"],
+                "deduplicated": row["_deduplicated"],
+            },
+            "material_id": material_by_row.get(id(row)),
+        })
+    return {
+        "uploaded": len(rows),
+        "failed": len(files) - len(rows),
+        "results": response,
+    }
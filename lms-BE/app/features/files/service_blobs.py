@@ -0,0 +1,348 @@
+"""
+Content-addressed file storage (``STORAGE_DEDUP``).
+
+Uploads are hashed (SHA-256) from the locally spooled body before anything is
+sent to storage. The bytes live once under ``blobs/<aa>/<sha256>``. Every
+``FileRecord`` keeps its own logical ``object_name`` (what clients and
+submissions refer to) and points at the blob via ``storage_key``.
+``file_blobs.ref_count`` counts those records; an upload whose blob already
+exists only bumps the count and transfers nothing.
+
+Blobs are never deleted inline. When the last record goes, the blob is marked
+``released_at`` and ``collect_unreferenced_blobs`` removes it after a grace
+period. Uploads lock the blob row (``FOR UPDATE``) and the collector skips
+locked rows, so a blob cannot be collected while an upload is attaching to it.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi import UploadFile
+from sqlalchemy import case, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.preview_render import preview_keys
+from app.core.storage import UploadTooLargeError, get_storage
+from app.features.files.models import FileBlob, FileRecord
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = "blobs"
+GC_BATCH_SIZE = 100
+
+
+def blob_key(sha256: str) -> str:
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}"
+
+
+async def _attach_blob(db: AsyncSession, sha256: str, size: int, content_type: Optional[str]) -> str:
+    """Add one reference to the blob for ``sha256`` (creating its row if needed); returns its key."""
+    key = blob_key(sha256)
+    stmt = pg_insert(FileBlob).values(
+        sha256=sha256, storage_key=key, size=size, content_type=content_type,
+        ref_count=1, created_at=datetime.now(UTC),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FileBlob.sha256],
+        set_={"ref_count": FileBlob.ref_count + 1, "released_at": None},
+    )
+    await db.execute(stmt)
+    return key
+
+
+async def store_deduplicated(
+    db: AsyncSession,
+    file: UploadFile,
+    folder: str,
+    school_id: Optional[int],
+    uploaded_by: int,
+) -> Tuple[FileRecord, dict]:
+    """
+    Store an upload content-addressed and add its FileRecord to the session (not committed).
+
+    Returns the record and a FileUploadResponse-shaped dict whose
+    ``deduplicated`` flag says whether the bytes were already stored.
+    """
+    storage = get_storage()
+    limit = settings.UPLOAD_MAX_BYTES
+    if file.size is not None and file.size > limit:
+        raise UploadTooLargeError(limit)
+
+    sha256, size = await storage.hash_file(file, limit)
+    key = blob_key(sha256)
+
+    # Lock the row so the collector cannot remove the blob while we attach to it
+    existing = await db.scalar(select(FileBlob.sha256).where(FileBlob.sha256 == sha256).with_for_update())
+    deduplicated = existing is not None
+    if not deduplicated:
+        # Concurrent uploads of the same new content write identical bytes to the same key
+        result = await storage.upload_file(file, max_bytes=limit, object_name=key)
+        if result["sha256"] != sha256:
+            await storage.delete(key)
+            raise ValueError("Upload changed while it was being stored")
+
+    await _attach_blob(db, sha256, size, file.content_type)
+
+    object_name = storage.unique_object_name(file.filename, folder)
+    record = FileRecord(
+        object_name=object_name,
+        original_filename=file.filename,
+        size=size,
+        content_type=file.content_type,
+        sha256=sha256,
+        storage_key=key,
+        school_id=school_id,
+        uploaded_by=uploaded_by,
+    )
+    db.add(record)
+
+    logger.info(f"Stored {object_name} as blob {sha256[:12]} ({'deduplicated' if deduplicated else 'new'}, {size} bytes)")
+
+    return record, {
+        "object_name": object_name,
+        "file_url": storage.public_url(key),
+        "bucket": storage.bucket_name,
+        "size": size,
+        "content_type": file.content_type,
+        "sha256": sha256,
+        "deduplicated": deduplicated,
+    }
+
+
+async def store_deduplicated_batch(db: AsyncSession, files: List[UploadFile], concurrency: int) -> List[Union[dict, Exception]]:
+    """
+    Store several uploads content-addressed, ``concurrency`` hashes / transfers at a time.
+
+    Content already stored (or repeated within the batch) is transferred once;
+    the blob rows are locked with one query and their references added with
+    one upsert. Nothing is committed and no FileRecord is created.
+
+    Returns, per file, ``{"sha256", "size", "storage_key", "deduplicated"}``
+    or the exception that file failed with.
+    """
+    storage = get_storage()
+    limit = settings.UPLOAD_MAX_BYTES
+    slots = asyncio.Semaphore(concurrency)
+
+    async def bounded(fn, *args, **kwargs):
+        async with slots:
+            return await fn(*args, **kwargs)
+
+    async def put(sha256: str, file: UploadFile) -> None:
+        result = await storage.upload_file(file, max_bytes=limit, object_name=blob_key(sha256))
+        if result["sha256"] != sha256:
+            await storage.delete(blob_key(sha256))
+            raise ValueError("Upload changed while it was being stored")
+
+    hashed = await asyncio.gather(*(bounded(storage.hash_file, f, limit) for f in files), return_exceptions=True)
+    digests = {h[0] for h in hashed if not isinstance(h, BaseException)}
+    # Lock the rows so the collector cannot remove these blobs while we attach to them
+    existing = set((await db.scalars(
+        select(FileBlob.sha256).where(FileBlob.sha256.in_(digests)).with_for_update()
+    )).all()) if digests else set()
+
+    new: Dict[str, UploadFile] = {}
+    for file, h in zip(files, hashed):
+        if not isinstance(h, BaseException) and h[0] not in existing:
+            new.setdefault(h[0], file)
+    uploads = await asyncio.gather(*(bounded(put, sha, f) for sha, f in new.items()), return_exceptions=True)
+    failed = {sha: e for sha, e in zip(new, uploads) if isinstance(e, BaseException)}
+
+    results: List[Union[dict, Exception]] = []
+    refs: Counter = Counter()
+    blobs: Dict[str, dict] = {}
+    for file, h in zip(files, hashed):
+        if isinstance(h, BaseException) or h[0] in failed:
+            results.append(h if isinstance(h, BaseException) else failed[h[0]])
+            continue
+        sha256, size = h
+        refs[sha256] += 1
+        blobs.setdefault(sha256, {
+            "sha256": sha256, "storage_key": blob_key(sha256), "size": size,
+            "content_type": file.content_type, "created_at": datetime.now(UTC),
+        })
+        results.append({
+            "sha256": sha256,
+            "size": size,
+            "storage_key": blob_key(sha256),
+            "deduplicated": sha256 in existing or new.get(sha256) is not file,
+        })
+
+    if refs:
+        stmt = pg_insert(FileBlob).values([{**blob, "ref_count": refs[sha]} for sha, blob in blobs.items()])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FileBlob.sha256],
+            set_={"ref_count": FileBlob.ref_count + stmt.excluded.ref_count, "released_at": None},
+        )
+        await db.execute(stmt)
+    return results
+
+
+async def attach_existing_blob(
+    db: AsyncSession,
+    sha256: str,
+    size: int,
+    filename: str,
+    content_type: Optional[str],
+    folder: str,
+    school_id: Optional[int],
+    uploaded_by: int,
+) -> Optional[FileRecord]:
+    """
+    Create a FileRecord for content the caller only *claims* to have (direct uploads).
+
+    Only blobs already referenced within the same school qualify, so knowing a
+    hash never grants access to another school's file. Returns None when there
+    is nothing to reuse; the record is added to the session, not committed.
+    """
+    scope = FileRecord.school_id.is_(None) if school_id is None else FileRecord.school_id == school_id
+    key = await db.scalar(
+        select(FileRecord.storage_key)
+        .where(FileRecord.sha256 == sha256, FileRecord.size == size, FileRecord.storage_key.isnot(None), scope)
+        .limit(1)
+    )
+    if key is None:
+        return None
+    blob = await db.scalar(select(FileBlob).where(FileBlob.storage_key == key).with_for_update())
+    if blob is None:
+        return None
+    blob.ref_count += 1
+    blob.released_at = None
+
+    record = FileRecord(
+        object_name=get_storage().unique_object_name(filename, folder),
+        original_filename=filename,
+        size=size,
+        content_type=content_type or blob.content_type,
+        sha256=sha256,
+        storage_key=key,
+        school_id=school_id,
+        uploaded_by=uploaded_by,
+    )
+    db.add(record)
+    return record
+
+
+async def release_blob(db: AsyncSession, storage_key: str) -> None:
+    """Drop one reference (the caller deletes the FileRecord in the same transaction)."""
+    await db.execute(
+        update(FileBlob)
+        .where(FileBlob.storage_key == storage_key)
+        .values(
+            ref_count=func.greatest(FileBlob.ref_count - 1, 0),
+            released_at=case((FileBlob.ref_count <= 1, func.now()), else_=FileBlob.released_at),
+        )
+    )
+
+
+async def resolve_storage_keys(db: AsyncSession, object_names: Iterable[str]) -> Dict[str, str]:
+    """Map logical object names to the keys actually holding their bytes (identity when not deduplicated)."""
+    names = list(dict.fromkeys(n for n in object_names if n))
+    if not names:
+        return {}
+    keys = {name: name for name in names}
+    rows = await db.execute(
+        select(FileRecord.object_name, FileRecord.storage_key)
+        .where(FileRecord.object_name.in_(names), FileRecord.storage_key.isnot(None))
+    )
+    for object_name, storage_key in rows:
+        keys[object_name] = storage_key
+    return keys
+
+
+async def presigned_urls_for(
+    db: AsyncSession, object_names: Iterable[str], expiry: Optional[int] = None
+) -> Dict[str, str]:
+    """Presigned GET URLs keyed by logical object name, following blob indirection."""
+    names = list(dict.fromkeys(n for n in object_names if n))
+    if not names:
+        return {}
+    rows = (await db.execute(
+        select(FileRecord.object_name, FileRecord.storage_key, FileRecord.original_filename)
+        .where(FileRecord.object_name.in_(names), FileRecord.storage_key.isnot(None))
+    )).all()
+    keys = {name: name for name in names}
+    # Blob keys are hashes: give the browser the original name instead
+    filenames = {}
+    for object_name, storage_key, original_filename in rows:
+        keys[object_name] = storage_key
+        filenames[storage_key] = original_filename
+
+    by_key = await get_storage().presigned_get_urls(keys.values(), expiry=expiry, filenames=filenames)
+    return {name: by_key[key] for name, key in keys.items() if key in by_key}
+
+
+async def presigned_url_for(db: AsyncSession, object_name: str, expiry: Optional[int] = None) -> Optional[str]:
+    return (await presigned_urls_for(db, [object_name], expiry)).get(object_name)
+
+
+async def collect_unreferenced_blobs() -> None:
+    """
+    Background job: reconcile blob reference counts, then delete blobs that
+    have had no references for ``BLOB_GC_GRACE_SECONDS``.
+
+    Reconciliation catches records removed without ``release_blob`` (e.g. by
+    ON DELETE CASCADE when a school or user is deleted).
+    """
+    storage = get_storage()
+    async with AsyncSessionLocal() as db:
+        try:
+            actual = (
+                select(func.count(FileRecord.id))
+                .where(FileRecord.storage_key == FileBlob.storage_key)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(FileBlob)
+                .where(FileBlob.ref_count != actual)
+                .values(
+                    ref_count=actual,
+                    released_at=case((actual == 0, func.now()), else_=None),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount:
+                logger.info(f"Blob GC: corrected {result.rowcount} reference counts")
+
+            cutoff = datetime.now(UTC) - timedelta(seconds=settings.BLOB_GC_GRACE_SECONDS)
+            removed = 0
+            while True:
+                blobs = (await db.scalars(
+                    select(FileBlob)
+                    .where(
+                        FileBlob.ref_count == 0,
+                        FileBlob.released_at < cutoff,
+                        ~exists().where(FileRecord.storage_key == FileBlob.storage_key),
+                    )
+                    .limit(GC_BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
+                )).all()
+                if not blobs:
+                    break
+                # Objects go first, while the rows are still locked; a failed
+                # delete leaves the row for the next run
+                batch_removed = 0
+                for blob in blobs:
+                    try:
+                        await storage.delete(blob.storage_key)
+                        await storage.delete_many(preview_keys(blob.storage_key))
+                    except Exception as e:
+                        logger.warning(f"Blob GC: could not delete {blob.storage_key}: {e}")
+                        continue
+                    await db.delete(blob)
+                    batch_removed += 1
+                await db.commit()
+                removed += batch_removed
+                if len(blobs) < GC_BATCH_SIZE or not batch_removed:
+                    break
+
+            logger.info(f"Blob GC: removed {removed} unreferenced blobs")
+        except Exception as e:
+            logger.error(f"Error collecting unreferenced blobs: {e}")
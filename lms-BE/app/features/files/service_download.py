@@ -0,0 +1,151 @@
+"""
+Download proxy: serve a file's bytes through the API instead of a presigned URL.
+
+For deployments where the bucket is not reachable by clients, or where a
+reverse proxy should cache downloads (presigned URLs change on every request).
+Objects up to ``DOWNLOAD_CACHE_MAX_OBJECT_BYTES`` go through the local disk
+cache and are sent with ``FileResponse`` (Range, If-Range and zero-copy
+``pathsend`` where the server supports it). Larger objects are streamed from
+storage, forwarding a single byte range as a ranged GET.
+"""
+
+import logging
+import re
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from minio.error import S3Error
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.download_cache import get_download_cache
+from app.core.storage import content_disposition, get_storage
+from app.features.files.models import FileRecord
+from app.features.users.models import User
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK = 256 * 1024
+# Content never changes per id, but access is per user: only the browser may keep it
+CACHE_CONTROL = "private, max-age=86400"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive ``(start, end)`` of a single-range ``Range`` header, or None to send the whole file.
+
+    Multi-range and malformed headers are ignored (allowed by RFC 9110).
+
+    Raises:
+        ValueError: If the range cannot be satisfied (answer 416)
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range not satisfiable for {size} bytes: {header}")
+    return start, end
+
+
+async def get_downloadable_record(db: AsyncSession, current_user: User, file_id: int) -> FileRecord:
+    record = await db.get(FileRecord, file_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="File not found")
+    if current_user.role != "super_admin":
+        if not current_user.school_id:
+            raise HTTPException(status_code=403, detail="User is not assigned to a school")
+        if record.school_id != current_user.school_id:
+            raise HTTPException(status_code=403, detail="Cannot access files outside your school")
+    return record
+
+
+class _PinnedFileResponse(FileResponse):
+    """Sends a cached file and unpins it afterwards, even if the client disconnects mid-transfer."""
+
+    def __init__(self, *args, unpin, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._unpin = unpin
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._unpin()
+
+
+def _etag(record: FileRecord) -> str:
+    return f'"{record.sha256}"' if record.sha256 else f'"{record.id:x}-{record.size:x}"'
+
+
+async def download_response(request: Request, record: FileRecord) -> Response:
+    storage_key = record.storage_key or record.object_name
+    media_type = record.content_type or "application/octet-stream"
+    headers = {
+        "ETag": _etag(record),
+        "Cache-Control": CACHE_CONTROL,
+        "Content-Disposition": content_disposition(record.original_filename),
+    }
+
+    cache = get_download_cache()
+    if cache.enabled_for(record.size):
+        try:
+            path, stat = await cache.acquire(storage_key)
+        except (S3Error, OSError) as e:
+            logger.warning(f"Download of {record.object_name} failed: {e}")
+            raise HTTPException(status_code=404, detail="File not found")
+        # FileResponse handles Range / If-Range itself
+        return _PinnedFileResponse(
+            path,
+            stat_result=stat,
+            media_type=media_type,
+            headers=headers,
+            unpin=lambda: cache.release(path),
+        )
+
+    # Too large to cache: stream from storage, forwarding the range
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == headers["ETag"]:
+        try:
+            byte_range = parse_range(request.headers.get("range"), record.size)
+        except ValueError:
+            # Returned directly: the error handler would drop Content-Range
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{record.size}"})
+
+    headers["Accept-Ranges"] = "bytes"
+    if byte_range is None:
+        offset, length, status_code = 0, record.size, 200
+    else:
+        start, end = byte_range
+        offset, length, status_code = start, end - start + 1, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{record.size}"
+    headers["Content-Length"] = str(length)
+
+    chunks = get_storage().iter_file_chunks(storage_key, chunk_size=STREAM_CHUNK, offset=offset, length=length)
+    try:
+        # Fail with a proper status before any header is sent
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except (S3Error, OSError) as e:
+        await chunks.aclose()
+        logger.warning(f"Download of {record.object_name} failed: {e}")
+        raise HTTPException(status_code=404, detail="File not found")
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,332 @@
+"""
+Background thumbnails and previews for uploaded images and PDFs.
+
+Uploads only push the new FileRecord's id onto a Redis list
+(``enqueue_previews``); a worker started with the application consumes it:
+
+- Jobs move atomically from ``previews:queue`` to ``previews:processing``
+  (``BLMOVE``) and are removed from there only once handled, so a job in
+  flight when a process dies is put back on the queue at the next start.
+- Failures are retried with exponential backoff through the
+  ``previews:delayed`` sorted set, up to ``PREVIEW_MAX_ATTEMPTS``; files that
+  cannot be previewed (type, size, damaged content) are not retried.
+- Rendering runs in a process pool of ``PREVIEW_PROCESSES`` workers, which
+  also bounds how many jobs a process handles at once.
+
+Jobs are idempotent: a ready record is skipped and rendered objects that
+already exist (deduplicated content shares its previews) are reused, so a job
+delivered twice costs at most one extra render. Previews are stored next to
+the source object (``<key>.thumb.jpg`` / ``<key>.preview.jpg``) and the record
+gets ``preview_status`` ready, unsupported or failed. ``enqueue_missing_previews``
+periodically queues records that never got a status (Redis was unavailable,
+files uploaded before previews existed).
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Iterable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import course_tag, invalidate_tags, school_tag
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.preview_render import PDF_TYPES, UnsupportedPreview, is_previewable, preview_keys, render_previews
+from app.core.redis_client import get_redis
+from app.core.storage import get_storage
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_notes import Notes
+from app.features.files.models import FileRecord
+from app.features.files.service_reconcile import object_name_from_url
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "previews:queue"
+PROCESSING_KEY = "previews:processing"
+DELAYED_KEY = "previews:delayed"
+
+STATUS_READY = "ready"
+STATUS_UNSUPPORTED = "unsupported"
+STATUS_FAILED = "failed"
+
+FETCH_CHUNK = 1024 * 1024
+# Seconds BLMOVE waits for a job before the loop checks for due retries again
+POLL_SECONDS = 5
+SWEEP_BATCH = 500
+# Records younger than this may still have their first job queued
+SWEEP_MIN_AGE = timedelta(hours=1)
+
+# Moves due retries back onto the queue; atomic, so two workers cannot both take one
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+_pool: Optional[ProcessPoolExecutor] = None
+_consumer: Optional[asyncio.Task] = None
+_jobs: set[asyncio.Task] = set()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned (not forked) from a threaded server; workers are recycled to cap decoder memory
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PREVIEW_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=100,
+        )
+    return _pool
+
+
+def _job(file_id: int, attempt: int = 0) -> str:
+    return json.dumps({"file_id": file_id, "attempt": attempt})
+
+
+async def enqueue_previews(record: FileRecord) -> None:
+    """Queue preview generation for a committed FileRecord (no-op for types without previews)."""
+    if not settings.PREVIEWS_ENABLED or not is_previewable(record.content_type):
+        return
+    try:
+        await (await get_redis()).lpush(QUEUE_KEY, _job(record.id))
+    except RedisError as e:
+        # Picked up later by enqueue_missing_previews
+        logger.warning(f"Could not queue previews for file {record.id}: {e}")
+
+
+async def _download(source_key: str, path: str) -> None:
+    storage = get_storage()
+    target = await storage.run(open, path, "wb")
+    try:
+        async for chunk in storage.iter_file_chunks(source_key, chunk_size=FETCH_CHUNK):
+            await storage.run(target.write, chunk)
+    finally:
+        await storage.run(target.close)
+
+
+def _upload(backend, path: str, object_name: str) -> None:
+    with open(path, "rb") as f:
+        backend.upload_stream(f, os.path.basename(object_name), content_type="image/jpeg", object_name=object_name)
+
+
+async def _render_and_store(source_key: str, content_type: str, thumbnail_key: str, preview_key: str) -> None:
+    storage = get_storage()
+    with tempfile.TemporaryDirectory(prefix="preview-") as tmp:
+        source = os.path.join(tmp, "source")
+        await _download(source_key, source)
+        loop = asyncio.get_running_loop()
+        outputs = await loop.run_in_executor(
+            _get_pool(),
+            render_previews,
+            source,
+            content_type,
+            tmp,
+            settings.PREVIEW_THUMBNAIL_PX,
+            settings.PREVIEW_PX,
+            settings.PREVIEW_TIMEOUT_SECONDS,
+        )
+        # Thumbnail last: its presence marks a complete render
+        await storage.run(_upload, storage.backend, outputs["preview"], preview_key)
+        await storage.run(_upload, storage.backend, outputs["thumbnail"], thumbnail_key)
+
+
+async def _set_status(file_id: int, status: str, thumbnail_key: Optional[str] = None, preview_key: Optional[str] = None) -> None:
+    # An UPDATE rather than an ORM flush: the record may have been deleted meanwhile
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(FileRecord)
+            .where(FileRecord.id == file_id)
+            .values(preview_status=status, thumbnail_key=thumbnail_key, preview_key=preview_key)
+        )
+        await db.commit()
+
+
+async def _invalidate_listings(object_name: str, storage_key: Optional[str]) -> None:
+    """Drop cached material listings that link to the file, so they pick up the new URLs."""
+    storage = get_storage()
+    # Deduplicated uploads hand out the URL of their blob
+    urls = [storage.public_url(key) for key in (object_name, storage_key) if key]
+    async with AsyncSessionLocal() as db:
+        courses = (await db.execute(
+            select(LearningMaterial.course_id, LearningMaterial.school_id)
+            .join(Notes, Notes.material_id == LearningMaterial.id)
+            .where(Notes.content_url.in_(urls))
+            .distinct()
+        )).all()
+    for course_id, school_id in courses:
+        await invalidate_tags(course_tag(course_id), school_tag(school_id))
+
+
+async def generate_previews(file_id: int) -> Optional[str]:
+    """
+    Render and store the previews of one FileRecord. Safe to repeat.
+
+    Returns the record's preview status, or None if the record no longer exists.
+
+    Raises:
+        Exception: Anything transient (storage, process pool); the job is retried
+    """
+    async with AsyncSessionLocal() as db:
+        record = await db.get(FileRecord, file_id)
+    if record is None:
+        return None
+    if record.preview_status in (STATUS_READY, STATUS_UNSUPPORTED):
+        return record.preview_status
+
+    if not is_previewable(record.content_type) or record.size > settings.PREVIEW_MAX_SOURCE_BYTES:
+        await _set_status(file_id, STATUS_UNSUPPORTED)
+        return STATUS_UNSUPPORTED
+
+    source_key = record.storage_key or record.object_name
+    thumbnail_key, preview_key = preview_keys(source_key)
+    storage = get_storage()
+    try:
+        if not await storage.exists(thumbnail_key):
+            await _render_and_store(source_key, record.content_type, thumbnail_key, preview_key)
+    except UnsupportedPreview as e:
+        logger.info(f"No preview for {record.object_name}: {e}")
+        await _set_status(file_id, STATUS_UNSUPPORTED)
+        return STATUS_UNSUPPORTED
+
+    await _set_status(file_id, STATUS_READY, thumbnail_key, preview_key)
+    await _invalidate_listings(record.object_name, record.storage_key)
+    logger.info(f"Previews ready for {record.object_name}")
+    return STATUS_READY
+
+
+async def _handle(raw: str) -> None:
+    global _pool
+    job = json.loads(raw)
+    try:
+        await generate_previews(job["file_id"])
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died (e.g. killed for memory); start a fresh pool for the retry
+            _pool = None
+        attempt = job["attempt"] + 1
+        redis = await get_redis()
+        if attempt < settings.PREVIEW_MAX_ATTEMPTS:
+            delay = settings.PREVIEW_RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Preview job for file {job['file_id']} failed (attempt {attempt}), retrying in {delay}s: {e}")
+            await redis.zadd(DELAYED_KEY, {_job(job["file_id"], attempt): time.time() + delay})
+        else:
+            logger.error(f"Preview job for file {job['file_id']} failed after {attempt} attempts: {e}")
+            await _set_status(job["file_id"], STATUS_FAILED)
+    await (await get_redis()).lrem(PROCESSING_KEY, 1, raw)
+
+
+async def _run_job(raw: str, slots: asyncio.Semaphore) -> None:
+    try:
+        await _handle(raw)
+    except Exception as e:
+        # Left on the processing list; requeued at the next start
+        logger.error(f"Preview job {raw} could not be completed: {e}")
+    finally:
+        slots.release()
+
+
+async def _consume() -> None:
+    redis = await get_redis()
+    # Jobs a previous run was processing when it stopped
+    requeued = 0
+    while await redis.lmove(PROCESSING_KEY, QUEUE_KEY, "RIGHT", "RIGHT"):
+        requeued += 1
+    if requeued:
+        logger.info(f"Preview worker: requeued {requeued} interrupted jobs")
+
+    slots = asyncio.Semaphore(settings.PREVIEW_PROCESSES)
+    while True:
+        await slots.acquire()
+        try:
+            await redis.eval(_PROMOTE_SCRIPT, 2, DELAYED_KEY, QUEUE_KEY, time.time(), 100)
+            raw = await redis.blmove(QUEUE_KEY, PROCESSING_KEY, POLL_SECONDS, "RIGHT", "LEFT")
+        except RedisError as e:
+            slots.release()
+            logger.warning(f"Preview worker: queue unavailable: {e}")
+            await asyncio.sleep(POLL_SECONDS)
+            continue
+        if raw is None:
+            slots.release()
+            continue
+        task = asyncio.create_task(_run_job(raw, slots))
+        _jobs.add(task)
+        task.add_done_callback(_jobs.discard)
+
+
+def start_preview_worker() -> None:
+    global _consumer
+    if settings.PREVIEWS_ENABLED and _consumer is None:
+        _consumer = asyncio.create_task(_consume())
+        logger.info(f"Preview worker started ({settings.PREVIEW_PROCESSES} processes)")
+
+
+async def stop_preview_worker(timeout: float = 10.0) -> None:
+    """Stop taking jobs and wait (bounded) for the running ones; the rest are requeued at the next start."""
+    global _consumer, _pool
+    if _consumer is not None:
+        _consumer.cancel()
+        _consumer = None
+    if _jobs:
+        await asyncio.wait(list(_jobs), timeout=timeout)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def enqueue_missing_previews() -> None:
+    """Background job: queue previewable records that have no preview status yet."""
+    if not settings.PREVIEWS_ENABLED:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            ids = (await db.scalars(
+                select(FileRecord.id)
+                .where(
+                    FileRecord.preview_status.is_(None),
+                    or_(FileRecord.content_type.startswith("image/"), FileRecord.content_type.in_(PDF_TYPES)),
+                    FileRecord.created_at < datetime.now(UTC) - SWEEP_MIN_AGE,
+                )
+                .order_by(FileRecord.id)
+                .limit(SWEEP_BATCH)
+            )).all()
+        if ids:
+            await (await get_redis()).lpush(QUEUE_KEY, *(_job(file_id) for file_id in ids))
+            logger.info(f"Preview sweep: queued {len(ids)} files")
+    except Exception as e:
+        logger.error(f"Error queueing missing previews: {e}")
+
+
+async def preview_urls_for(db: AsyncSession, urls: Iterable[Optional[str]]) -> Dict[str, dict]:
+    """``{url: {"thumbnail_url", "preview_url"}}`` for stored file URLs whose previews are ready."""
+    by_key = {key: url for url in urls if (key := object_name_from_url(url))}
+    if not by_key:
+        return {}
+    keys = list(by_key)
+    # A URL names either the record's own object or, for deduplicated uploads, its blob
+    rows = await db.execute(
+        select(FileRecord.object_name, FileRecord.storage_key, FileRecord.thumbnail_key, FileRecord.preview_key)
+        .where(
+            or_(FileRecord.object_name.in_(keys), FileRecord.storage_key.in_(keys)),
+            FileRecord.preview_status == STATUS_READY,
+        )
+    )
+    storage = get_storage()
+    urls = {}
+    for name, storage_key, thumbnail, preview in rows:
+        url = by_key.get(name) or by_key[storage_key]
+        urls[url] = {"thumbnail_url": storage.public_url(thumbnail), "preview_url": storage.public_url(preview)}
+    return urls
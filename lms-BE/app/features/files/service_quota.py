@@ -0,0 +1,292 @@
+"""
+Per-school storage quotas and usage counters.
+
+Usage is kept per school and folder in a Redis hash
+``storage:usage:<school_id>`` (fields ``bytes:<folder>`` / ``files:<folder>``)
+and updated with ``HINCRBY`` whenever a FileRecord is committed or deleted, so
+checking a quota or reporting usage never sums ``file_records``. A hash is
+seeded from ``school_storage_usage`` the first time it is needed.
+
+Two jobs keep Postgres in step: ``flush_storage_usage`` copies the counters
+into ``school_storage_usage`` every few minutes, and ``recount_storage_usage``
+recomputes everything from ``file_records`` once a day to correct drift
+(uploads racing a seed or a recount, records removed by cascades).
+
+Quotas are checked before the upload body is read (``QuotaCheckedRoute``,
+using ``Content-Length``) and again once its real size is known. Concurrent
+uploads can each pass the check, so a school may overshoot by what is in
+flight at that moment.
+"""
+
+import logging
+from datetime import datetime, UTC
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from redis.exceptions import RedisError
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis
+from app.features.auth.jwt import decode_access_token
+from app.features.files.models import FileRecord, SchoolStorageUsage
+from app.features.schools.models import School
+
+logger = logging.getLogger(__name__)
+
+SEEDED_FIELD = "_seeded"
+
+# Adds the seed to whatever increments already landed, but only once per hash
+_SEED_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], '1') == 1 then
+    for i = 2, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+end
+return 0
+"""
+
+
+def _usage_key(school_id: int) -> str:
+    return f"storage:usage:{school_id}"
+
+
+def usage_folder(object_name: str, school_id: int) -> str:
+    """Folder of an object below ``schools/<id>/`` ('' for the school root)."""
+    rest = object_name.removeprefix(f"schools/{school_id}/")
+    return rest.rsplit("/", 1)[0] if "/" in rest else ""
+
+
+def _folder_sql():
+    """``usage_folder`` as a SQL expression over ``FileRecord.object_name``."""
+    return func.coalesce(func.substring(FileRecord.object_name, r"^schools/[0-9]+/(.*)/[^/]*$"), "")
+
+
+def _parse_usage(fields: Dict[str, str]) -> dict:
+    folders: Dict[str, dict] = {}
+    for field, value in fields.items():
+        kind, _, folder = field.partition(":")
+        if kind in ("bytes", "files"):
+            folders.setdefault(folder, {"bytes": 0, "files": 0})[kind] = int(value)
+    return {
+        "bytes": sum(f["bytes"] for f in folders.values()),
+        "files": sum(f["files"] for f in folders.values()),
+        "folders": {name: f for name, f in sorted(folders.items()) if f["files"] or f["bytes"]},
+    }
+
+
+async def _usage_rows(db: AsyncSession, school_ids: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """Persisted counters as Redis-style fields, per school."""
+    rows = await db.execute(select(SchoolStorageUsage).where(SchoolStorageUsage.school_id.in_(list(school_ids))))
+    fields: Dict[int, Dict[str, str]] = {}
+    for row in rows.scalars():
+        school = fields.setdefault(row.school_id, {})
+        school[f"bytes:{row.folder}"] = str(row.bytes)
+        school[f"files:{row.folder}"] = str(row.files)
+    return fields
+
+
+async def _ensure_seeded(redis, db: AsyncSession, school_id: int) -> None:
+    key = _usage_key(school_id)
+    if await redis.hexists(key, SEEDED_FIELD):
+        return
+    fields = (await _usage_rows(db, [school_id])).get(school_id, {})
+    args = [SEEDED_FIELD]
+    for field, value in fields.items():
+        args += [field, value]
+    await redis.eval(_SEED_SCRIPT, 1, key, *args)
+
+
+async def get_school_usage(db: AsyncSession, school_id: int) -> dict:
+    """``{"bytes", "files", "folders": {folder: {"bytes", "files"}}}`` for one school."""
+    try:
+        redis = await get_redis()
+        await _ensure_seeded(redis, db, school_id)
+        return _parse_usage(await redis.hgetall(_usage_key(school_id)))
+    except RedisError as e:
+        logger.warning(f"Usage counters unavailable for school {school_id}: {e}")
+    return _parse_usage((await _usage_rows(db, [school_id])).get(school_id, {}))
+
+
+async def record_usage(school_id: Optional[int], object_name: str, size: int, files: int = 1) -> None:
+    """
+    Count a committed upload (or, with negative ``size`` / ``files``, a deletion).
+
+    Call after the FileRecord change is committed. Super admin uploads
+    (``school_id`` None) are not counted.
+    """
+    if not school_id:
+        return
+    folder = usage_folder(object_name, school_id)
+    key = _usage_key(school_id)
+    try:
+        redis = await get_redis()
+        if not await redis.hexists(key, SEEDED_FIELD):
+            async with AsyncSessionLocal() as db:
+                await _ensure_seeded(redis, db, school_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, f"bytes:{folder}", size)
+            pipe.hincrby(key, f"files:{folder}", files)
+            await pipe.execute()
+    except RedisError as e:
+        # The daily recount restores the lost increment
+        logger.warning(f"Could not update usage counters for school {school_id}: {e}")
+
+
+async def get_school_quota(db: AsyncSession, school_id: int) -> Optional[int]:
+    """Quota in bytes, or None when unlimited."""
+    quota = await db.scalar(select(School.storage_quota_bytes).where(School.id == school_id))
+    if quota is None:
+        quota = settings.STORAGE_QUOTA_DEFAULT_BYTES
+    return quota or None
+
+
+async def check_quota(db: AsyncSession, school_id: Optional[int], incoming: int) -> None:
+    """
+    Raises:
+        HTTPException: 413 if ``incoming`` more bytes would exceed the school's quota
+    """
+    if not school_id:
+        return
+    quota = await get_school_quota(db, school_id)
+    if quota is None:
+        return
+    used = (await get_school_usage(db, school_id))["bytes"]
+    if used + incoming > quota:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Storage quota exceeded: {used} of {quota} bytes used, upload needs {incoming}",
+        )
+
+
+class QuotaCheckedRoute(APIRoute):
+    """
+    Route that checks the uploader's school quota against ``Content-Length``
+    before FastAPI reads (and spools) the request body.
+
+    The school comes from the access token; requests without a valid token or
+    a length are passed through, and the endpoint itself authenticates and
+    re-checks with the real size.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def quota_checked_handler(request: Request) -> Response:
+            await _check_request_quota(request)
+            return await handler(request)
+
+        return quota_checked_handler
+
+
+async def _check_request_quota(request: Request) -> None:
+    length = request.headers.get("content-length")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if not length or not length.isdigit() or scheme.lower() != "bearer":
+        return
+    payload = decode_access_token(token)
+    if not payload or payload.get("role") == "super_admin" or not payload.get("school_id"):
+        return
+    async with AsyncSessionLocal() as db:
+        # Content-Length includes the multipart framing, so this slightly overestimates
+        await check_quota(db, int(payload["school_id"]), int(length))
+
+
+async def get_usage_report(db: AsyncSession, school_id: Optional[int] = None) -> list:
+    """Usage and quota for every school (or one), read from the counters: one Redis round trip per school."""
+    stmt = select(School.id, School.name, School.storage_quota_bytes).order_by(School.id)
+    if school_id:
+        stmt = stmt.where(School.id == school_id)
+    schools = (await db.execute(stmt)).all()
+
+    counters: Dict[int, Dict[str, str]] = {}
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for sid, _, _ in schools:
+                pipe.hgetall(_usage_key(sid))
+            results = await pipe.execute()
+        counters = {sid: fields for (sid, _, _), fields in zip(schools, results) if SEEDED_FIELD in fields}
+    except RedisError as e:
+        logger.warning(f"Usage counters unavailable, reporting persisted values: {e}")
+
+    # Schools without a live hash fall back to the persisted copy (one query)
+    unseeded = [sid for sid, _, _ in schools if sid not in counters]
+    if unseeded:
+        counters.update(await _usage_rows(db, unseeded))
+
+    report = []
+    for sid, name, quota in schools:
+        usage = _parse_usage(counters.get(sid, {}))
+        quota = (quota if quota is not None else settings.STORAGE_QUOTA_DEFAULT_BYTES) or None
+        report.append({"school_id": sid, "school_name": name, "quota_bytes": quota, **usage})
+    return report
+
+
+async def flush_storage_usage() -> None:
+    """Background job: persist the Redis counters to ``school_storage_usage``."""
+    try:
+        redis = await get_redis()
+        async with AsyncSessionLocal() as db:
+            now = datetime.now(UTC)
+            flushed = 0
+            async for key in redis.scan_iter(match=_usage_key("*"), count=500):
+                school_id = int(key.rsplit(":", 1)[1])
+                fields = await redis.hgetall(key)
+                if SEEDED_FIELD not in fields:
+                    continue
+                rows = [
+                    {"school_id": school_id, "folder": folder, "bytes": f["bytes"], "files": f["files"], "updated_at": now}
+                    for folder, f in _parse_usage(fields)["folders"].items()
+                ]
+                await db.execute(delete(SchoolStorageUsage).where(SchoolStorageUsage.school_id == school_id))
+                if rows:
+                    await db.execute(pg_insert(SchoolStorageUsage).values(rows))
+                flushed += 1
+            await db.commit()
+            logger.info(f"Usage flush: persisted counters for {flushed} schools")
+    except Exception as e:
+        logger.error(f"Error flushing storage usage: {e}")
+
+
+async def recount_storage_usage() -> None:
+    """Background job: recompute usage from ``file_records`` and reset the counters to it."""
+    try:
+        async with AsyncSessionLocal() as db:
+            folder = _folder_sql()
+            totals = (await db.execute(
+                select(FileRecord.school_id, folder, func.sum(FileRecord.size), func.count(FileRecord.id))
+                .where(FileRecord.school_id.isnot(None))
+                .group_by(FileRecord.school_id, folder)
+            )).all()
+            now = datetime.now(UTC)
+            rows = [
+                {"school_id": sid, "folder": name, "bytes": int(size), "files": count, "updated_at": now}
+                for sid, name, size, count in totals
+            ]
+            await db.execute(delete(SchoolStorageUsage))
+            if rows:
+                await db.execute(pg_insert(SchoolStorageUsage).values(rows))
+            await db.commit()
+
+        by_school: Dict[int, Dict[str, int]] = {}
+        for row in rows:
+            fields = by_school.setdefault(row["school_id"], {SEEDED_FIELD: 1})
+            fields[f"bytes:{row['folder']}"] = row["bytes"]
+            fields[f"files:{row['folder']}"] = row["files"]
+
+        redis = await get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            async for key in redis.scan_iter(match=_usage_key("*"), count=500):
+                pipe.delete(key)
+            for school_id, fields in by_school.items():
+                pipe.hset(_usage_key(school_id), mapping=fields)
+            await pipe.execute()
+        logger.info(f"Usage recount: {len(by_school)} schools, {sum(r['bytes'] for r in rows)} bytes")
+    except Exception as e:
+        logger.error(f"Error recounting storage usage: {e}")
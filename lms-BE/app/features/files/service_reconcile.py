@@ -0,0 +1,344 @@
+"""
+Reconciliation between database references and object storage.
+
+Every scope is one key prefix: ``schools/<id>/`` per school, plus ``blobs/``
+for content-addressed storage. For each scope the bucket listing
+(``AsyncStorage.iter_objects``) and the database references (one query per
+scope, ordered with ``COLLATE "C"`` so it sorts like S3 keys) are streamed in
+key order and merged, which yields both differences in one pass with memory
+bounded by the page size:
+
+- missing: referenced in the database, absent from storage. ``FileRecord``
+  and ``Submission`` rows are deleted; notes, previews and blob rows are only
+  reported (deleting a material or a shared blob's record is not a cleanup
+  decision).
+- unreferenced: in storage, referenced by nothing. Deleted with bulk
+  multi-object DELETEs once older than ``RECONCILE_GRACE_SECONDS``, so an
+  upload whose record is not committed yet is left alone.
+
+A school's references include super admin uploads (``school_id`` NULL)
+placed under its prefix. Deleted rows are also taken out of the usage and
+attempt counters. Only rows created before the run started are considered,
+since their objects were written before the listing began. Actions are applied in batches of
+``RECONCILE_BATCH_SIZE`` as the merge advances; a dry run applies nothing and
+returns the same report. Super admin uploads outside ``schools/`` are not
+reconciled.
+"""
+
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import Integer, String, delete, exists, func, literal, or_, select, union, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.download_cache import get_download_cache
+from app.core.storage import get_storage
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_notes import Notes
+from app.features.files.models import FileBlob, FileRecord
+from app.features.files.service_blobs import BLOB_PREFIX
+from app.features.files.service_quota import record_usage, usage_folder
+from app.features.schools.models import School
+from app.features.submissions.fast_path import forget_attempt_counters
+from app.features.submissions.models import Submission
+
+logger = logging.getLogger(__name__)
+
+# Keys of each kind listed in the report
+REPORT_SAMPLE = 50
+LISTING_PAGE_SIZE = 1000
+LEGACY_URL_MARKER = "/lms-files/"
+
+# (key, kind, row id)
+Reference = Tuple[str, str, int]
+
+
+def object_name_from_url(url: Optional[str]) -> Optional[str]:
+    """Object name behind a stored public URL, or None for links outside our storage."""
+    if not url:
+        return None
+    base = get_storage().public_url("")
+    if url.startswith(base):
+        return url[len(base):] or None
+    if LEGACY_URL_MARKER in url:
+        return url.split(LEGACY_URL_MARKER)[-1] or None
+    return None
+
+
+class ScopeReport:
+    """Counts and samples for one prefix; ``as_dict`` is what the API returns."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.objects = 0
+        self.references = 0
+        self.missing = 0
+        self.unreferenced = 0
+        self.recent_unreferenced = 0
+        self.deleted_objects = 0
+        self.deleted_records = 0
+        self.missing_sample: List[dict] = []
+        self.unreferenced_sample: List[str] = []
+        self.note = None
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class _Batches:
+    """Pending actions for one scope, flushed every ``RECONCILE_BATCH_SIZE`` items."""
+
+    def __init__(self, db: AsyncSession, report: ScopeReport, dry_run: bool):
+        self.db = db
+        self.report = report
+        self.dry_run = dry_run
+        self.objects: List[str] = []
+        self.records: dict = {"file_record": [], "submission": []}
+
+    async def unreferenced(self, key: str) -> None:
+        self.objects.append(key)
+        if len(self.objects) >= settings.RECONCILE_BATCH_SIZE:
+            await self.flush()
+
+    async def missing(self, kind: str, row_id: int) -> None:
+        if kind not in self.records:
+            return
+        self.records[kind].append(row_id)
+        if len(self.records[kind]) >= settings.RECONCILE_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self) -> None:
+        objects, self.objects = self.objects, []
+        file_ids, self.records["file_record"] = self.records["file_record"], []
+        submission_ids, self.records["submission"] = self.records["submission"], []
+        if self.dry_run:
+            return
+
+        if objects:
+            failed = await get_storage().delete_many(objects)
+            self.report.deleted_objects += len(objects) - len(failed)
+            cache = get_download_cache()
+            for key in objects:
+                cache.discard(key)
+        files, submissions = [], []
+        if file_ids:
+            files = (await self.db.execute(
+                delete(FileRecord)
+                .where(FileRecord.id.in_(file_ids))
+                .returning(FileRecord.school_id, FileRecord.object_name, FileRecord.size)
+            )).all()
+            self.report.deleted_records += len(files)
+        if submission_ids:
+            submissions = (await self.db.execute(
+                delete(Submission)
+                .where(Submission.id.in_(submission_ids))
+                .returning(Submission.student_id, Submission.assignment_id)
+            )).all()
+            self.report.deleted_records += len(submissions)
+        if file_ids or submission_ids:
+            await self.db.commit()
+
+        # Keep the counters derived from these rows in step
+        usage: dict = {}
+        for school_id, object_name, size in files:
+            if school_id:
+                entry = usage.setdefault((school_id, usage_folder(object_name, school_id)), [object_name, 0, 0])
+                entry[1] += size
+                entry[2] += 1
+        for (school_id, _), (object_name, size, count) in usage.items():
+            await record_usage(school_id, object_name, -size, files=-count)
+        await forget_attempt_counters("file", submissions)
+
+
+async def _school_references(db: AsyncSession, school_id: int, prefix: str, started: datetime) -> AsyncIterator[Reference]:
+    # Deduplicated uploads keep their bytes under blobs/, not under their object name
+    submission_key = func.coalesce(
+        Submission.object_name,
+        func.nullif(func.split_part(Submission.file_url, LEGACY_URL_MARKER, 2), ""),
+    )
+    # Super admins may upload into any school's folder without owning the record to it
+    owned = or_(FileRecord.school_id == school_id, FileRecord.school_id.is_(None))
+    records = (
+        select(FileRecord.object_name.label("key"), literal("file_record", String).label("kind"), FileRecord.id.label("id"))
+        .where(
+            owned,
+            FileRecord.storage_key.is_(None),
+            FileRecord.object_name.startswith(prefix, autoescape=True),
+            FileRecord.created_at < started,
+        )
+    )
+    submissions = (
+        select(submission_key.label("key"), literal("submission", String).label("kind"), Submission.id.label("id"))
+        .where(
+            Submission.school_id == school_id,
+            Submission.submitted_at < started,
+            submission_key.startswith(prefix, autoescape=True),
+            ~exists().where(
+                FileRecord.object_name == Submission.object_name, FileRecord.storage_key.isnot(None)
+            ),
+        )
+    )
+    # Thumbnails and previews sit next to the file they were rendered from
+    previews = [
+        select(key.label("key"), literal("preview", String).label("kind"), FileRecord.id.label("id"))
+        .where(
+            owned,
+            FileRecord.storage_key.is_(None),
+            key.startswith(prefix, autoescape=True),
+            FileRecord.created_at < started,
+        )
+        for key in (FileRecord.thumbnail_key, FileRecord.preview_key)
+    ]
+    combined = union_all(records, submissions, *previews).subquery()
+    stmt = select(combined.c.key, combined.c.kind, combined.c.id).order_by(combined.c.key.collate("C"))
+
+    # Notes store a URL, so their keys are derived here; a school has few enough to sort in memory
+    notes = await db.execute(
+        select(Notes.content_url, Notes.material_id)
+        .join(LearningMaterial, LearningMaterial.id == Notes.material_id)
+        .where(Notes.content_url.contains(prefix, autoescape=True), LearningMaterial.created_at < started)
+    )
+    note_refs = sorted(
+        (key, "note", material_id)
+        for url, material_id in notes
+        if (key := object_name_from_url(url)) and key.startswith(prefix)
+    )
+
+    rows = await db.stream(stmt.execution_options(yield_per=LISTING_PAGE_SIZE))
+    streamed = (tuple(row) async for row in rows)
+    async for ref in _merge_refs(streamed, note_refs):
+        yield ref
+
+
+async def _merge_refs(streamed: AsyncIterator[Reference], extra: List[Reference]) -> AsyncIterator[Reference]:
+    """Merge a sorted async stream with a sorted list."""
+    i = 0
+    async for ref in streamed:
+        while i < len(extra) and extra[i][0] <= ref[0]:
+            yield extra[i]
+            i += 1
+        yield ref
+    for ref in extra[i:]:
+        yield ref
+
+
+async def _blob_references(db: AsyncSession, started: datetime) -> AsyncIterator[Reference]:
+    blobs = (
+        select(FileBlob.storage_key.label("key"), literal("blob", String).label("kind"), literal(0, Integer).label("id"))
+        .where(FileBlob.created_at < started)
+    )
+    # Previews of deduplicated content are shared like the blob itself (UNION drops the repeats)
+    previews = [
+        select(key.label("key"), literal("preview", String).label("kind"), literal(0, Integer).label("id"))
+        .where(FileRecord.storage_key.isnot(None), key.isnot(None), FileRecord.created_at < started)
+        for key in (FileRecord.thumbnail_key, FileRecord.preview_key)
+    ]
+    combined = union(blobs, *previews).subquery()
+    stmt = select(combined.c.key, combined.c.kind, combined.c.id).order_by(combined.c.key.collate("C"))
+    rows = await db.stream(stmt.execution_options(yield_per=LISTING_PAGE_SIZE))
+    async for row in rows:
+        yield tuple(row)
+
+
+async def _reconcile_scope(
+    prefix: str,
+    references: AsyncIterator[Reference],
+    writer: AsyncSession,
+    started: datetime,
+    dry_run: bool,
+) -> ScopeReport:
+    """Sorted merge of the listing of ``prefix`` with ``references``, acting on both differences."""
+    report = ScopeReport(prefix)
+    objects = get_storage().iter_objects(prefix, page_size=LISTING_PAGE_SIZE)
+    grace_cutoff = started - timedelta(seconds=settings.RECONCILE_GRACE_SECONDS)
+
+    obj = await anext(objects, None)
+    ref = await anext(references, None)
+    if obj is None and ref is not None:
+        # An empty listing next to existing references looks like a storage or
+        # configuration problem rather than data loss: report, do not delete
+        report.note = "No objects listed under this prefix; actions skipped"
+        dry_run = True
+    batches = _Batches(writer, report, dry_run)
+
+    try:
+        while obj is not None or ref is not None:
+            if ref is None or (obj is not None and obj["object_name"] < ref[0]):
+                report.objects += 1
+                if obj["last_modified"] is not None and obj["last_modified"] >= grace_cutoff:
+                    report.recent_unreferenced += 1
+                else:
+                    report.unreferenced += 1
+                    if len(report.unreferenced_sample) < REPORT_SAMPLE:
+                        report.unreferenced_sample.append(obj["object_name"])
+                    await batches.unreferenced(obj["object_name"])
+                obj = await anext(objects, None)
+            elif obj is None or ref[0] < obj["object_name"]:
+                report.references += 1
+                report.missing += 1
+                key, kind, row_id = ref
+                if len(report.missing_sample) < REPORT_SAMPLE:
+                    report.missing_sample.append({"key": key, "kind": kind, "id": row_id})
+                await batches.missing(kind, row_id)
+                ref = await anext(references, None)
+            else:
+                key = obj["object_name"]
+                report.objects += 1
+                while ref is not None and ref[0] == key:
+                    report.references += 1
+                    ref = await anext(references, None)
+                obj = await anext(objects, None)
+        await batches.flush()
+    finally:
+        await objects.aclose()
+        await references.aclose()
+
+    return report
+
+
+async def reconcile_storage(dry_run: bool = False, school_id: Optional[int] = None) -> dict:
+    """
+    Reconcile every school prefix (or only ``school_id``) and, for a full run, ``blobs/``.
+
+    Returns a report: per scope counts, samples of missing / unreferenced
+    keys and what was deleted (nothing for a dry run).
+    """
+    started = datetime.now(UTC)
+    scopes = []
+    async with AsyncSessionLocal() as reader, AsyncSessionLocal() as writer:
+        school_ids = [school_id] if school_id else (await reader.scalars(select(School.id).order_by(School.id))).all()
+        for sid in school_ids:
+            prefix = f"schools/{sid}/"
+            refs = _school_references(reader, sid, prefix, started)
+            scopes.append(await _reconcile_scope(prefix, refs, writer, started, dry_run))
+            await reader.commit()
+        if not school_id:
+            refs = _blob_references(reader, started)
+            scopes.append(await _reconcile_scope(f"{BLOB_PREFIX}/", refs, writer, started, dry_run))
+
+    totals = {
+        field: sum(getattr(scope, field) for scope in scopes)
+        for field in ("objects", "references", "missing", "unreferenced", "deleted_objects", "deleted_records")
+    }
+    logger.info(
+        f"Storage reconciliation{' (dry run)' if dry_run else ''}: {totals['missing']} missing, "
+        f"{totals['unreferenced']} unreferenced, {totals['deleted_objects']} objects and "
+        f"{totals['deleted_records']} records deleted"
+    )
+    return {
+        "dry_run": dry_run,
+        "started_at": started,
+        **totals,
+        "scopes": [scope.as_dict() for scope in scopes],
+    }
+
+
+async def run_storage_reconciliation() -> None:
+    """Background job wrapper around ``reconcile_storage``."""
+    try:
+        await reconcile_storage(dry_run=settings.RECONCILE_DRY_RUN)
+    except Exception as e:
+        logger.error(f"Error reconciling storage: {e}")
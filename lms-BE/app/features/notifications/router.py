@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.database import get_db
+from app.core.conditional import is_not_modified, json_response, not_modified, query_stamp
 from app.features.auth.dependencies import get_current_user
 from app.features.users.schemas import UserRead
 from . import schemas, service
@@ -14,12 +15,21 @@ from app.features.users.models import User
 
 @router.get("/", response_model=List[schemas.NotificationRead])
 async def get_my_notifications(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     school_info = Depends(validate_school_subscription)
 ):
     """Get all notifications for the current user."""
-    return await service.get_user_notifications(db, current_user.id, school_id=current_user.school_id)
+    etag = await query_stamp(
+        db, service.notifications_stamp_query(current_user.id, school_id=current_user.school_id),
+        "notifications", current_user.id, current_user.school_id,
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    notifications = await service.get_user_notifications(db, current_user.id, school_id=current_user.school_id)
+    return json_response(request, [schemas.NotificationRead.model_validate(n) for n in notifications], etag=etag)
 
 @router.patch("/{notification_id}/read", response_model=schemas.NotificationRead)
 async def mark_read(
@@ -7,6 +7,8 @@ class NotificationCreate(BaseModel):
     type: str
     message: str
     entity_id: Optional[int] = None
+    # Duplicates of the same event are dropped; without an id, per entity and hour
+    event_id: Optional[str] = None
 
 class NotificationRead(BaseModel):
     id: int
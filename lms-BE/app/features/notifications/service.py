@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Optional
 import hashlib
 from datetime import datetime, timezone
@@ -7,14 +8,20 @@ from datetime import datetime, timezone
 from .models import Notification
 from .schemas import NotificationCreate
 
+# Rows per multi-row INSERT (keeps bind parameters well under the driver limit)
+BULK_INSERT_BATCH = 1000
+
+def _event_key(schema: NotificationCreate) -> Optional[str]:
+    if schema.entity_id is None:
+        return None
+    # Generate hash based on user, type, entity and the event id or a deterministic hourly bucket
+    event = schema.event_id or datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
+    raw_key = f"{schema.user_id}:{schema.type}:{schema.entity_id}:{event}"
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
 async def create_notification(db: AsyncSession, schema: NotificationCreate, school_id: Optional[int] = None) -> Notification:
-    event_key = None
-    if schema.entity_id is not None:
-        # Generate hash based on user, type, entity and deterministic hourly bucket
-        date_bucket = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
-        raw_key = f"{schema.user_id}:{schema.type}:{schema.entity_id}:{date_bucket}"
-        event_key = hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
-        
+    event_key = _event_key(schema)
+    if event_key is not None:
         stmt = select(Notification).where(
             Notification.event_key == event_key
         )
@@ -37,6 +44,34 @@ async def create_notification(db: AsyncSession, schema: NotificationCreate, scho
     await db.refresh(notification)
     return notification
 
+async def create_notifications_bulk(db: AsyncSession, schemas: List[NotificationCreate], school_id: Optional[int] = None) -> None:
+    """Insert many notifications with multi-row INSERTs, skipping duplicates by event_key."""
+    for start in range(0, len(schemas), BULK_INSERT_BATCH):
+        stmt = pg_insert(Notification).values([
+            {
+                "user_id": schema.user_id,
+                "school_id": school_id,
+                "type": schema.type,
+                "message": schema.message,
+                "event_key": _event_key(schema),
+                "is_read": False,
+            }
+            for schema in schemas[start:start + BULK_INSERT_BATCH]
+        ]).on_conflict_do_nothing(index_elements=["event_key"])
+        await db.execute(stmt)
+    await db.commit()
+
+def notifications_stamp_query(user_id: int, school_id: Optional[int] = None):
+    """Count, newest id and read count: changes on new notifications, deletions and read marks."""
+    stmt = select(
+        func.count(Notification.id),
+        func.max(Notification.id),
+        func.count(Notification.id).filter(Notification.is_read == True),
+    ).where(Notification.user_id == user_id)
+    if school_id:
+        stmt = stmt.where(Notification.school_id == school_id)
+    return stmt
+
 async def get_user_notifications(db: AsyncSession, user_id: int, school_id: Optional[int] = None) -> List[Notification]:
     stmt = select(Notification).where(Notification.user_id == user_id)
     if school_id:
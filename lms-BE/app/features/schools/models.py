@@ -1,6 +1,7 @@
-from sqlalchemy import Integer, String, TIMESTAMP, func, DateTime
+from sqlalchemy import BigInteger, Integer, String, TIMESTAMP, func, DateTime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
+from typing import Optional
 from app.core.db_base import Base
 
 class School(Base):
@@ -22,6 +23,9 @@ class School(Base):
     
     max_teachers: Mapped[int] = mapped_column(Integer, default=10, nullable=False)
 
+    storage_quota_bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    """Upload quota; NULL falls back to settings.STORAGE_QUOTA_DEFAULT_BYTES (0 = unlimited)"""
+
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True),
         server_default=func.now(),
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
@@ -6,6 +6,7 @@ class SchoolBase(BaseModel):
     name: str
     subscription_end: datetime
     max_teachers: int = 10
+    storage_quota_bytes: Optional[int] = Field(None, ge=0)
 
 class PrincipalInfo(BaseModel):
     id: int
@@ -19,6 +20,7 @@ class SchoolUpdate(BaseModel):
     name: Optional[str] = None
     subscription_end: Optional[datetime] = None
     max_teachers: Optional[int] = None
+    storage_quota_bytes: Optional[int] = Field(None, ge=0)
 
 class SchoolRead(SchoolBase):
     id: int
@@ -7,17 +7,33 @@ from fastapi import HTTPException
 from datetime import datetime, UTC
 from typing import Optional
 
+from fastapi.encoders import jsonable_encoder
+
+from app.core.cache import cached, invalidate_tags
+
+# Every school write (and principal assignment) invalidates the cached school lists
+SCHOOLS_TAG = "schools"
+SCHOOL_LIST_CACHE_TTL = 300
+
 async def create_school(db: AsyncSession, school_in: SchoolCreate) -> School:
     db_school = School(**school_in.model_dump(exclude_none=True))
     db.add(db_school)
     await db.commit()
     await db.refresh(db_school)
+    await invalidate_tags(SCHOOLS_TAG)
     return db_school
 
 async def get_school(db: AsyncSession, school_id: int) -> Optional[School]:
     result = await db.execute(select(School).where(School.id == school_id))
     return result.scalar_one_or_none()
 
+@cached(
+    "school_list",
+    key=lambda db, page=1, limit=10: f"page:{page}:limit:{limit}",
+    tags=lambda db, page=1, limit=10: (SCHOOLS_TAG,),
+    ttl=SCHOOL_LIST_CACHE_TTL,
+    encode=jsonable_encoder,
+)
 async def list_schools(
     db: AsyncSession, 
     page: int = 1, 
@@ -48,6 +64,7 @@ async def list_schools(
             "subscription_start": school.subscription_start,
             "subscription_end": school.subscription_end,
             "max_teachers": school.max_teachers,
+            "storage_quota_bytes": school.storage_quota_bytes,
             "created_at": school.created_at,
             "updated_at": school.updated_at,
             "principal": None
@@ -81,6 +98,7 @@ async def update_school(db: AsyncSession, school_id: int, school_in: SchoolUpdat
         
     await db.commit()
     await db.refresh(db_school)
+    await invalidate_tags(SCHOOLS_TAG)
     return db_school
 
 async def validate_subscription(db: AsyncSession, school_id: int):
@@ -124,4 +142,5 @@ async def assign_principal(db: AsyncSession, school_id: int, user_id: int) -> Op
     user.role = "principal"
     await db.commit()
     await db.refresh(user)
+    await invalidate_tags(SCHOOLS_TAG)
     return user
@@ -0,0 +1,120 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from typing import Dict, Optional
+
+from app.core.cache import cached, school_tag, tenant_key, user_tag
+from app.features.courses.models import Course
+from app.features.courses.models_materials import LearningMaterial
+
+# Dashboard counters: shared per tenant, invalidated by course / material / submission writes
+STATS_CACHE_TTL = 300
+# Admin counters are global, so no single school's writes can invalidate them
+ADMIN_STATS_CACHE_TTL = 60
+
+
+@cached("stats_admin", key=lambda db: "global", ttl=ADMIN_STATS_CACHE_TTL)
+async def get_admin_stats(db: AsyncSession) -> Dict[str, int]:
+    total_courses = await db.scalar(select(func.count(Course.id)).where(Course.is_deleted == False))
+    total_materials = await db.scalar(
+        select(func.count(LearningMaterial.id))
+        .where(LearningMaterial.is_deleted == False, LearningMaterial.type == "notes")
+    )
+    total_assignments = await db.scalar(
+        select(func.count(LearningMaterial.id))
+        .where(LearningMaterial.is_deleted == False, LearningMaterial.type == "assignment")
+    )
+
+    return {
+        "courses": total_courses or 0,
+        "materials": total_materials or 0,
+        "assignments": total_assignments or 0,
+    }
+
+
+@cached(
+    "stats_teacher",
+    key=lambda db, teacher_id, school_id: tenant_key(school_id, "teacher", teacher_id),
+    tags=lambda db, teacher_id, school_id: (school_tag(school_id), user_tag(teacher_id)),
+    ttl=STATS_CACHE_TTL,
+)
+async def get_teacher_stats(db: AsyncSession, teacher_id: int, school_id: Optional[int]) -> Dict[str, int]:
+    from app.features.enrollments.models_teacher import TeacherCourse
+    
+    # Courses assigned to this teacher
+    course_count = await db.scalar(
+        select(func.count(Course.id))
+        .join(TeacherCourse, TeacherCourse.course_id == Course.id)
+        .where(TeacherCourse.teacher_id == teacher_id, Course.is_deleted == False)
+    )
+    
+    # Materials created by this teacher
+    material_count = await db.scalar(
+        select(func.count(LearningMaterial.id))
+        .where(LearningMaterial.created_by_teacher_id == teacher_id, LearningMaterial.is_deleted == False, LearningMaterial.type == "notes")
+    )
+    
+    assignment_count = await db.scalar(
+        select(func.count(LearningMaterial.id))
+        .where(LearningMaterial.created_by_teacher_id == teacher_id, LearningMaterial.is_deleted == False, LearningMaterial.type == "assignment")
+    )
+
+    return {
+        "courses": course_count or 0,
+        "materials": material_count or 0,
+        "assignments": assignment_count or 0,
+    }
+
+
+@cached(
+    "stats_student",
+    key=lambda db, student_id, school_id: tenant_key(school_id, "student", student_id),
+    tags=lambda db, student_id, school_id: (school_tag(school_id), user_tag(student_id)),
+    ttl=STATS_CACHE_TTL,
+)
+async def get_student_stats(db: AsyncSession, student_id: int, school_id: Optional[int]) -> Dict[str, int]:
+    from app.features.enrollments.models_student import StudentCourse
+    from app.features.courses.models_assignment import Assignment
+    from app.features.submissions.models import Submission
+    
+    # Courses this student is enrolled in
+    course_count = await db.scalar(
+        select(func.count(Course.id))
+        .join(StudentCourse, StudentCourse.course_id == Course.id)
+        .where(StudentCourse.student_id == student_id, Course.is_deleted == False)
+    )
+    
+    # Total materials (notes) in enrolled courses
+    material_count = await db.scalar(
+        select(func.count(LearningMaterial.id))
+        .join(StudentCourse, StudentCourse.course_id == LearningMaterial.course_id)
+        .where(StudentCourse.student_id == student_id, LearningMaterial.is_deleted == False, LearningMaterial.type == "notes")
+    )
+    
+    # Subquery for submission counts
+    sub_count = (
+        select(Submission.assignment_id, func.count(Submission.id).label("cnt"))
+        .where(Submission.student_id == student_id)
+        .group_by(Submission.assignment_id)
+        .subquery()
+    )
+
+    # Main query for pending assignments (attempts left < max_attempts)
+    pending_assignment_stmt = (
+        select(func.count(LearningMaterial.id))
+        .join(Assignment, Assignment.material_id == LearningMaterial.id)
+        .join(StudentCourse, StudentCourse.course_id == LearningMaterial.course_id)
+        .outerjoin(sub_count, sub_count.c.assignment_id == LearningMaterial.id)
+        .where(
+            StudentCourse.student_id == student_id,
+            LearningMaterial.is_deleted == False,
+            LearningMaterial.type == "assignment",
+            func.coalesce(sub_count.c.cnt, 0) < Assignment.max_attempts
+        )
+    )
+    pending_assignments = await db.scalar(pending_assignment_stmt) or 0
+
+    return {
+        "courses": course_count or 0,
+        "materials": material_count or 0,
+        "assignments": pending_assignments,
+    }
@@ -0,0 +1,251 @@
+"""
+Deadline-rush submission path.
+
+Shared by file submissions and assessment attempts:
+
+- ``get_assignment_meta``: assignment rules cached in process and in Redis (``app.core.cache``)
+- ``is_enrolled``: course rosters cached as Redis sets
+- ``reserve_attempt``: atomic attempt numbering with Redis INCR, so two
+  concurrent submits can no longer both pass the ``max_attempts`` check
+- ``submission_admission``: per-assignment concurrency limit with a bounded queue
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.admission import AdmissionQueue
+from app.core.cache import VersionedCache
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from .models import Submission
+from app.features.courses.models_assignment import Assignment
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_student_assignment import StudentAssignment
+from app.features.enrollments.models_student import StudentCourse
+
+logger = logging.getLogger(__name__)
+
+# Attempt counters only need to outlive the submission window
+ATTEMPT_COUNTER_TTL = 7 * 24 * 3600
+ROSTER_TTL = 300
+LOCAL_META_TTL = 5.0
+
+submission_admission = AdmissionQueue(
+    "submissions",
+    max_concurrency=settings.SUBMISSION_MAX_CONCURRENCY_PER_ASSIGNMENT,
+    max_queue=settings.SUBMISSION_MAX_QUEUE_PER_ASSIGNMENT,
+    timeout=settings.SUBMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+
+# -------------------- ASSIGNMENT METADATA --------------------
+
+@dataclass(frozen=True)
+class AssignmentMeta:
+    assignment_id: int
+    course_id: int
+    school_id: int
+    assignment_type: str
+    due_date: Optional[date]
+    max_attempts: int
+    total_marks: float
+    is_deleted: bool
+    # Defaulted so payloads cached before the field existed still decode
+    time_limit_minutes: Optional[int] = None
+
+    def to_payload(self) -> dict:
+        return {
+            "assignment_id": self.assignment_id,
+            "course_id": self.course_id,
+            "school_id": self.school_id,
+            "assignment_type": self.assignment_type,
+            "due_date": self.due_date.isoformat() if self.due_date else None,
+            "max_attempts": self.max_attempts,
+            "total_marks": self.total_marks,
+            "is_deleted": self.is_deleted,
+            "time_limit_minutes": self.time_limit_minutes,
+        }
+
+    @classmethod
+    def from_payload(cls, data: dict) -> "AssignmentMeta":
+        return cls(**{**data, "due_date": date.fromisoformat(data["due_date"]) if data["due_date"] else None})
+
+
+# In-process copies are kept very short so edits propagate quickly across workers
+_meta_cache = VersionedCache(
+    "assignment_meta",
+    ttl=settings.ASSIGNMENT_META_CACHE_TTL,
+    local_ttl=LOCAL_META_TTL,
+    decode=AssignmentMeta.from_payload,
+)
+
+
+async def _load_assignment_meta(db: AsyncSession, assignment_id: int) -> Optional[dict]:
+    row = (await db.execute(
+        select(Assignment, LearningMaterial)
+        .join(LearningMaterial, Assignment.material_id == LearningMaterial.id)
+        .where(Assignment.material_id == assignment_id)
+    )).first()
+    if not row:
+        return None
+
+    assignment, material = row
+    return AssignmentMeta(
+        assignment_id=assignment_id,
+        course_id=material.course_id,
+        school_id=material.school_id,
+        assignment_type=assignment.assignment_type,
+        due_date=assignment.due_date,
+        max_attempts=assignment.max_attempts,
+        total_marks=float(assignment.total_marks or 0),
+        is_deleted=material.is_deleted,
+        time_limit_minutes=assignment.time_limit_minutes,
+    ).to_payload()
+
+
+async def get_assignment_meta(db: AsyncSession, assignment_id: int) -> Optional[AssignmentMeta]:
+    return await _meta_cache.get_or_load(assignment_id, lambda: _load_assignment_meta(db, assignment_id))
+
+
+async def invalidate_assignment_meta(assignment_id: int) -> None:
+    await _meta_cache.invalidate(assignment_id)
+
+
+# -------------------- ENROLLMENT --------------------
+
+def _roster_key(course_id: int) -> str:
+    return f"course_students:{course_id}"
+
+
+async def is_enrolled(db: AsyncSession, student_id: int, course_id: int) -> bool:
+    key = _roster_key(course_id)
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.sismember(key, str(student_id))
+            exists, member = await pipe.execute()
+        if exists:
+            return bool(member)
+
+        student_ids = (await db.scalars(
+            select(StudentCourse.student_id).where(StudentCourse.course_id == course_id)
+        )).all()
+        # "0" is a sentinel so an empty roster is still cached
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(key, "0", *[str(sid) for sid in student_ids])
+            pipe.expire(key, ROSTER_TTL)
+            await pipe.execute()
+        return student_id in student_ids
+    except RedisError as e:
+        logger.warning(f"Roster cache unavailable for course {course_id}: {e}")
+
+    enrollment = (await db.scalars(
+        select(StudentCourse).where(
+            StudentCourse.student_id == student_id,
+            StudentCourse.course_id == course_id
+        )
+    )).first()
+    return enrollment is not None
+
+
+async def invalidate_course_roster(course_id: int) -> None:
+    try:
+        redis = await get_redis()
+        await redis.delete(_roster_key(course_id))
+    except RedisError as e:
+        logger.warning(f"Roster cache invalidation failed for course {course_id}: {e}")
+
+
+# -------------------- ATTEMPT ACCOUNTING --------------------
+
+def _attempt_key(kind: str, student_id: int, assignment_id: int) -> str:
+    return f"attempts:{kind}:{assignment_id}:{student_id}"
+
+
+async def _used_attempts(db: AsyncSession, kind: str, student_id: int, assignment_id: int) -> int:
+    if kind == "file":
+        stmt = select(func.count(Submission.id)).where(
+            Submission.student_id == student_id,
+            Submission.assignment_id == assignment_id
+        )
+    else:
+        stmt = select(func.max(StudentAssignment.attempt_number)).where(
+            StudentAssignment.student_id == student_id,
+            StudentAssignment.assignment_id == assignment_id
+        )
+    return (await db.scalar(stmt)) or 0
+
+
+async def attempts_used(db: AsyncSession, kind: str, student_id: int, assignment_id: int) -> int:
+    """Attempts already consumed, read from the Redis counter when it exists."""
+    try:
+        redis = await get_redis()
+        used = await redis.get(_attempt_key(kind, student_id, assignment_id))
+        if used is not None:
+            return int(used)
+    except RedisError as e:
+        logger.warning(f"Attempt counter unavailable, falling back to DB: {e}")
+    return await _used_attempts(db, kind, student_id, assignment_id)
+
+
+async def reserve_attempt(db: AsyncSession, kind: str, student_id: int, assignment_id: int, max_attempts: int) -> int:
+    """
+    Atomically claim the next attempt number for ``(student, assignment)``.
+
+    ``kind`` is ``"file"`` for Submission rows and ``"attempt"`` for
+    StudentAssignment rows. The Redis counter is seeded from the DB on first
+    use (SET NX) and then only ever moved with INCR/DECR, so concurrent
+    requests always get distinct numbers. Without Redis we fall back to the DB
+    count; the unique constraint on StudentAssignment still guards that path.
+    """
+    key = _attempt_key(kind, student_id, assignment_id)
+    try:
+        redis = await get_redis()
+        if not await redis.exists(key):
+            used = await _used_attempts(db, kind, student_id, assignment_id)
+            await redis.set(key, used, nx=True, ex=ATTEMPT_COUNTER_TTL)
+        attempt_number = await redis.incr(key)
+        if attempt_number > max_attempts:
+            await redis.decr(key)
+    except RedisError as e:
+        logger.warning(f"Attempt counter unavailable, falling back to DB: {e}")
+        attempt_number = await _used_attempts(db, kind, student_id, assignment_id) + 1
+
+    if attempt_number > max_attempts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum attempts ({max_attempts}) reached for this assignment."
+        )
+    return attempt_number
+
+
+async def release_attempt(kind: str, student_id: int, assignment_id: int) -> None:
+    """Give back a reserved attempt when the insert did not go through."""
+    try:
+        redis = await get_redis()
+        await redis.decr(_attempt_key(kind, student_id, assignment_id))
+    except RedisError as e:
+        logger.warning(f"Failed to release attempt counter: {e}")
+
+
+async def forget_attempt_counters(kind: str, pairs: Iterable[Tuple[int, int]]) -> None:
+    """
+    Drop the counters of ``(student_id, assignment_id)`` pairs whose rows were
+    deleted outside the submit path; the next reservation re-seeds them from the DB.
+    """
+    keys = [_attempt_key(kind, student_id, assignment_id) for student_id, assignment_id in set(pairs)]
+    if not keys:
+        return
+    try:
+        redis = await get_redis()
+        await redis.delete(*keys)
+    except RedisError as e:
+        logger.warning(f"Failed to reset attempt counters: {e}")
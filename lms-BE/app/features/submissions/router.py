@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.core.rate_limiter import limiter
+from fastapi.responses import StreamingResponse
+from app.core.streaming import tabular_response, iter_zip
 
 from app.core.database import get_db
 from app.features.auth.dependencies import get_current_user
 from app.features.users.schemas import UserRead
-from . import schemas, service
+from . import schemas, service, service_export, service_archive
 
 router = APIRouter(prefix="/submissions", tags=["Submissions"])
 
@@ -61,6 +63,27 @@ async def get_submissions_by_assignment(
     school_id = current_user.school_id if current_user.role != "super_admin" else None
     return await service.get_assignment_submissions(db, assignment_id, current_user.id, school_id=school_id, limit=limit, offset=offset)
 
+@router.get("/assignment/{assignment_id}/archive")
+async def download_assignment_archive(
+    assignment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    school_info = Depends(validate_school_subscription)
+):
+    """Teachers download every uploaded file for an assignment as one streamed ZIP."""
+    if current_user.role not in ["teacher", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    await service._verify_teacher_course(db, current_user.id, assignment_id, school_id)
+
+    entries = service_archive.iter_assignment_archive_entries(assignment_id, school_id=school_id)
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="assignment_{assignment_id}_submissions.zip"'},
+    )
+
 @router.get("/teacher", response_model=schemas.PaginatedSubmissions)
 async def get_teacher_global_submissions(
     course_id: Optional[int] = None,
@@ -104,3 +127,75 @@ async def grade_submission(
         raise HTTPException(status_code=404, detail="Submission not found")
     
     return submission
+
+
+# ---------------------------------------------------------------------------
+# Exports (streamed CSV / XLSX)
+# ---------------------------------------------------------------------------
+
+@router.get("/course/{course_id}/gradebook/export")
+async def export_course_gradebook(
+    course_id: int,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    school_info = Depends(validate_school_subscription)
+):
+    """Teachers download the course gradebook: one row per student, best score per assignment."""
+    if current_user.role not in ["teacher", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    await service_export.verify_teacher_teaches_course(db, current_user.id, course_id, school_id=school_id)
+    columns = await service_export.get_gradebook_columns(db, course_id, school_id=school_id)
+
+    return tabular_response(
+        service_export.gradebook_header(columns),
+        service_export.iter_gradebook_rows(course_id, columns),
+        fmt,
+        filename=f"course_{course_id}_gradebook",
+    )
+
+@router.get("/course/{course_id}/export")
+async def export_course_submissions(
+    course_id: int,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    school_info = Depends(validate_school_subscription)
+):
+    """Teachers download every raw submission and attempt in a course."""
+    if current_user.role not in ["teacher", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    await service_export.verify_teacher_teaches_course(db, current_user.id, course_id, school_id=school_id)
+
+    return tabular_response(
+        service_export.RAW_EXPORT_HEADER,
+        service_export.iter_raw_submission_rows(course_id=course_id, school_id=school_id),
+        fmt,
+        filename=f"course_{course_id}_submissions",
+    )
+
+@router.get("/assignment/{assignment_id}/export")
+async def export_assignment_submissions(
+    assignment_id: int,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    school_info = Depends(validate_school_subscription)
+):
+    """Teachers download every raw submission and attempt for one assignment."""
+    if current_user.role not in ["teacher", "super_admin"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    school_id = current_user.school_id if current_user.role != "super_admin" else None
+    await service._verify_teacher_course(db, current_user.id, assignment_id, school_id)
+
+    return tabular_response(
+        service_export.RAW_EXPORT_HEADER,
+        service_export.iter_raw_submission_rows(assignment_id=assignment_id, school_id=school_id),
+        fmt,
+        filename=f"assignment_{assignment_id}_submissions",
+    )
@@ -1,7 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
-from datetime import datetime
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import datetime, UTC
 from typing import List, Optional
 
 from .models import Submission
@@ -14,86 +15,82 @@ from fastapi import HTTPException
 from app.features.courses.models_assignment import Assignment
 from app.features.courses.models_materials import LearningMaterial
 from app.features.enrollments.models_teacher import TeacherCourse
-from app.features.enrollments.models_student import StudentCourse
 from app.features.courses.models_student_assignment import StudentAssignment
 from app.features.users.models import User
-from app.core.storage import get_minio_client
+from app.features.files.service_blobs import presigned_url_for, presigned_urls_for
+from .service_archive import resolve_object_name
+from app.core.background import run_with_session
+from app.core.cache import invalidate_tags, user_tag
+from app.features.courses.service_analytics import invalidate_assignment_analytics
+from app.features.courses.service_similarity import index_submission
+from .fast_path import (
+    submission_admission,
+    get_assignment_meta,
+    is_enrolled,
+    reserve_attempt,
+    release_attempt,
+)
 
 async def create_submission(db: AsyncSession, student_id: int, schema: SubmissionCreate, school_id: int) -> Submission:
-    # 1. Fetch assignment and check deadline
-    assignment_result = await db.execute(
-        select(Assignment)
-        .options(selectinload(Assignment.material))
-        .where(Assignment.material_id == schema.assignment_id)
-    )
-    assignment = assignment_result.scalar_one_or_none()
-    
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Assignment not found.")
+    async with submission_admission.slot(schema.assignment_id):
+        # 1. Assignment rules (cached) and deadline
+        meta = await get_assignment_meta(db, schema.assignment_id)
+        if not meta or meta.is_deleted:
+            raise HTTPException(status_code=404, detail="Assignment not found.")
 
-    if assignment.due_date:
-        current_date = datetime.utcnow().date()
-        if current_date > assignment.due_date:
-            raise HTTPException(status_code=400, detail="Submission deadline has passed.")
+        if meta.school_id != school_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
 
-    # 2. Check student enrollment
-    stmt_enroll = select(StudentCourse).filter(
-        StudentCourse.student_id == student_id,
-        StudentCourse.course_id == assignment.material.course_id
-    )
-    res_enroll = await db.execute(stmt_enroll)
-    if not res_enroll.scalars().first():
-        raise HTTPException(status_code=403, detail="You are not enrolled in this course")
+        if meta.due_date:
+            current_date = datetime.utcnow().date()
+            if current_date > meta.due_date:
+                raise HTTPException(status_code=400, detail="Submission deadline has passed.")
 
-    # 3. Check for attempt limits
-    current_attempts = await db.scalar(
-        select(func.count(Submission.id))
-        .where(Submission.student_id == student_id)
-        .where(Submission.assignment_id == schema.assignment_id)
-    )
-    
-    if current_attempts >= assignment.max_attempts:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Maximum attempts ({assignment.max_attempts}) reached for this assignment."
-        )
+        # 2. Check student enrollment (cached roster)
+        if not await is_enrolled(db, student_id, meta.course_id):
+            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
 
-    submission = Submission(
-        student_id=student_id,
-        assignment_id=schema.assignment_id,
-        school_id=school_id,
-        file_url=str(schema.file_url),
-        object_name=schema.object_name,
-        comments=schema.comments,
-    )
-    db.add(submission)
+        # 3. Atomically reserve an attempt
+        await reserve_attempt(db, "file", student_id, schema.assignment_id, meta.max_attempts)
 
-    await db.commit()
-    await db.refresh(submission)
-    
-    await log_action(db, ActivityLogCreate(
+        submission = Submission(
+            student_id=student_id,
+            assignment_id=schema.assignment_id,
+            school_id=school_id,
+            file_url=str(schema.file_url),
+            object_name=schema.object_name,
+            comments=schema.comments,
+            submitted_at=datetime.now(UTC),
+        )
+        db.add(submission)
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await release_attempt("file", student_id, schema.assignment_id)
+            raise
+
+    await invalidate_tags(user_tag(student_id))
+    if submission.object_name:
+        run_with_session(index_submission, submission.id)
+    run_with_session(log_action, ActivityLogCreate(
         user_id=student_id,
-        course_id=assignment.material.course_id,
+        course_id=meta.course_id,
         action="submit_assignment",
         entity_type="submission",
         entity_id=submission.id,
         details=f"Student {student_id} submitted to assignment {schema.assignment_id} in school {school_id}"
     ), school_id=school_id)
-    
-    # Refetch with student loaded to match SubmissionRead schema
-    result = await db.scalars(
-        select(Submission)
-        .options(selectinload(Submission.student))
-        .where(Submission.id == submission.id)
-    )
-    sub = result.first()
-    if sub and sub.object_name:
+
+    # The requesting student is already in the session's identity map, no refetch needed
+    set_committed_value(submission, "student", await db.get(User, student_id))
+    if submission.object_name:
         try:
-            sub.file_url = get_minio_client().generate_presigned_url(sub.object_name, expiry=3600)
+            submission.file_url = await presigned_url_for(db, submission.object_name, expiry=3600) or submission.file_url
         except Exception:
             pass
-            
-    return sub
+
+    return submission
 
 async def get_student_submissions(db: AsyncSession, student_id: int, school_id: int, limit: int = 100, offset: int = 0) -> dict:
     # 1. Fetch File Submissions
@@ -119,22 +116,19 @@ async def get_student_submissions(db: AsyncSession, student_id: int, school_id:
     
     # 3. Standardize into Unified format
     unified_results = []
-    minio_client = get_minio_client()
+    presigned = await presigned_urls_for(
+        db,
+        filter(None, (resolve_object_name(sub.object_name, sub.file_url) for sub in file_submissions)),
+        expiry=3600,
+    )
     
     # Standardize File Submissions
     for sub in file_submissions:
         file_url = sub.file_url
-        obj_name = sub.object_name
-
-        # Fallback for older submissions that lack an explicitly tracked object_name
-        if not obj_name and file_url and '/lms-files/' in file_url:
-            obj_name = file_url.split('/lms-files/')[-1]
+        obj_name = resolve_object_name(sub.object_name, file_url)
 
         if obj_name:
-            try:
-                file_url = minio_client.generate_presigned_url(obj_name, expiry=3600)
-            except Exception as e:
-                print(f"Failed to generate presigned URL for {obj_name}: {e}")
+            file_url = presigned.get(obj_name, file_url)
         
         unified_results.append({
             "id": sub.id,
@@ -225,20 +219,18 @@ async def get_assignment_submissions(db: AsyncSession, assignment_id: int, teach
 
     # 3. Standardize
     unified_results = []
-    minio_client = get_minio_client()
+    presigned = await presigned_urls_for(
+        db,
+        filter(None, (resolve_object_name(sub.object_name, sub.file_url) for sub in file_submissions)),
+        expiry=3600,
+    )
 
     for sub in file_submissions:
         file_url = sub.file_url
-        obj_name = sub.object_name
-        
-        if not obj_name and file_url and '/lms-files/' in file_url:
-            obj_name = file_url.split('/lms-files/')[-1]
+        obj_name = resolve_object_name(sub.object_name, file_url)
             
         if obj_name:
-            try:
-                file_url = minio_client.generate_presigned_url(obj_name, expiry=3600)
-            except Exception as e:
-                print(f"Failed to generate presigned URL for {obj_name}: {e}")
+            file_url = presigned.get(obj_name, file_url)
         
         unified_results.append({
             "id": sub.id,
@@ -327,8 +319,7 @@ async def grade_submission(db: AsyncSession, submission_id: int, teacher_id: int
             
         if obj_name:
             try:
-                minio_client = get_minio_client()
-                file_url = minio_client.generate_presigned_url(obj_name, expiry=3600)
+                file_url = await presigned_url_for(db, obj_name, expiry=3600) or file_url
             except Exception as e:
                 print(f"Failed to generate presigned URL after grading for {obj_name}: {e}")
                 
@@ -368,6 +359,7 @@ async def grade_submission(db: AsyncSession, submission_id: int, teacher_id: int
         
         await db.commit()
         await db.refresh(attempt)
+        await invalidate_assignment_analytics(attempt.assignment_id)
         
         # Trigger notification
         await create_notification(db, NotificationCreate(
@@ -440,19 +432,18 @@ async def get_all_teacher_submissions(
 
     # 4. Standardize and Unified Format
     unified_results = []
-    minio_client = get_minio_client()
+    presigned = await presigned_urls_for(
+        db,
+        filter(None, (resolve_object_name(sub.object_name, sub.file_url) for sub in file_submissions)),
+        expiry=3600,
+    )
 
     for sub in file_submissions:
         file_url = sub.file_url
-        obj_name = sub.object_name
-        if not obj_name and file_url and '/lms-files/' in file_url:
-            obj_name = file_url.split('/lms-files/')[-1]
+        obj_name = resolve_object_name(sub.object_name, file_url)
             
         if obj_name:
-            try:
-                file_url = minio_client.generate_presigned_url(obj_name, expiry=3600)
-            except Exception:
-                pass
+            file_url = presigned.get(obj_name, file_url)
         
         unified_results.append({
             "id": sub.id,
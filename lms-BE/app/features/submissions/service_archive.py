@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.storage import get_storage
+from .models import Submission
+from app.features.users.models import User
+from app.features.files.models import FileRecord
+
+logger = logging.getLogger(__name__)
+
+# Object names are "<uuid4>_<original filename>"
+_UUID_PREFIX = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_")
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+_END = object()
+
+
+def _safe(name: str) -> str:
+    return _UNSAFE_CHARS.sub("_", name).strip(" .") or "file"
+
+
+def archive_entry_name(student_name: str, student_id: int, submitted_at, object_name: str) -> str:
+    """Build '<Student Name> (<id>)/<timestamp>_<original filename>' for a submission."""
+    original = _UUID_PREFIX.sub("", object_name.rsplit("/", 1)[-1])
+    stamp = submitted_at.strftime("%Y%m%d-%H%M%S") if submitted_at else "unknown"
+    return f"{_safe(student_name)} ({student_id})/{stamp}_{_safe(original)}"
+
+
+def resolve_object_name(object_name: Optional[str], file_url: Optional[str]) -> Optional[str]:
+    # Fallback for older submissions that lack an explicitly tracked object_name
+    if not object_name and file_url and '/lms-files/' in file_url:
+        return file_url.split('/lms-files/')[-1]
+    return object_name
+
+
+class _Prefetcher:
+    """
+    Downloads one object into a bounded queue of chunks.
+
+    The queue size caps how far the download may run ahead of the ZIP writer,
+    so memory per object is at most ``prefetch_chunks * chunk_size``.
+    """
+
+    def __init__(self, object_name: str, prefetch_chunks: int, chunk_size: int):
+        self.object_name = object_name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch_chunks)
+        self.task = asyncio.create_task(self._run(chunk_size))
+
+    async def _run(self, chunk_size: int):
+        chunks = get_storage().iter_file_chunks(self.object_name, chunk_size=chunk_size)
+        try:
+            async for chunk in chunks:
+                await self.queue.put(chunk)
+            await self.queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.put(e)
+        finally:
+            await chunks.aclose()
+
+    async def first(self):
+        return await self.queue.get()
+
+    async def rest(self, first_chunk: bytes) -> AsyncIterator[bytes]:
+        yield first_chunk
+        while True:
+            item = await self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self):
+        self.task.cancel()
+
+
+async def iter_assignment_archive_entries(
+    assignment_id: int,
+    school_id: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    prefetch_chunks: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, AsyncIterator[bytes]]]:
+    """
+    Yield ``(arcname, chunks)`` for every FILE_UPLOAD submission of an assignment.
+
+    Submissions are read through a server-side cursor. Up to ``concurrency``
+    downloads run ahead of the entry currently being written, each buffering at
+    most ``prefetch_chunks`` chunks, so storage latency overlaps with the
+    client transfer without ever holding whole files in memory.
+    """
+    concurrency = concurrency or settings.ARCHIVE_FETCH_CONCURRENCY
+    prefetch_chunks = prefetch_chunks or settings.ARCHIVE_PREFETCH_CHUNKS
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+
+    stmt = (
+        select(
+            User.id, User.name, Submission.submitted_at, Submission.object_name, Submission.file_url,
+            FileRecord.storage_key,
+        )
+        .join(User, User.id == Submission.student_id)
+        # Deduplicated uploads keep their bytes under a blob key
+        .outerjoin(FileRecord, FileRecord.object_name == Submission.object_name)
+        .where(Submission.assignment_id == assignment_id)
+        .order_by(User.name, User.id, Submission.submitted_at)
+    )
+    if school_id:
+        stmt = stmt.where(Submission.school_id == school_id)
+
+    window: deque = deque()
+    failed: list[str] = []
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt.execution_options(yield_per=200))
+            rows = result.__aiter__()
+            exhausted = False
+
+            while True:
+                # Keep the prefetch window full
+                while not exhausted and len(window) < concurrency:
+                    try:
+                        student_id, student_name, submitted_at, object_name, file_url, storage_key = await rows.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    object_name = resolve_object_name(object_name, file_url)
+                    if not object_name:
+                        continue
+                    arcname = archive_entry_name(student_name, student_id, submitted_at, object_name)
+                    window.append((arcname, _Prefetcher(storage_key or object_name, prefetch_chunks, chunk_size)))
+
+                if not window:
+                    break
+
+                arcname, fetcher = window.popleft()
+                first = await fetcher.first()
+                if isinstance(first, Exception):
+                    # Missing / unreadable object: skip the entry, list it in the manifest
+                    logger.warning(f"Archive: skipping {fetcher.object_name}: {first}")
+                    failed.append(arcname)
+                    continue
+                if first is _END:
+                    yield arcname, _empty()
+                    continue
+                yield arcname, fetcher.rest(first)
+    finally:
+        for _, fetcher in window:
+            fetcher.cancel()
+
+    if failed:
+        manifest = "The following submissions could not be read from storage:\n" + "\n".join(failed) + "\n"
+        yield "_missing_files.txt", _single(manifest.encode("utf-8"))
+
+
+async def _empty() -> AsyncIterator[bytes]:
+    return
+    yield
+
+
+async def _single(data: bytes) -> AsyncIterator[bytes]:
+    yield data
@@ -0,0 +1,237 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, union_all
+from fastapi import HTTPException
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from app.core.database import AsyncSessionLocal
+from .models import Submission
+from app.features.courses.models_assignment import Assignment
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_student_assignment import StudentAssignment
+from app.features.enrollments.models_student import StudentCourse
+from app.features.enrollments.models_teacher import TeacherCourse
+from app.features.users.models import User
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 500
+
+RAW_EXPORT_HEADER = [
+    "Type",
+    "Submission ID",
+    "Assignment ID",
+    "Assignment",
+    "Student ID",
+    "Student Name",
+    "Student Email",
+    "Attempt",
+    "Submitted At",
+    "Status",
+    "Score",
+    "Total Marks",
+    "Feedback",
+    "File",
+]
+
+
+async def verify_teacher_teaches_course(db: AsyncSession, teacher_id: int, course_id: int, school_id: Optional[int] = None):
+    query = select(TeacherCourse).where(
+        TeacherCourse.teacher_id == teacher_id,
+        TeacherCourse.course_id == course_id
+    )
+    if school_id:
+        query = query.where(TeacherCourse.school_id == school_id)
+
+    mapping = (await db.scalars(query)).first()
+    if not mapping:
+        raise HTTPException(status_code=403, detail="You do not teach this course.")
+
+
+# -------------------- GRADEBOOK --------------------
+
+async def get_gradebook_columns(db: AsyncSession, course_id: int, school_id: Optional[int] = None) -> List[Tuple[int, str, float]]:
+    """Assignment columns of a course gradebook: (assignment_id, title, total_marks)."""
+    stmt = (
+        select(LearningMaterial.id, LearningMaterial.title, Assignment.total_marks)
+        .join(Assignment, Assignment.material_id == LearningMaterial.id)
+        .where(
+            LearningMaterial.course_id == course_id,
+            LearningMaterial.is_deleted == False
+        )
+        .order_by(LearningMaterial.created_at, LearningMaterial.id)
+    )
+    if school_id:
+        stmt = stmt.where(LearningMaterial.school_id == school_id)
+
+    result = await db.execute(stmt)
+    return [(row[0], row[1], float(row[2]) if row[2] is not None else 0.0) for row in result.all()]
+
+
+def gradebook_header(columns: Sequence[Tuple[int, str, float]]) -> List[str]:
+    return (
+        ["Student ID", "Student Name", "Student Email"]
+        + [f"{title} (/{total_marks:g})" for _, title, total_marks in columns]
+        + ["Total"]
+    )
+
+
+def _gradebook_query(course_id: int, assignment_ids: Sequence[int]):
+    # Best score per (student, assignment) across file submissions and assessment attempts
+    scores = union_all(
+        select(
+            Submission.student_id.label("student_id"),
+            Submission.assignment_id.label("assignment_id"),
+            Submission.grade.label("score"),
+        ).where(Submission.assignment_id.in_(assignment_ids)),
+        select(
+            StudentAssignment.student_id.label("student_id"),
+            StudentAssignment.assignment_id.label("assignment_id"),
+            StudentAssignment.total_score.label("score"),
+        ).where(
+            StudentAssignment.assignment_id.in_(assignment_ids),
+            StudentAssignment.is_deleted == False
+        ),
+    ).subquery()
+
+    best = (
+        select(
+            scores.c.student_id,
+            scores.c.assignment_id,
+            func.max(scores.c.score).label("best_score"),
+        )
+        .group_by(scores.c.student_id, scores.c.assignment_id)
+        .subquery()
+    )
+
+    # One row per (student, assignment) ordered so each student's rows are contiguous
+    return (
+        select(User.id, User.name, User.email, best.c.assignment_id, best.c.best_score)
+        .select_from(StudentCourse)
+        .join(User, User.id == StudentCourse.student_id)
+        .outerjoin(best, best.c.student_id == StudentCourse.student_id)
+        .where(StudentCourse.course_id == course_id, User.is_deleted == False)
+        .order_by(User.name, User.id)
+    )
+
+
+async def iter_gradebook_rows(course_id: int, columns: Sequence[Tuple[int, str, float]]) -> AsyncIterator[list]:
+    """
+    Stream one gradebook row per enrolled student.
+
+    Reads through a server-side cursor on its own session (the request session is
+    closed by the time the response body is sent) and only ever holds a single
+    student's row in memory.
+    """
+    assignment_ids = [c[0] for c in columns]
+    position = {assignment_id: i for i, assignment_id in enumerate(assignment_ids)}
+
+    def finish(student, cells):
+        total = sum(c for c in cells if c is not None)
+        return [*student, *cells, total]
+
+    async with AsyncSessionLocal() as db:
+        stmt = _gradebook_query(course_id, assignment_ids).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        result = await db.stream(stmt)
+
+        current_student = None
+        cells: list = []
+        async for student_id, name, email, assignment_id, best_score in result:
+            if current_student is None or current_student[0] != student_id:
+                if current_student is not None:
+                    yield finish(current_student, cells)
+                current_student = (student_id, name, email)
+                cells = [None] * len(assignment_ids)
+
+            if assignment_id in position and best_score is not None:
+                cells[position[assignment_id]] = float(best_score)
+
+        if current_student is not None:
+            yield finish(current_student, cells)
+
+
+# -------------------- RAW SUBMISSIONS --------------------
+
+async def iter_raw_submission_rows(
+    course_id: Optional[int] = None,
+    assignment_id: Optional[int] = None,
+    school_id: Optional[int] = None,
+) -> AsyncIterator[list]:
+    """
+    Stream every file submission and assessment attempt for a course or a single
+    assignment, one flat row each, without building the unified result lists.
+    """
+    file_stmt = (
+        select(
+            Submission.id,
+            Submission.assignment_id,
+            LearningMaterial.title,
+            User.id,
+            User.name,
+            User.email,
+            Submission.submitted_at,
+            Submission.graded_at,
+            Submission.grade,
+            Assignment.total_marks,
+            Submission.feedback,
+            Submission.object_name,
+        )
+        .join(Assignment, Assignment.material_id == Submission.assignment_id)
+        .join(LearningMaterial, LearningMaterial.id == Assignment.material_id)
+        .join(User, User.id == Submission.student_id)
+        .order_by(Submission.submitted_at, Submission.id)
+    )
+
+    attempt_stmt = (
+        select(
+            StudentAssignment.id,
+            StudentAssignment.assignment_id,
+            LearningMaterial.title,
+            User.id,
+            User.name,
+            User.email,
+            StudentAssignment.attempt_number,
+            StudentAssignment.submitted_at,
+            StudentAssignment.status,
+            StudentAssignment.total_score,
+            Assignment.total_marks,
+            StudentAssignment.teacher_feedback,
+            Assignment.assignment_type,
+        )
+        .join(Assignment, Assignment.material_id == StudentAssignment.assignment_id)
+        .join(LearningMaterial, LearningMaterial.id == Assignment.material_id)
+        .join(User, User.id == StudentAssignment.student_id)
+        .where(StudentAssignment.is_deleted == False)
+        .order_by(StudentAssignment.submitted_at, StudentAssignment.id)
+    )
+
+    if assignment_id is not None:
+        file_stmt = file_stmt.where(Submission.assignment_id == assignment_id)
+        attempt_stmt = attempt_stmt.where(StudentAssignment.assignment_id == assignment_id)
+    if course_id is not None:
+        file_stmt = file_stmt.where(LearningMaterial.course_id == course_id)
+        attempt_stmt = attempt_stmt.where(LearningMaterial.course_id == course_id)
+    if school_id:
+        file_stmt = file_stmt.where(Submission.school_id == school_id)
+        attempt_stmt = attempt_stmt.where(LearningMaterial.school_id == school_id)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(file_stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for (sub_id, a_id, title, student_id, name, email, submitted_at,
+                   graded_at, grade, total_marks, feedback, object_name) in result:
+            yield [
+                "FILE_UPLOAD", sub_id, a_id, title, student_id, name, email, None,
+                submitted_at, "graded" if graded_at else "submitted",
+                float(grade) if grade is not None else None,
+                float(total_marks) if total_marks is not None else None,
+                feedback, object_name,
+            ]
+
+        result = await db.stream(attempt_stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for (att_id, a_id, title, student_id, name, email, attempt_number, submitted_at,
+                   status, total_score, total_marks, feedback, assignment_type) in result:
+            yield [
+                assignment_type, att_id, a_id, title, student_id, name, email, attempt_number,
+                submitted_at, status,
+                float(total_score) if total_score is not None else None,
+                float(total_marks) if total_marks is not None else None,
+                feedback, None,
+            ]
@@ -16,11 +16,14 @@ from app.core.seed import seed_super_admin
 
 from app.core.redis_client import get_redis
 from app.core.database import AsyncSessionLocal
+from app.core.background import drain_background_tasks
+from app.features.files.service_previews import start_preview_worker, stop_preview_worker
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic (if any)
     start_scheduler()
+    start_preview_worker()
     
     # Ensure default super admin exists
     await seed_super_admin()
@@ -45,6 +48,8 @@ async def lifespan(app: FastAPI):
     
     yield
     # Shutdown logic
+    await stop_preview_worker()
+    await drain_background_tasks()
     await engine.dispose()
 
 app = FastAPI(title="LMS Backend", lifespan=lifespan) # Object of fastAPI class
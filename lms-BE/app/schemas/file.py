@@ -17,6 +17,8 @@ class FileUploadResponse(BaseModel):
     bucket: str = Field(..., description="Bucket name where file is stored")
     size: int = Field(..., description="File size in bytes")
     content_type: Optional[str] = Field(None, description="MIME type of the file")
+    sha256: Optional[str] = Field(None, description="SHA-256 hex digest of the file content")
+    deduplicated: bool = Field(False, description="True if identical content was already stored and reused")
     
     class Config:
         json_schema_extra = {
@@ -25,11 +27,85 @@ class FileUploadResponse(BaseModel):
                 "file_url": "http://localhost:9000/lms-files/notes/550e8400-e29b-41d4-a716-446655440000_lecture.pdf",
                 "bucket": "lms-files",
                 "size": 1048576,
-                "content_type": "application/pdf"
+                "content_type": "application/pdf",
+                "sha256": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
             }
         }
 
 
+class BatchUploadResult(BaseModel):
+    """Outcome for one file of a batch upload"""
+
+    filename: str = Field(..., description="Filename as sent by the client")
+    uploaded: bool = Field(..., description="True if the file was stored and registered")
+    file: Optional[FileUploadResponse] = Field(None, description="The stored file")
+    material_id: Optional[int] = Field(None, description="Notes material created for the file, when a course was given")
+    error: Optional[str] = Field(None, description="Why the file was not uploaded")
+
+
+class BatchUploadResponse(BaseModel):
+    """Response for a batch upload: one result per file, in request order"""
+
+    uploaded: int = Field(..., description="Number of files stored")
+    failed: int = Field(..., description="Number of files rejected or failed")
+    results: list[BatchUploadResult]
+
+
+class DirectUploadRequest(BaseModel):
+    """Request model for starting a direct-to-storage upload."""
+    
+    filename: str = Field(..., min_length=1, description="Original filename")
+    size: int = Field(..., gt=0, description="Exact file size in bytes")
+    content_type: Optional[str] = Field(None, description="MIME type of the file")
+    folder: str = Field("", description="Folder path within bucket (e.g., 'notes', 'assignments')")
+    sha256: Optional[str] = Field(
+        None, pattern="^[0-9a-f]{64}$",
+        description="SHA-256 of the content; with deduplication enabled, a known file is registered without uploading"
+    )
+
+
+class DirectUploadPart(BaseModel):
+    """Presigned URL for one part of a multipart upload."""
+    
+    part_number: int = Field(..., description="Part number, starting at 1")
+    url: str = Field(..., description="Presigned PUT URL for this part")
+
+
+class DirectUploadResponse(BaseModel):
+    """Response model for a started direct upload.
+    
+    Small files get a single presigned ``url``; larger files get an
+    ``upload_id`` and one URL per ``part_size`` chunk in ``parts``.
+    """
+    
+    upload_token: Optional[str] = Field(None, description="Token to pass to the complete / abort endpoints")
+    object_name: str = Field(..., description="Object path the file will be stored at")
+    method: str = Field("PUT", description="HTTP method to use for the upload URLs")
+    url: Optional[str] = Field(None, description="Presigned PUT URL (single-part uploads)")
+    upload_id: Optional[str] = Field(None, description="Multipart upload ID (multipart uploads)")
+    part_size: Optional[int] = Field(None, description="Bytes per part; the last part may be smaller")
+    parts: list[DirectUploadPart] = Field(default_factory=list, description="Presigned URLs per part")
+    expires_in: int = Field(..., description="Seconds until the URLs and the token expire")
+    deduplicated: bool = Field(False, description="True if the content was already stored: nothing to upload")
+    file: Optional[FileUploadResponse] = Field(None, description="The registered file when deduplicated")
+
+
+class DirectUploadCompletedPart(BaseModel):
+    """ETag returned by storage for one uploaded part."""
+    
+    part_number: int = Field(..., ge=1)
+    etag: str = Field(..., min_length=1)
+
+
+class DirectUploadCompleteRequest(BaseModel):
+    """Request model for finalizing a direct upload."""
+    
+    upload_token: str = Field(..., description="Token returned when the upload was started")
+    parts: list[DirectUploadCompletedPart] = Field(
+        default_factory=list, description="Uploaded parts (multipart uploads only)"
+    )
+
+
 class PresignedURLRequest(BaseModel):
     """Request model for generating presigned URLs."""
     
@@ -133,3 +209,57 @@ class FileListResponse(BaseModel):
                 "prefix": "notes/"
             }
         }
+
+
+class ReconcileMissingItem(BaseModel):
+    """A database reference whose object is not in storage."""
+
+    key: str = Field(..., description="Object name the row points at")
+    kind: str = Field(..., description="file_record, submission, note or blob")
+    id: int = Field(..., description="Row id (material id for notes, 0 for blobs)")
+
+
+class ReconcileScopeReport(BaseModel):
+    """Reconciliation result for one key prefix."""
+
+    prefix: str = Field(..., description="Key prefix (schools/<id>/ or blobs/)")
+    objects: int = Field(..., description="Objects listed under the prefix")
+    references: int = Field(..., description="Database references under the prefix")
+    missing: int = Field(..., description="References whose object does not exist")
+    unreferenced: int = Field(..., description="Objects nothing references (older than the grace period)")
+    recent_unreferenced: int = Field(..., description="Unreferenced objects kept because they are recent")
+    deleted_objects: int = Field(..., description="Objects deleted from storage")
+    deleted_records: int = Field(..., description="Database rows deleted")
+    missing_sample: list[ReconcileMissingItem] = Field(default_factory=list)
+    unreferenced_sample: list[str] = Field(default_factory=list)
+    note: Optional[str] = Field(None, description="Why actions were skipped, if they were")
+
+
+class ReconcileReport(BaseModel):
+    """Response model for a storage reconciliation run."""
+
+    dry_run: bool
+    started_at: datetime
+    objects: int
+    references: int
+    missing: int
+    unreferenced: int
+    deleted_objects: int
+    deleted_records: int
+    scopes: list[ReconcileScopeReport]
+
+
+class FolderUsage(BaseModel):
+    bytes: int
+    files: int
+
+
+class SchoolStorageUsageResponse(BaseModel):
+    """Storage used by one school, from the incrementally maintained counters."""
+
+    school_id: int
+    school_name: str
+    quota_bytes: Optional[int] = Field(None, description="Upload quota in bytes; null means unlimited")
+    bytes: int = Field(..., description="Bytes stored")
+    files: int = Field(..., description="Number of files")
+    folders: dict[str, FolderUsage] = Field(default_factory=dict, description="Usage by folder ('' is the school root)")
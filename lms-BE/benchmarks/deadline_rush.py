@@ -0,0 +1,249 @@
+"""
+Deadline-rush benchmark.
+
+Simulates N students (default 2,000) all submitting the same MCQ assignment
+within the last minute before the deadline and reports latency percentiles,
+status codes and whether anyone managed to exceed ``max_attempts``.
+
+Seeds its own school / course / assignment / students (all prefixed with
+``bench-<run id>``) into the configured DATABASE_URL and removes them afterwards
+unless ``--keep`` is given.
+
+Usage (from lms-BE/):
+
+    # in-process, against the app object via httpx ASGITransport
+    python benchmarks/deadline_rush.py
+
+    # against a running server
+    python benchmarks/deadline_rush.py --base-url http://localhost:8000 --students 2000 --window 60
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import UTC, date, datetime, timedelta
+
+# Add lms-BE to python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import delete, func, insert, select
+
+from app.core.background import drain_background_tasks
+from app.core.database import AsyncSessionLocal, engine
+from app.features.auth.jwt import create_access_token
+from app.features.courses.models import Course
+from app.features.courses.models_assignment import Assignment
+from app.features.courses.models_materials import LearningMaterial
+from app.features.courses.models_mcq import MCQOption
+from app.features.courses.models_question import Question
+from app.features.courses.models_student_assignment import StudentAssignment
+from app.features.enrollments.models_student import StudentCourse
+from app.features.schools.models import School
+from app.features.users.models import User
+
+QUESTIONS = 10
+OPTIONS_PER_QUESTION = 4
+
+
+async def seed(students: int, max_attempts: int) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    now = datetime.now(UTC)
+
+    async with AsyncSessionLocal() as db:
+        school = School(
+            name=f"bench-{run_id}",
+            subscription_start=now - timedelta(days=1),
+            subscription_end=now + timedelta(days=30),
+            max_teachers=10,
+        )
+        db.add(school)
+        await db.flush()
+
+        teacher = User(
+            name=f"bench-{run_id} teacher", email=f"bench-{run_id}-teacher@example.com",
+            password_hash="!", role="teacher", school_id=school.id,
+        )
+        course = Course(name=f"bench-{run_id}", description="deadline rush benchmark", school_id=school.id)
+        db.add_all([teacher, course])
+        await db.flush()
+
+        material = LearningMaterial(
+            course_id=course.id, school_id=school.id, created_by_teacher_id=teacher.id,
+            title=f"bench-{run_id} quiz", type="assignment",
+        )
+        db.add(material)
+        await db.flush()
+
+        db.add(Assignment(
+            material_id=material.id, assignment_type="MCQ", total_marks=QUESTIONS,
+            due_date=date.today() + timedelta(days=1), max_attempts=max_attempts,
+        ))
+        question_ids = (await db.scalars(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True),
+            [
+                {"assignment_id": material.id, "question_text": f"Q{i}", "question_type": "MCQ",
+                 "marks": 1, "order_index": i}
+                for i in range(QUESTIONS)
+            ],
+        )).all()
+        option_rows = [
+            {"question_id": qid, "option_text": f"Option {j}", "is_correct": j == 0}
+            for qid in question_ids for j in range(OPTIONS_PER_QUESTION)
+        ]
+        option_ids = (await db.scalars(
+            insert(MCQOption).returning(MCQOption.id, sort_by_parameter_order=True), option_rows
+        )).all()
+        options = {}
+        for row, oid in zip(option_rows, option_ids):
+            options.setdefault(row["question_id"], []).append(oid)
+
+        student_ids = (await db.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {"name": f"bench-{run_id} student {i}", "email": f"bench-{run_id}-s{i}@example.com",
+                 "password_hash": "!", "role": "student", "school_id": school.id}
+                for i in range(students)
+            ],
+        )).all()
+        await db.execute(insert(StudentCourse), [
+            {"student_id": sid, "course_id": course.id, "school_id": school.id} for sid in student_ids
+        ])
+        await db.commit()
+
+    tokens = {
+        sid: create_access_token({
+            "sub": str(sid), "role": "student", "base_role": "student",
+            "name": f"bench-{run_id} student", "school_id": school.id,
+        })
+        for sid in student_ids
+    }
+    return {
+        "run_id": run_id,
+        "school_id": school.id,
+        "course_id": course.id,
+        "teacher_id": teacher.id,
+        "assignment_id": material.id,
+        "options": options,
+        "tokens": tokens,
+    }
+
+
+async def cleanup(ctx: dict):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(StudentAssignment).where(StudentAssignment.assignment_id == ctx["assignment_id"]))
+        await db.execute(delete(LearningMaterial).where(LearningMaterial.id == ctx["assignment_id"]))
+        await db.execute(delete(StudentCourse).where(StudentCourse.course_id == ctx["course_id"]))
+        await db.execute(delete(Course).where(Course.id == ctx["course_id"]))
+        await db.execute(delete(User).where(User.school_id == ctx["school_id"]))
+        await db.execute(delete(School).where(School.id == ctx["school_id"]))
+        await db.commit()
+
+
+def _payload(ctx: dict) -> dict:
+    return {
+        "assignment_id": ctx["assignment_id"],
+        "answers": [
+            {"question_id": qid, "selected_option_ids": [random.choice(opts)]}
+            for qid, opts in ctx["options"].items()
+        ],
+    }
+
+
+async def rush(client: httpx.AsyncClient, ctx: dict, window: float, submits_per_student: int):
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    start = time.perf_counter()
+
+    async def one(token: str, delay: float):
+        await asyncio.sleep(delay)
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(
+                "/assignments/submit", json=_payload(ctx),
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            statuses[resp.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+        latencies.append(time.perf_counter() - t0)
+
+    # Arrivals get denser towards the deadline, like real students
+    jobs = [
+        one(token, window * (1 - random.random() ** 2))
+        for token in ctx["tokens"].values()
+        for _ in range(submits_per_student)
+    ]
+    await asyncio.gather(*jobs)
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def verify(ctx: dict, max_attempts: int) -> int:
+    async with AsyncSessionLocal() as db:
+        over = await db.scalar(
+            select(func.count()).select_from(
+                select(StudentAssignment.student_id)
+                .where(StudentAssignment.assignment_id == ctx["assignment_id"])
+                .group_by(StudentAssignment.student_id)
+                .having(func.count() > max_attempts)
+                .subquery()
+            )
+        )
+    return over or 0
+
+
+def _pct(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--window", type=float, default=60.0, help="Seconds over which submits arrive")
+    parser.add_argument("--max-attempts", type=int, default=1)
+    parser.add_argument("--submits-per-student", type=int, default=2,
+                        help="Duplicate submits per student (double clicks / retries)")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data")
+    args = parser.parse_args()
+
+    print(f"Seeding {args.students} students...")
+    ctx = await seed(args.students, args.max_attempts)
+    try:
+        limits = httpx.Limits(max_connections=500, max_keepalive_connections=500)
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits)
+        else:
+            from app.main import app
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60, limits=limits
+            )
+
+        async with client:
+            latencies, statuses, elapsed = await rush(client, ctx, args.window, args.submits_per_student)
+        # Activity logs are written off the request path; let them land before cleanup
+        await drain_background_tasks()
+
+        over = await verify(ctx, args.max_attempts)
+        total = sum(statuses.values())
+        print(f"\nRequests: {total} in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+        print(f"Latency ms  p50={_pct(latencies, 50):.1f}  p95={_pct(latencies, 95):.1f}  "
+              f"p99={_pct(latencies, 99):.1f}  max={max(latencies) * 1000:.1f}")
+        print("Status codes: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str)))
+        print(f"Students over max_attempts ({args.max_attempts}): {over}")
+    finally:
+        if not args.keep:
+            await cleanup(ctx)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+"""
+Upload memory benchmark.
+
+Uploads N large files (default 8 x 200 MB) concurrently through
+``AsyncStorage.upload_file`` and reports the process's peak RSS, wall time and
+throughput. Each file is written to a temporary file on disk first and handed
+over as an ``UploadFile``, exactly as Starlette does after spooling a request
+body, so the measured growth is what the storage layer itself holds.
+
+``--mode buffered`` runs the old path (``await file.read()`` + ``BytesIO``) for
+comparison: expect peak RSS to grow by roughly 2 x files x size there, and by
+a few parts per file when streaming.
+
+Objects are written to the configured storage backend under
+``bench-<run id>/`` and deleted afterwards unless ``--keep`` is given. With
+``STORAGE_BACKEND=local`` no network service is needed at all.
+
+Usage (from lms-BE/):
+
+    python benchmarks/upload_rss.py
+    STORAGE_BACKEND=local LOCAL_STORAGE_ROOT=/tmp/lms-storage python benchmarks/upload_rss.py
+    python benchmarks/upload_rss.py --files 16 --size-mb 200
+    python benchmarks/upload_rss.py --mode buffered --files 4
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+
+# Add lms-BE to python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.core.storage import get_storage
+
+WRITE_CHUNK = 1024 * 1024
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (Linux)."""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class RssSampler:
+    """Samples RSS in a background thread; ``peak`` is the highest value seen."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def make_source_files(directory: str, files: int, size: int) -> list:
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"upload-{i}.bin")
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining > 0:
+                n = min(WRITE_CHUNK, remaining)
+                f.write(os.urandom(n))
+                remaining -= n
+        paths.append(path)
+    return paths
+
+
+def open_upload(path: str) -> UploadFile:
+    return UploadFile(
+        file=open(path, "rb"),
+        size=os.path.getsize(path),
+        filename=os.path.basename(path),
+        headers=Headers({"content-type": "application/octet-stream"}),
+    )
+
+
+async def upload_buffered(storage, file: UploadFile, folder: str) -> dict:
+    """The pre-streaming behaviour (whole body in memory, upload on the event loop), kept as a baseline."""
+    content = await file.read()
+    return storage.backend.upload_stream(
+        BytesIO(content), file.filename, content_type=file.content_type, folder=folder, max_bytes=len(content)
+    )
+
+
+async def run(args) -> None:
+    storage = get_storage()
+    run_id = uuid.uuid4().hex[:8]
+    folder = f"bench-{run_id}"
+    size = args.size_mb * 1024 * 1024
+
+    with tempfile.TemporaryDirectory(prefix="upload-bench-") as tmp:
+        print(f"Writing {args.files} x {args.size_mb} MB source files to {tmp} ...")
+        paths = make_source_files(tmp, args.files, size)
+
+        uploads = [open_upload(p) for p in paths]
+        baseline = current_rss()
+        started = time.perf_counter()
+        try:
+            with RssSampler() as sampler:
+                if args.mode == "streaming":
+                    coros = [storage.upload_file(u, folder=folder, max_bytes=size) for u in uploads]
+                else:
+                    coros = [upload_buffered(storage, u, folder) for u in uploads]
+                results = await asyncio.gather(*coros, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+        finally:
+            for u in uploads:
+                await u.close()
+
+    ok = [r for r in results if isinstance(r, dict)]
+    failed = [r for r in results if not isinstance(r, dict)]
+    total = sum(r["size"] for r in ok)
+
+    print()
+    print(f"mode:            {args.mode} (part size {storage.part_size // (1024 * 1024)} MiB)")
+    print(f"uploads:         {len(ok)} ok, {len(failed)} failed")
+    for err in failed[:5]:
+        print(f"  error: {err!r}")
+    print(f"payload:         {total / 1024 / 1024:.0f} MB in {elapsed:.1f}s ({total / 1024 / 1024 / elapsed:.1f} MB/s)")
+    print(f"RSS baseline:    {baseline / 1024 / 1024:.0f} MB")
+    print(f"RSS peak:        {sampler.peak / 1024 / 1024:.0f} MB (+{(sampler.peak - baseline) / 1024 / 1024:.0f} MB)")
+    print(f"ru_maxrss:       {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if not args.keep:
+        for r in ok:
+            await storage.delete(r["object_name"])
+        print(f"Removed {len(ok)} objects under {folder}/")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8, help="concurrent uploads")
+    parser.add_argument("--size-mb", type=int, default=200, help="size of each file in MB")
+    parser.add_argument("--mode", choices=["streaming", "buffered"], default="streaming")
+    parser.add_argument("--keep", action="store_true", help="keep the uploaded objects")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import numpy as np
+
+from app.features.courses.service_analytics import _columnwise_corr
+
+
+def test_matches_pearson_per_column():
+    rng = np.random.default_rng(3)
+    x = rng.uniform(size=(40, 5))
+    y = x * rng.uniform(0.5, 2.0, size=5) + rng.normal(scale=0.3, size=(40, 5))
+    expected = [np.corrcoef(x[:, k], y[:, k])[0, 1] for k in range(5)]
+    np.testing.assert_allclose(_columnwise_corr(x, y), expected)
+
+
+def test_point_biserial_of_dichotomous_item():
+    # Students who got the item right have higher rest-of-test scores
+    item = np.array([[1.0], [1.0], [0.0], [0.0]])
+    rest = np.array([[9.0], [7.0], [4.0], [2.0]])
+    p = item.mean()
+    right, wrong = rest[item == 1].mean(), rest[item == 0].mean()
+    expected = (right - wrong) / rest.std() * np.sqrt(p * (1 - p))
+    np.testing.assert_allclose(_columnwise_corr(item, rest), [expected])
+
+
+def test_constant_column_has_no_correlation():
+    x = np.array([[1.0, 0.0], [1.0, 1.0], [1.0, 0.0]])
+    y = np.array([[3.0, 1.0], [5.0, 2.0], [4.0, 1.0]])
+    result = _columnwise_corr(x, y)
+    assert np.isnan(result[0])
+    np.testing.assert_allclose(result[1], 1.0)
@@ -0,0 +1,22 @@
+import pytest
+
+from app.core.storage import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("object_name", ["schools/1/a b/ü.txt", "blobs/ab/cdef", "x"])
+def test_cursor_round_trip(object_name):
+    cursor = encode_cursor(object_name)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == object_name
+
+
+@pytest.mark.parametrize("cursor", ["A", "_w"])
+def test_invalid_cursor(cursor):
+    # Truncated base64, and bytes that are not UTF-8
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_no_cursor():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
@@ -0,0 +1,58 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.core.storage as storage_module
+import app.features.files.routes as files_routes
+from app.core.database import get_db
+from app.core.storage import AsyncStorage
+from app.core.storage_local import LocalFileStorage
+from app.main import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    backend = LocalFileStorage(root=str(tmp_path), bucket_name="lms-files")
+    for name in ("schools/1/own.txt", "schools/2/other.txt"):
+        path = os.path.join(backend.root, backend.bucket_name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name)
+
+    async def current_user(token, db):
+        return SimpleNamespace(id=1, role="teacher", school_id=1)
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(storage_module, "_storage", AsyncStorage(backend))
+    monkeypatch.setattr(files_routes, "get_current_user", current_user)
+    app.dependency_overrides[get_db] = no_db
+    yield TestClient(app, headers={"Authorization": "Bearer token"})
+    app.dependency_overrides.pop(get_db)
+
+
+def test_own_school_file(client):
+    response = client.get("/v1/files/local/schools/1/own.txt")
+    assert response.status_code == 200
+    assert response.text == "schools/1/own.txt"
+
+
+def test_other_school_file(client):
+    assert client.get("/v1/files/local/schools/2/other.txt").status_code == 403
+
+
+@pytest.mark.parametrize("url", [
+    "/v1/files/local/x/%2e%2e/schools/2/other.txt",
+    "/v1/files/local/schools/1/%2e%2e/2/other.txt",
+    "/v1/files/local/schools/1/./%2e%2e/2/other.txt",
+])
+def test_dot_segments_are_resolved_before_authorising(client, url):
+    assert client.get(url).status_code == 403
+
+
+def test_unsigned_url_needs_a_token(client):
+    response = client.get("/v1/files/local/schools/1/own.txt", headers={"Authorization": ""})
+    assert response.status_code == 401
@@ -0,0 +1,14 @@
+from app.core.preview_render import is_previewable, preview_keys
+
+
+def test_previewable_types():
+    assert is_previewable("image/png")
+    assert is_previewable("application/pdf")
+    assert not is_previewable("text/plain")
+    assert not is_previewable(None)
+
+
+def test_preview_keys_sit_next_to_the_source():
+    thumbnail, preview = preview_keys("blobs/ab/cd")
+    assert thumbnail.startswith("blobs/ab/cd.") and preview.startswith("blobs/ab/cd.")
+    assert thumbnail != preview
@@ -0,0 +1,24 @@
+import re
+
+import pytest
+
+from app.features.files.service_quota import _folder_sql, usage_folder
+
+
+def _folder_pattern() -> str:
+    substring = list(_folder_sql().clauses)[0]
+    return list(substring.clauses)[1].value
+
+
+@pytest.mark.parametrize("object_name, folder", [
+    ("schools/3/report.pdf", ""),
+    ("schools/3/notes/report.pdf", "notes"),
+    ("schools/3/courses/7/week 1/slides.pptx", "courses/7/week 1"),
+    ("schools/12/a/", "a"),
+])
+def test_usage_folder_matches_sql(object_name, folder):
+    school_id = int(object_name.split("/")[1])
+    assert usage_folder(object_name, school_id) == folder
+    # substring() returns the first group, or NULL (coalesced to '') without a match
+    match = re.match(_folder_pattern(), object_name)
+    assert (match.group(1) if match else "") == folder
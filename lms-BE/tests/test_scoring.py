@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.features.courses.answer_key import KeyedQuestion, score_answers
+from app.features.courses.service_regrade import rescore_answers
+
+
+def _question(qid, question_type="MCQ", marks=2.0, options=((1, True), (2, True), (3, False))):
+    options = tuple((oid + qid * 10, f"option {oid}", correct) for oid, correct in options)
+    return KeyedQuestion(
+        id=qid,
+        question_text=f"Question {qid}",
+        question_type=question_type,
+        marks=marks,
+        order_index=qid,
+        options=options,
+        option_ids=frozenset(o[0] for o in options),
+        correct_ids=frozenset(o[0] for o in options if o[2]),
+    )
+
+
+# score_answers / rescore_answers only read ``questions``
+KEY = SimpleNamespace(questions={
+    1: _question(1),
+    2: _question(2, marks=1.0, options=((1, False), (2, True))),
+    3: _question(3, question_type="TEXT", options=()),
+    4: _question(4, options=((1, False), (2, False))),
+})
+
+
+@pytest.mark.parametrize("selected, expected", [
+    ({11, 12}, 2.0),
+    ({11}, 1.0),
+    ({11, 12, 13}, 1.0),
+    ({11, 13}, 0.0),
+    ({13}, 0.0),
+    (set(), 0.0),
+])
+def test_partial_credit(selected, expected):
+    marks, total, all_mcq = score_answers(KEY, [(1, selected)])
+    assert marks == [pytest.approx(expected)]
+    assert total == pytest.approx(expected)
+    assert all_mcq
+
+
+def test_question_without_correct_option_scores_zero():
+    assert score_answers(KEY, [(4, {41})])[0] == [0.0]
+
+
+def test_text_and_unknown_questions_need_manual_grading():
+    marks, total, all_mcq = score_answers(KEY, [(1, {11, 12}), (3, []), (99, [1])])
+    assert marks == [2.0, 0.0, 0.0]
+    assert total == 2.0
+    assert not all_mcq
+
+
+def test_rescore_matches_score_answers():
+    rng = np.random.default_rng(7)
+    question_ids = rng.choice([1, 2, 3, 4, 99], size=500)
+    old_marks = rng.uniform(0, 5, size=500)
+    selections = []
+    for qid in question_ids.tolist():
+        question = KEY.questions.get(qid)
+        pool = sorted(question.option_ids) if question and question.option_ids else [1, 2]
+        selections.append(set(rng.choice(pool, size=rng.integers(0, len(pool) + 1), replace=False).tolist()))
+
+    pick_answer_idx = np.array([i for i, s in enumerate(selections) for _ in s], dtype=np.int64)
+    pick_option_ids = np.array([o for s in selections for o in sorted(s)], dtype=np.int64)
+    rescored = rescore_answers(KEY, question_ids, old_marks, pick_answer_idx, pick_option_ids)
+
+    expected, _, _ = score_answers(KEY, zip(question_ids.tolist(), selections))
+    mcq = np.array([KEY.questions.get(q) is not None and KEY.questions[q].question_type == "MCQ" for q in question_ids])
+    np.testing.assert_allclose(rescored[mcq], np.array(expected)[mcq])
+    # Answers the key cannot grade keep their teacher-assigned marks
+    np.testing.assert_array_equal(rescored[~mcq], old_marks[~mcq])
+
+
+def test_rescore_without_picks():
+    rescored = rescore_answers(
+        KEY, np.array([1, 3]), np.array([1.5, 4.0]), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    )
+    np.testing.assert_array_equal(rescored, [0.0, 4.0])
@@ -0,0 +1,75 @@
+import numpy as np
+
+from app.features.courses.service_similarity import (
+    NUM_PERM, _candidate_pairs, find_clusters, minhash, shingle,
+)
+
+BASE = (
+    "Binary search repeatedly halves the sorted array comparing the middle element with the target "
+    "and discarding the half that cannot contain it so it runs in logarithmic time"
+)
+
+
+def _signatures(texts):
+    return np.frombuffer(b"".join(minhash(t) for t in texts), dtype="<u4").reshape(len(texts), NUM_PERM)
+
+
+def test_short_answers_are_not_signed():
+    assert shingle("Paris") is None
+    assert minhash("O(n log n)") is None
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingle("One, two THREE four five six seven eight!") == shingle("one two three four five six seven eight")
+
+
+def test_signature_is_deterministic():
+    signature = minhash(BASE)
+    assert len(signature) == NUM_PERM * 4
+    assert signature == minhash(BASE.upper())
+
+
+def test_signature_estimates_jaccard():
+    other = BASE.replace("logarithmic time", "O(log n) steps").replace("repeatedly", "")
+    a, b = shingle(BASE), shingle(other)
+    jaccard = len(a & b) / len(a | b)
+    estimate = (_signatures([BASE, other])[0] == _signatures([BASE, other])[1]).mean()
+    assert abs(estimate - jaccard) < 0.15
+
+
+def test_candidate_pairs_share_a_band():
+    signatures = np.arange(4 * NUM_PERM, dtype=np.uint32).reshape(4, NUM_PERM)
+    signatures[2] = signatures[0]
+    assert _candidate_pairs(signatures, np.arange(4)).tolist() == [[0, 2]]
+    assert _candidate_pairs(signatures[[0, 1]], np.arange(2)).shape == (0, 2)
+
+
+def test_identical_answers_cost_linear_pairs():
+    signatures = np.repeat(_signatures([BASE]), 2000, axis=0)
+    student_ids = np.arange(2000)
+    assert len(_candidate_pairs(signatures, student_ids)) == 1999
+    members, low, high = find_clusters(signatures, student_ids, threshold=0.6)[1][0]
+    assert len(members) == 2000 and low == high == 1.0
+
+
+def test_clusters_group_near_duplicates_of_different_students():
+    texts = [
+        BASE,
+        BASE + " on average",
+        BASE.replace("target", "key"),
+        "Merge sort splits the list into halves sorts each recursively and merges the sorted halves together",
+        BASE,
+    ]
+    student_ids = np.array([1, 2, 3, 4, 1])
+    candidates, clusters = find_clusters(_signatures(texts), student_ids, threshold=0.6)
+
+    assert candidates >= 3
+    assert len(clusters) == 1
+    members, low, high = clusters[0]
+    assert sorted(members) == [0, 1, 2, 4]
+    assert 0.6 <= low <= high <= 1.0
+
+
+def test_same_student_is_never_paired():
+    signatures = _signatures([BASE, BASE])
+    assert find_clusters(signatures, np.array([5, 5]), threshold=0.6)[1] == []
@@ -0,0 +1,56 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.storage import AsyncStorage, UploadTooLargeError, _HashingReader
+from app.core.storage_local import LocalFileStorage
+
+CHUNK = 1024
+
+
+def _drain(reader: _HashingReader) -> None:
+    # What the storage client does with the body: read fixed-size parts until EOF
+    while reader.read(CHUNK):
+        pass
+
+
+def test_reader_hashes_and_counts():
+    body = os.urandom(10 * CHUNK + 17)
+    reader = _HashingReader(io.BytesIO(body), max_bytes=len(body))
+    _drain(reader)
+    assert reader.size == len(body)
+    assert reader.sha256.hexdigest() == hashlib.sha256(body).hexdigest()
+
+
+def test_reader_stops_one_part_past_the_limit():
+    raw = io.BytesIO(os.urandom(100 * CHUNK))
+    reader = _HashingReader(raw, max_bytes=10 * CHUNK)
+    with pytest.raises(UploadTooLargeError) as exc:
+        _drain(reader)
+    assert exc.value.max_bytes == 10 * CHUNK
+    assert raw.tell() == 11 * CHUNK
+
+
+class _UnusedBackend:
+    def upload_stream(self, *args, **kwargs):
+        raise AssertionError("the body must not reach storage")
+
+
+def test_known_size_is_rejected_before_the_transfer():
+    storage = AsyncStorage(_UnusedBackend())
+    upload = UploadFile(io.BytesIO(b"x" * 2048), filename="big.bin", size=2048)
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(storage.upload_file(upload, max_bytes=1024))
+
+
+def test_streaming_past_the_limit_leaves_no_object(tmp_path):
+    backend = LocalFileStorage(root=str(tmp_path), bucket_name="lms-files")
+    # Unknown size (chunked request): only the reader can stop it
+    with pytest.raises(UploadTooLargeError):
+        backend.upload_stream(io.BytesIO(os.urandom(4 * 1024 * 1024)), "big.bin", folder="schools/1", max_bytes=1024 * 1024)
+    leftovers = [os.path.join(d, f) for d, _, files in os.walk(tmp_path) for f in files]
+    assert leftovers == []